@@ -3,69 +3,362 @@ import os
 import sys
 import datetime
 import csv
+import time
+import threading
+import argparse
+import contextlib
+import itertools
+import logging
+import multiprocessing
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from classifier import shard_path
+from config import load_config
+from event_stream import create_publisher, FaceTracker
+from frame_sources import (CameraSource, WindowSink, HeadlessSink, open_source, VIDEO_EXTENSIONS,
+                           IMAGE_EXTENSIONS)
+from recognizers import (create_recognizer, recognition_threshold, ShardedRecognizer,
+                         FaceNormalizer, GrayFrameBuffer)
+from structured_log import get_logger
+
+log = get_logger(__name__)
+
+class ReloadWatcher:
+    """Watch model and roster files and load changed versions on a background thread
+
+    The freshly loaded objects are only handed over through take(), which the
+    capture loop calls between frames. Parsing a large model therefore never
+    stalls the loop, and a swap never happens while a frame is being scored.
+    """
+    def __init__(self, paths, loader, interval=1.0):
+        self.paths = paths
+        self.loader = loader
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending = None
+        self.stop_event = threading.Event()
+        self.mtimes = self.current_mtimes()
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+        self.thread.start()
+    
+    def current_mtimes(self):
+        mtimes = {}
+        for path in self.paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+    
+    def watch(self):
+        while not self.stop_event.wait(self.interval):
+            mtimes = self.current_mtimes()
+            if mtimes == self.mtimes:
+                continue
+            self.mtimes = mtimes
+            try:
+                loaded = self.loader()
+            except Exception as e:
+                log.warning("⚠️ Warning: Reload failed, keeping the current model: %s", e)
+                continue
+            with self.lock:
+                self.pending = loaded
+    
+    def take(self):
+        """Return newly loaded objects once, or None if nothing changed"""
+        with self.lock:
+            loaded, self.pending = self.pending, None
+        return loaded
+    
+    def stop(self):
+        self.stop_event.set()
+
+class MotionGate:
+    """Cheap motion check that decides whether a frame is worth a face detection
+
+    Each frame is shrunk to a small grayscale thumbnail and compared with a
+    running-average background. Detection runs when enough of the region of
+    interest changed, and at least every refresh_seconds regardless, so a
+    student standing perfectly still is still picked up.
+    """
+    def __init__(self, pixel_threshold=25, min_changed_fraction=0.002, refresh_seconds=2.0,
+                 roi=None, thumbnail_width=160):
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.refresh_seconds = refresh_seconds
+        # roi is [x, y, w, h] as fractions of the frame, or None for the whole frame
+        self.roi = roi
+        self.thumbnail_width = thumbnail_width
+        self.background = None
+        self.buffers = None
+        self.last_detection = 0.0
+        self.frames = 0
+        self.detections = 0
+    
+    def should_detect(self, frame, now=None):
+        """Return True when the frame should go through face detection
+
+        `now` is the frame's time in seconds; recorded sources pass their
+        position in the recording so a replay gates the same frames every time.
+        """
+        self.frames += 1
+        height, width = frame.shape[:2]
+        if self.roi:
+            x, y, w, h = self.roi
+            frame = frame[int(y * height):int((y + h) * height), int(x * width):int((x + w) * width)]
+            height, width = frame.shape[:2]
+        
+        size = (self.thumbnail_width, max(1, int(height * self.thumbnail_width / float(width))))
+        if self.buffers is None or self.buffers["color"].shape[:2] != (size[1], size[0]):
+            # All thumbnails are allocated once and reused on every frame
+            self.buffers = {name: np.empty((size[1], size[0]), dtype=np.uint8)
+                            for name in ("gray", "blur", "background", "diff")}
+            self.buffers["color"] = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self.background = None
+        
+        b = self.buffers
+        if frame.ndim == 3:
+            cv2.resize(frame, size, dst=b["color"], interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(b["color"], cv2.COLOR_BGR2GRAY, dst=b["gray"])
+        else:
+            cv2.resize(frame, size, dst=b["gray"], interpolation=cv2.INTER_AREA)
+        cv2.GaussianBlur(b["gray"], (5, 5), 0, dst=b["blur"])
+        
+        if self.background is None:
+            self.background = b["blur"].astype("float32")
+            changed = 1.0
+        else:
+            cv2.convertScaleAbs(self.background, dst=b["background"])
+            cv2.absdiff(b["blur"], b["background"], dst=b["diff"])
+            cv2.threshold(b["diff"], self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=b["diff"])
+            changed = cv2.countNonZero(b["diff"]) / float(b["diff"].size)
+            cv2.accumulateWeighted(b["blur"], self.background, 0.1)
+        
+        now = time.monotonic() if now is None else now
+        if changed >= self.min_changed_fraction or now - self.last_detection >= self.refresh_seconds:
+            self.last_detection = now
+            self.detections += 1
+            return True
+        return False
+
+class EyeVerifier:
+    """Second-stage check that a detected face has eyes before it is scored
+
+    Haar face detections on busy backgrounds (posters, shelves, patterned
+    clothing) rarely contain eyes, so rejecting them here saves their
+    predict call and keeps them from ever marking attendance. Only the
+    upper part of each face box is searched, shrunk to roi_width pixels
+    and equalized, so the cost per face is small and the same however
+    large the face appears, and dim faces still show their eyes.
+    """
+    def __init__(self, min_eyes=1, scale_factor=1.1, min_neighbors=3, upper_fraction=0.6, roi_width=64,
+                 cascade_path="haarcascade_eye.xml"):
+        # Prefer the cascade shipped with the repo, falling back to OpenCV's copy
+        if not os.path.exists(cascade_path):
+            cascade_path = cv2.data.haarcascades + "haarcascade_eye.xml"
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise RuntimeError(f"Could not load eye cascade '{cascade_path}'")
+        self.min_eyes = min_eyes
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.upper_fraction = upper_fraction
+        self.roi_width = roi_width
+        self.checked = 0
+        self.rejected = 0
+        self.seconds = 0.0
+    
+    def verify(self, gray_img, box):
+        """True when at least min_eyes eyes are found inside the face box"""
+        start = time.perf_counter()
+        x, y, w, h = box
+        roi = gray_img[y:y + max(1, int(h * self.upper_fraction)), x:x + w]
+        height = max(1, int(roi.shape[0] * self.roi_width / float(w)))
+        roi = cv2.equalizeHist(cv2.resize(roi, (self.roi_width, height), interpolation=cv2.INTER_AREA))
+        # An eye is never wider than half the face
+        eyes = self.cascade.detectMultiScale(roi, self.scale_factor, self.min_neighbors,
+                                             maxSize=(self.roi_width // 2, self.roi_width // 2))
+        passed = len(eyes) >= self.min_eyes
+        self.checked += 1
+        if not passed:
+            self.rejected += 1
+        self.seconds += time.perf_counter() - start
+        return passed
+    
+    def stats(self):
+        """Faces checked, predict calls avoided and the average cost per face"""
+        return {"checked": self.checked, "rejected": self.rejected,
+                "ms_per_face": round(self.seconds * 1000 / max(self.checked, 1), 3)}
+    
+    def summary(self):
+        """One-line summary for attendance reports"""
+        stats = self.stats()
+        return (f"Eye check rejected {stats['rejected']}/{stats['checked']} faces (predict calls avoided), "
+                f"{stats['ms_per_face']:.2f} ms per face")
 
 class AttendanceSystem:
-    def __init__(self):
+    def __init__(self, groups=None, attendance_dir="attendance", publish_events=True):
         # Create necessary folders
+        self.attendance_dir = attendance_dir
         if not os.path.exists("data"):
             os.makedirs("data")
-        if not os.path.exists("attendance"):
-            os.makedirs("attendance")
+        if not os.path.exists(attendance_dir):
+            os.makedirs(attendance_dir)
             
         # Initialize face detection and recognition components
         try:
             self.faceCascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
             if self.faceCascade.empty():
-                print("❌ Error: Could not load face cascade classifier")
+                log.error("❌ Error: Could not load face cascade classifier")
                 sys.exit(1)
         except Exception as e:
-            print(f"❌ Error loading cascade files: {e}")
+            log.error("❌ Error loading cascade files: %s", e)
             sys.exit(1)
             
         self.name_dict = self.load_names()
         
         # Check if names.txt exists and has content
         if not self.name_dict:
-            print("❌ Error: No students registered. Please register students first.")
-            print("Create a names.txt file with format: 'ID Name' on each line (e.g., '1 John Smith')")
+            log.error("❌ Error: No students registered. Please register students first.")
+            log.error("Create a names.txt file with format: 'ID Name' on each line (e.g., '1 John Smith')")
             sys.exit(1)
             
         # Load classifier if it exists
         self.clf = None
-        classifier_path = "classifier.yml"
-        if os.path.exists(classifier_path):
-            try:
-                # Check if opencv-contrib-python is installed
-                if not hasattr(cv2, 'face') or not hasattr(cv2.face, 'LBPHFaceRecognizer_create'):
-                    print("❌ Error: OpenCV face recognition module not available")
-                    print("Please install opencv-contrib-python: pip install opencv-contrib-python")
-                    sys.exit(1)
-                    
-                self.clf = cv2.face.LBPHFaceRecognizer_create()
-                self.clf.read(classifier_path)
-                print(f"✅ Classifier loaded successfully from {classifier_path}")
-            except Exception as e:
-                print(f"❌ Error loading classifier from {classifier_path}: {e}")
-                print("Please ensure the classifier file is valid or train a new model.")
-                sys.exit(1)
-        else:
-            print(f"❌ Error: Classifier file '{classifier_path}' not found.")
-            print("Please train the model first to generate the classifier file.")
+        self.groups = groups or []
+        self.config = load_config()
+        self.threshold = recognition_threshold(self.config)
+        try:
+            create_recognizer(self.config)
+        except (RuntimeError, ValueError) as e:
+            log.error("❌ Error: %s", e)
+            sys.exit(1)
+        
+        try:
+            self.clf = self.load_model()
+        except Exception as e:
+            log.error("❌ Error loading classifier: %s", e)
+            log.error("Please ensure the classifier file is valid or train a new model.")
             sys.exit(1)
+        self.watcher = None
+        
+        # Skip cascade detection on frames where nothing moved
+        motion = self.config.get("motion", {})
+        self.motion_gate = None
+        if motion.get("enabled", True):
+            self.motion_gate = MotionGate(motion.get("pixel_threshold", 25),
+                                          motion.get("min_changed_fraction", 0.002),
+                                          motion.get("refresh_seconds", 2.0),
+                                          motion.get("roi"))
+        
+        # Optionally drop face boxes without eyes before they are scored
+        self.eye_verifier = None
+        if self.config["eye_check"].get("enabled", False):
+            self.enable_eye_check()
+        self.last_annotations = []
+        self.last_results = []
+        
+        # Reused per-frame buffers: the gray frame and one fixed-size face crop,
+        # so scoring a face costs the same however large it appears
+        self.gray_frame = GrayFrameBuffer()
+        self.face_normalizer = FaceNormalizer(self.config["recognition"]["face_size"])
+        
+        # Recognition and mark events for downstream consumers (config "events")
+        self.events = create_publisher(self.config) if publish_events else None
+        self.camera = self.config["events"].get("camera", "camera0")
+        self.tracker = FaceTracker()
         
         # Store today's date and track recorded attendances to avoid duplicates
         self.today = datetime.datetime.now().strftime("%Y-%m-%d")
-        self.attendance_file = os.path.join("attendance", f"{self.today}.csv")
+        self.attendance_file = os.path.join(attendance_dir, f"{self.today}.csv")
         self.marked_attendance = self.load_today_attendance()
     
+    def enable_eye_check(self):
+        """Verify every detected face with the eye cascade (config "eye_check") before predicting"""
+        eye_check = self.config["eye_check"]
+        try:
+            self.eye_verifier = EyeVerifier(eye_check.get("min_eyes", 1), eye_check.get("scale_factor", 1.1),
+                                            eye_check.get("min_neighbors", 3), eye_check.get("upper_fraction", 0.6))
+        except RuntimeError as e:
+            log.warning("⚠️ Warning: %s; eye verification is off", e)
+    
+    def model_paths(self):
+        """Return the model files this session reads"""
+        if self.groups:
+            return [shard_path(group) for group in self.groups]
+        return ["classifier.yml"]
+    
+    def load_model(self):
+        """Load the session's shards, or the global classifier.yml"""
+        if self.groups:
+            # Only the shards for this session's sections are loaded, so
+            # predict never searches students who cannot be in the room
+            return self.load_shards(self.groups)
+        return self.load_classifier("classifier.yml")
+    
+    def load_classifier(self, classifier_path):
+        """Load the global classifier.yml model"""
+        if not os.path.exists(classifier_path):
+            raise FileNotFoundError(f"Classifier file '{classifier_path}' not found. "
+                                    "Please train the model first to generate the classifier file.")
+        clf = create_recognizer(self.config)
+        clf.read(classifier_path)
+        log.info("✅ Classifier loaded successfully from %s", classifier_path)
+        return clf
+    
+    def load_shards(self, groups):
+        """Load the per-group model shards for the current session"""
+        shards = {}
+        for group in groups:
+            path = shard_path(group)
+            if not os.path.exists(path):
+                log.warning("⚠️ Warning: No model shard for group '%s' (%s). Skipping.", group, path)
+                continue
+            try:
+                clf = create_recognizer(self.config)
+                clf.read(path)
+                shards[group] = clf
+                log.info("✅ Loaded shard '%s' from %s", group, path)
+            except Exception as e:
+                log.error("❌ Error loading shard '%s' from %s: %s", group, path, e)
+        
+        if not shards:
+            raise FileNotFoundError("None of the requested group shards could be loaded. "
+                                    "Train shards first with: python classifier.py --shards")
+        return ShardedRecognizer(shards)
+    
+    def reload_model_and_names(self):
+        """Load a fresh model and roster (runs on the watcher thread)"""
+        clf = self.load_model()
+        name_dict = self.load_names()
+        if not name_dict:
+            raise ValueError("names.txt has no valid student entries")
+        return clf, name_dict
+    
+    def start_watching(self, interval=1.0):
+        """Start reloading the model and roster whenever their files change"""
+        if self.watcher is None:
+            self.watcher = ReloadWatcher(self.model_paths() + ["names.txt"],
+                                         self.reload_model_and_names, interval)
+    
+    def apply_reload(self):
+        """Swap in a model/roster loaded by the watcher; call between frames"""
+        if self.watcher is None:
+            return False
+        loaded = self.watcher.take()
+        if loaded is None:
+            return False
+        self.clf, self.name_dict = loaded
+        log.info("🔄 Reloaded model and roster (%d students)", len(self.name_dict))
+        return True
+    
     def load_names(self, file_path="names.txt"):
         """Load student names from file"""
         name_dict = {}
         try:
             if not os.path.exists(file_path):
-                print(f"❌ Names file not found: {file_path}")
+                log.error("❌ Names file not found: %s", file_path)
                 return name_dict
                 
             with open(file_path, "r") as f:
@@ -81,46 +374,51 @@ class AttendanceSystem:
                             name = " ".join(parts[1:])
                             name_dict[id] = name
                         except ValueError:
-                            print(f"⚠️ Warning: Invalid ID format in line: '{line}'. Skipping.")
+                            log.warning("⚠️ Warning: Invalid ID format in line: '%s'. Skipping.", line)
                             continue
             
             if not name_dict:
-                print(f"⚠️ Warning: No valid student entries found in {file_path}")
+                log.warning("⚠️ Warning: No valid student entries found in %s", file_path)
                 
         except Exception as e:
-            print(f"❌ Error loading names file: {e}")
+            log.error("❌ Error loading names file: %s", e)
         
-        print(f"✅ Loaded {len(name_dict)} student records")
+        log.info("✅ Loaded %d student records", len(name_dict))
         return name_dict
     
     def load_today_attendance(self):
         """Load today's attendance records to prevent duplicates"""
+        return self.load_attendance_ids(self.attendance_file)
+    
+    def load_attendance_ids(self, attendance_file):
+        """Load the IDs already recorded in one day's attendance file"""
         marked = set()
-        if os.path.exists(self.attendance_file):
+        if os.path.exists(attendance_file):
             try:
-                df = pd.read_csv(self.attendance_file)
+                df = pd.read_csv(attendance_file)
                 for _, row in df.iterrows():
                     # Handle potential data type issues
                     try:
                         marked.add(int(row['ID']))
                     except (ValueError, TypeError) as e:
-                        print(f"⚠️ Warning: Invalid ID in attendance file: {row['ID']}")
-                print(f"✅ Loaded {len(marked)} existing attendance records for today")
+                        log.warning("⚠️ Warning: Invalid ID in attendance file: %s", row['ID'])
+                log.info("✅ Loaded %d existing attendance records from %s", len(marked), attendance_file)
             except Exception as e:
-                print(f"⚠️ Error loading today's attendance: {e}")
+                log.warning("⚠️ Error loading today's attendance: %s", e)
         return marked
     
-    def create_attendance_file(self):
+    def create_attendance_file(self, attendance_file=None):
         """Create attendance CSV file with headers if it doesn't exist"""
-        if not os.path.exists(self.attendance_file):
+        attendance_file = attendance_file or self.attendance_file
+        if not os.path.exists(attendance_file):
             try:
-                os.makedirs(os.path.dirname(self.attendance_file), exist_ok=True)
-                with open(self.attendance_file, 'w', newline='') as f:
+                os.makedirs(os.path.dirname(attendance_file), exist_ok=True)
+                with open(attendance_file, 'w', newline='') as f:
                     writer = csv.writer(f)
                     writer.writerow(['ID', 'Name', 'Date', 'Time'])
-                print(f"✅ Created new attendance file: {self.attendance_file}")
+                log.info("✅ Created new attendance file: %s", attendance_file)
             except Exception as e:
-                print(f"❌ Error creating attendance file: {e}")
+                log.error("❌ Error creating attendance file: %s", e)
     
     def mark_attendance(self, student_id):
         """Record student attendance if not already marked today"""
@@ -148,89 +446,184 @@ class AttendanceSystem:
             self.marked_attendance.add(student_id)
             return True
         except Exception as e:
-            print(f"❌ Error marking attendance for {student_name} (ID: {student_id}): {e}")
+            log.error("❌ Error marking attendance for %s (ID: %s): %s", student_name, student_id, e,
+                      extra={"student_id": int(student_id)})
             return False
     
+    def record_sightings(self, sightings):
+        """Write (student_id, datetime) first sightings to the attendance file of each sighting's day"""
+        by_date = {}
+        for student_id, seen_at in sorted(sightings, key=lambda item: item[1]):
+            by_date.setdefault(seen_at.strftime("%Y-%m-%d"), []).append((student_id, seen_at))
+        
+        recorded = 0
+        for date, rows in sorted(by_date.items()):
+            attendance_file = os.path.join(self.attendance_dir, f"{date}.csv")
+            if attendance_file == self.attendance_file:
+                marked = self.marked_attendance
+            else:
+                marked = self.load_attendance_ids(attendance_file)
+            rows = [(student_id, seen_at) for student_id, seen_at in rows if student_id not in marked]
+            if not rows:
+                continue
+            try:
+                self.create_attendance_file(attendance_file)
+                with open(attendance_file, 'a', newline='') as f:
+                    writer = csv.writer(f)
+                    for student_id, seen_at in rows:
+                        writer.writerow([student_id, self.name_dict.get(student_id, "Unknown"),
+                                         date, seen_at.strftime("%H:%M:%S")])
+                        marked.add(student_id)
+                        if self.events is not None:
+                            self.events.publish("mark", student_id=int(student_id), camera="batch",
+                                                name=self.name_dict.get(student_id, "Unknown"),
+                                                seen_at=seen_at.isoformat(timespec="seconds"))
+                recorded += len(rows)
+                log.info("✅ Recorded %d students in %s", len(rows), attendance_file)
+            except Exception as e:
+                log.error("❌ Error writing %s: %s", attendance_file, e)
+        return recorded
+    
+    def identify_faces(self, gray_img, scaleFactor=1.1, minNeighbors=5):
+        """Detect faces and score them in one batch, returning [(box, (id, confidence) or None)]"""
+        faces = self.faceCascade.detectMultiScale(gray_img, scaleFactor, minNeighbors)
+        boxes = [(x, y, w, h) for (x, y, w, h) in faces]
+        if self.eye_verifier is not None:
+            # Boxes without eyes are dropped before they cost a predict call
+            boxes = [box for box in boxes if box[2] > 0 and box[3] > 0 and self.eye_verifier.verify(gray_img, box)]
+        # Skip if face region is empty
+        scored = [i for i, (x, y, w, h) in enumerate(boxes) if w > 0 and h > 0]
+        results = [None] * len(boxes)
+        
+        if self.clf is not None and scored:
+            try:
+                # Score every face of the frame in one call: batch backends
+                # vectorize it and OpenCV backends spread it over a worker
+                # pool. Each crop gets its own training-size buffer slot.
+                crops = [gray_img[y:y + h, x:x + w] for (x, y, w, h) in (boxes[i] for i in scored)]
+                for i, result in zip(scored, self.clf.predict_batch(self.face_normalizer.batch(crops))):
+                    results[i] = result
+            except Exception as e:
+                # Rate limited: a bad model fails on every frame
+                log.warning("⚠️ Error processing faces: %s", e, extra={"faces": len(scored)})
+        return list(zip(boxes, results))
+    
     def draw_boundary(self, img, scaleFactor=1.1, minNeighbors=5):
         """Detect faces and identify students"""
         if img is None:
             return img
             
         try:
-            gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = self.faceCascade.detectMultiScale(gray_img, scaleFactor, minNeighbors)
+            gray_img = self.gray_frame(img)
             
-            for (x, y, w, h) in faces:
-                # Draw rectangle around face
-                cv2.rectangle(img, (x, y), (x + w, y + h), (255, 0, 0), 2)
+            annotations = []
+            # Results come back in detection order
+            self.last_results = self.identify_faces(gray_img, scaleFactor, minNeighbors)
+            track_ids = [None] * len(self.last_results)
+            if self.events is not None:
+                track_ids = self.tracker.update([box for box, _ in self.last_results])
+            for (box, result), track_id in zip(self.last_results, track_ids):
+                # Rectangle around face, plus a label once it has been scored
+                annotation = [box, None, None]
+                annotations.append(annotation)
+                if self.clf is None:
+                    continue
+                if result is None:
+                    annotation[1:] = ["Error", (0, 0, 255)]
+                    continue
+                id, confidence = result
+                accepted = confidence < self.threshold
+                if self.events is not None:
+                    self.events.publish("recognition", student_id=int(id) if accepted else None,
+                                        best_match=int(id), distance=round(float(confidence), 3),
+                                        accepted=bool(accepted), camera=self.camera, track_id=track_id,
+                                        box=[int(v) for v in box])
                 
-                if self.clf is not None:
-                    try:
-                        # Get face region
-                        face_region = gray_img[y:y + h, x:x + w]
-                        
-                        # Skip if face region is empty
-                        if face_region.size == 0:
-                            continue
-                            
-                        # Predict who this face belongs to
-                        id, confidence = self.clf.predict(face_region)
-                        
-                        # Lower confidence value means better match (in LBPH)
-                        if confidence < 80:
-                            name = self.name_dict.get(id, "Unknown")
-                            
-                            # Mark attendance
-                            just_marked = self.mark_attendance(id)
-                            
-                            # Display name and attendance status
-                            status = "✅ Marked!" if just_marked else "Already Recorded"
-                            cv2.putText(img, f"{name} ({status})", (x, y - 10), 
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.75, (0, 255, 0), 2)
-                        else:
-                            # Unknown face
-                            cv2.putText(img, f"Unknown ({confidence:.1f})", (x, y - 10), 
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.75, (0, 0, 255), 2)
-                    except Exception as e:
-                        print(f"⚠️ Error processing face: {e}")
-                        cv2.putText(img, "Error", (x, y - 10), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.75, (0, 0, 255), 2)
+                # Lower confidence value means better match for every backend
+                if accepted:
+                    name = self.name_dict.get(id, "Unknown")
+                    
+                    # Mark attendance
+                    just_marked = self.mark_attendance(id)
+                    if just_marked and self.events is not None:
+                        self.events.publish("mark", student_id=int(id), name=name, distance=round(float(confidence), 3),
+                                            camera=self.camera, track_id=track_id)
+                    
+                    # Display name and attendance status
+                    status = "✅ Marked!" if just_marked else "Already Recorded"
+                    annotation[1:] = [f"{name} ({status})", (0, 255, 0)]
+                else:
+                    # Unknown face
+                    annotation[1:] = [f"Unknown ({confidence:.1f})", (0, 0, 255)]
+            
+            self.last_annotations = annotations
+            self.draw_annotations(img, annotations)
         except Exception as e:
-            print(f"❌ Error in face detection: {e}")
+            log.error("❌ Error in face detection: %s", e)
             
         return img
     
-    def run(self):
-        """Run the attendance system"""
-        video_capture = None
+    def close_events(self):
+        """Flush and stop the event stream"""
+        if self.events is None:
+            return
+        self.events.close()
+        if self.events.dropped:
+            log.warning("⚠️ %d events were dropped because the event queue was full", self.events.dropped,
+                        extra={"dropped": self.events.dropped})
+        self.events = None
+    
+    def draw_annotations(self, img, annotations):
+        """Draw face rectangles and their labels"""
+        for (x, y, w, h), text, color in annotations:
+            cv2.rectangle(img, (x, y), (x + w, y + h), (255, 0, 0), 2)
+            if text is not None:
+                cv2.putText(img, text, (x, y - 10), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.75, color, 2)
+    
+    def run(self, source=None, sink=None, watch=True, on_frame=None):
+        """Run the attendance system
+
+        Frames come from `source` (default: the webcam) and go to `sink`
+        (default: a window); see frame_sources.py for recorded, synthetic
+        and headless stand-ins. `on_frame(frame)` is called after each
+        processed frame, before it is shown.
+        """
+        source = source or CameraSource(0)
+        sink = sink or WindowSink("Attendance System")
         try:
-            # Access webcam
-            video_capture = cv2.VideoCapture(0)
-            
-            if not video_capture.isOpened():
-                print("❌ Error: Could not open camera.")
+            if not source.is_opened():
+                log.error("❌ Error: Could not open camera." if source.live else "❌ Error: Could not open frame source.")
                 return
             
             # Display current date and attendance count
-            print(f"✅ Attendance System running for: {self.today}")
-            print(f"✅ Recording to: {self.attendance_file}")
-            print("Press 'q' to quit")
+            log.info("✅ Attendance System running for: %s", self.today)
+            log.info("✅ Recording to: %s", self.attendance_file)
+            if source.live:
+                print("Press 'q' to quit")
+            
+            # Pick up retrained models and late enrollments without a restart
+            if watch:
+                self.start_watching()
             
             while True:
-                ret, frame = video_capture.read()
+                self.apply_reload()
+                ret, frame = source.read()
                 
                 if not ret:
-                    print("⚠️ Warning: Could not read frame from camera. Retrying...")
-                    # Try to reopen the camera if frame reading fails
-                    video_capture.release()
-                    video_capture = cv2.VideoCapture(0)
-                    if not video_capture.isOpened():
-                        print("❌ Error: Could not reopen camera.")
-                        break
-                    continue
+                    # A live camera has been reopened and is retried; a
+                    # recording has simply ended
+                    if source.live and source.is_opened():
+                        continue
+                    break
                     
-                # Process frame for face detection and attendance marking
-                frame = self.draw_boundary(frame)
+                # Process frame for face detection and attendance marking, but
+                # only when the motion gate sees something change; otherwise
+                # redraw the last results
+                if self.motion_gate is None or self.motion_gate.should_detect(frame, source.timestamp):
+                    frame = self.draw_boundary(frame)
+                else:
+                    self.draw_annotations(frame, self.last_annotations)
                 
                 # Show stats on the frame
                 cv2.putText(frame, f"Date: {self.today}", (10, 30), 
@@ -238,40 +631,235 @@ class AttendanceSystem:
                 cv2.putText(frame, f"Students Present: {len(self.marked_attendance)}", (10, 60), 
                             cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
                 
-                # Display the frame
-                cv2.imshow("Attendance System", frame)
+                if on_frame is not None:
+                    on_frame(frame)
                 
-                # Press 'q' to quit
-                if cv2.waitKey(10) & 0xFF == ord('q'):
+                # Display the frame; press 'q' to quit
+                if sink.show(frame) == ord('q'):
                     break
                 
         except KeyboardInterrupt:
             print("\n✅ Program stopped by user.")
         except Exception as e:
-            print(f"❌ Unexpected error: {e}")
+            log.error("❌ Unexpected error: %s", e)
         finally:
             # Clean up
-            if video_capture is not None:
-                video_capture.release()
-            cv2.destroyAllWindows()
+            source.release()
+            if self.watcher is not None:
+                self.watcher.stop()
+            sink.close()
+            self.close_events()
             
             print(f"\n📊 Today's Attendance Summary:")
             print(f"- Date: {self.today}")
             print(f"- Students Present: {len(self.marked_attendance)}")
             print(f"- Attendance recorded in: {self.attendance_file}")
+            if self.motion_gate is not None and self.motion_gate.frames:
+                print(f"- Face detection ran on {self.motion_gate.detections}/{self.motion_gate.frames} frames")
+            if self.eye_verifier is not None and self.eye_verifier.checked:
+                print(f"- {self.eye_verifier.summary()}")
+
 
+# Per-process recognizer for batch workers, set up once by init_batch_worker
+batch_system = None
+
+def image_timestamp(path):
+    """When a photo was taken: EXIF DateTimeOriginal if present, else the file time"""
+    try:
+        from PIL import Image
+        with Image.open(path) as image:
+            exif = image.getexif()
+            # 36867 = DateTimeOriginal (in the Exif sub-IFD), 306 = DateTime
+            taken = exif.get_ifd(0x8769).get(36867) or exif.get(306)
+        if taken:
+            return datetime.datetime.strptime(str(taken).strip(), "%Y:%m:%d %H:%M:%S").timestamp()
+    except Exception:
+        pass
+    return os.path.getmtime(path)
+
+def video_info(path):
+    """Return (frame count, fps) of a video file"""
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError(f"Could not open video '{path}'")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        return int(capture.get(cv2.CAP_PROP_FRAME_COUNT)), fps
+    finally:
+        capture.release()
+
+def plan_batch_jobs(paths, workers, stride=1, start=None):
+    """Split videos into frame ranges and image folders into file chunks, one job each"""
+    videos, images = [], []
+    for path in paths:
+        entries = [os.path.join(path, name) for name in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for entry in entries:
+            extension = os.path.splitext(entry)[1].lower()
+            if extension in IMAGE_EXTENSIONS:
+                images.append(entry)
+            elif extension in VIDEO_EXTENSIONS or not os.path.isdir(path):
+                videos.append(entry)
+    
+    jobs = []
+    for video in videos:
+        frames, fps = video_info(video)
+        # A recording is assumed to end at its file modification time unless a start is given
+        video_start = start if start is not None else os.path.getmtime(video) - max(frames, 0) / fps
+        if frames <= 0:
+            # Unknown length (some containers): read the whole file in one job
+            jobs.append(("video", video, 0, None, fps, video_start, stride))
+            continue
+        segment = max(stride, -(-frames // workers))
+        segment += (-segment) % stride
+        for first in range(0, frames, segment):
+            jobs.append(("video", video, first, min(first + segment, frames), fps, video_start, stride))
+    
+    chunk = max(1, -(-len(images) // workers))
+    for first in range(0, len(images), chunk):
+        jobs.append(("images", images[first:first + chunk], stride))
+    return jobs
+
+def init_batch_worker(groups, quiet=True):
+    """Load the cascade, model and roster once per worker process"""
+    global batch_system
+    cv2.setNumThreads(1)
+    output = open(os.devnull, "w") if quiet else sys.stdout
+    # Log handlers hold their own reference to stdout, so startup messages are muted separately
+    logging.disable(logging.INFO if quiet else logging.NOTSET)
+    try:
+        with contextlib.redirect_stdout(output):
+            batch_system = AttendanceSystem(groups, publish_events=False)
+    finally:
+        logging.disable(logging.NOTSET)
+    # Processes already run in parallel; keep each one's predict single-threaded
+    if hasattr(batch_system.clf, "workers"):
+        batch_system.clf.workers = 1
+
+def keep_earliest(sightings, student_id, timestamp):
+    """Keep a student's earliest sighting on each day in {(id, date): timestamp}"""
+    key = (student_id, datetime.date.fromtimestamp(timestamp))
+    if timestamp < sightings.get(key, float("inf")):
+        sightings[key] = timestamp
+
+def batch_sight(sightings, frame, timestamp):
+    """Score one frame and record the students recognized in it"""
+    for box, result in batch_system.identify_faces(batch_system.gray_frame(frame)):
+        if result is not None and result[1] < batch_system.threshold:
+            keep_earliest(sightings, result[0], timestamp)
+
+def run_batch_job(job):
+    """Process one video segment or image chunk, returning (source, frames, sightings, error)"""
+    sightings = {}
+    frames = 0
+    if job[0] == "video":
+        _, video, first, last, fps, video_start, stride = job
+        capture = cv2.VideoCapture(video)
+        try:
+            if not capture.isOpened():
+                return video, 0, sightings, "could not open video"
+            capture.set(cv2.CAP_PROP_POS_FRAMES, first)
+            for index in (range(first, last) if last is not None else itertools.count(first)):
+                # grab() skips decoding frames that the stride drops
+                if (index - first) % stride:
+                    if not capture.grab():
+                        break
+                    continue
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                batch_sight(sightings, frame, video_start + index / fps)
+                frames += 1
+        finally:
+            capture.release()
+        return video, frames, sightings, None
+    
+    _, images, stride = job
+    for path in images[::stride]:
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        batch_sight(sightings, frame, image_timestamp(path))
+        frames += 1
+    return os.path.dirname(images[0]) or ".", frames, sightings, None
+
+def run_batch(paths, groups=None, workers=None, stride=1, start=None):
+    """Take attendance headless from recorded videos or image folders across worker processes"""
+    system = AttendanceSystem(groups)
+    workers = workers or os.cpu_count() or 1
+    try:
+        jobs = plan_batch_jobs(paths, workers, stride, start)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+        return
+    if not jobs:
+        print("❌ Error: No videos or images found in the given paths.")
+        return
+    
+    print(f"🎞️ Processing {len(jobs)} segments on {workers} processes...")
+    sightings = {}
+    frames = 0
+    started = time.perf_counter()
+    if workers == 1:
+        init_batch_worker(groups)
+        results = map(run_batch_job, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers, initializer=init_batch_worker, initargs=(groups,))
+        results = pool.imap_unordered(run_batch_job, jobs)
+    try:
+        for source, job_frames, job_sightings, error in results:
+            if error:
+                log.warning("⚠️ Warning: %s: %s", source, error)
+            frames += job_frames
+            for (student_id, _), timestamp in job_sightings.items():
+                keep_earliest(sightings, student_id, timestamp)
+            elapsed = time.perf_counter() - started
+            print(f"📈 {frames} frames, {frames / max(elapsed, 1e-9):.1f} frames/sec")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - started
+    
+    recorded = system.record_sightings([(student_id, datetime.datetime.fromtimestamp(timestamp))
+                                        for (student_id, _), timestamp in sightings.items()])
+    print(f"\n📊 Batch Attendance Summary:")
+    print(f"- Frames processed: {frames} in {elapsed:.1f}s ({frames / max(elapsed, 1e-9):.1f} frames/sec)")
+    print(f"- Students recognized: {len({student_id for student_id, _ in sightings})}")
+    print(f"- New attendance records: {recorded}")
+    system.close_events()
+    for (student_id, _), timestamp in sorted(sightings.items(), key=lambda item: item[1]):
+        seen_at = datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"  {seen_at}  {system.name_dict.get(student_id, 'Unknown')}")
 
 if __name__ == "__main__":
     try:
-        # Check if opencv-contrib-python is installed before creating the system
-        if not hasattr(cv2, 'face') or not hasattr(cv2.face, 'LBPHFaceRecognizer_create'):
-            print("❌ Error: OpenCV face recognition module not available")
-            print("Please install opencv-contrib-python: pip install opencv-contrib-python")
-            sys.exit(1)
-            
-        # Create and run attendance system
-        attendance_system = AttendanceSystem()
-        attendance_system.run()
+        parser = argparse.ArgumentParser(description="Take attendance from the camera, or from recordings with --batch")
+        # --group NAME (repeatable or comma-separated) limits the session to
+        # the model shards of those class sections
+        parser.add_argument("--group", action="append", default=[], help="Class section(s) to load")
+        parser.add_argument("--batch", nargs="+", metavar="PATH",
+                            help="Process video files or image folders headless instead of the camera")
+        parser.add_argument("--workers", type=int, help="Batch worker processes (default: CPU count)")
+        parser.add_argument("--stride", type=int, default=1, help="Batch: score every Nth frame or image")
+        parser.add_argument("--start", help="Batch: recording start time 'YYYY-MM-DD HH:MM:SS' "
+                                            "(default: file modification time minus duration)")
+        parser.add_argument("--source", default="camera",
+                            help="Live frame source: camera[:N], a video file, an image folder or synthetic[:DATA]")
+        parser.add_argument("--headless", action="store_true", help="Run without a display window")
+        args = parser.parse_args()
+        groups = [g.strip() for value in args.group for g in value.split(",") if g.strip()]
+        
+        if args.batch:
+            start = None
+            if args.start:
+                start = datetime.datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S").timestamp()
+            run_batch(args.batch, groups, args.workers, max(1, args.stride), start)
+        else:
+            # Create and run attendance system
+            attendance_system = AttendanceSystem(groups)
+            sink = HeadlessSink() if args.headless else None
+            attendance_system.run(open_source(args.source), sink)
     except ImportError as e:
         print(f"❌ Error: Missing required libraries: {e}")
         print("Please install the required libraries:")
@@ -0,0 +1,158 @@
+import os
+import re
+import sys
+import csv
+import glob
+import time
+import argparse
+import multiprocessing
+import cv2
+from retrain_scheduler import request_retrain, run_pending, BUSY, EXIT_BUSY
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+# Per-process face cascade, loaded once by init_worker
+detector = None
+
+def read_folder(root):
+    """Map students to photos from one subfolder per student, named '<id> <name>' or '<id>_<name>'"""
+    students = {}
+    for entry in sorted(os.listdir(root)):
+        folder = os.path.join(root, entry)
+        match = re.match(r'^(\d+)[ _-]*(.*)$', entry)
+        if not os.path.isdir(folder) or not match:
+            continue
+        photos = sorted(p for p in glob.glob(os.path.join(folder, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+        name = match.group(2).replace("_", " ").strip() or f"Student {match.group(1)}"
+        students[int(match.group(1))] = {"name": name, "roll": "", "email": "", "group": "", "photos": photos}
+    return students
+
+def read_csv(csv_path):
+    """Map students to photos from a CSV with id, name, photo and optional roll, email, group columns"""
+    students = {}
+    base = os.path.dirname(os.path.abspath(csv_path))
+    with open(csv_path, newline="") as f:
+        for row in csv.DictReader(f):
+            row = {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+            if not row.get("id", "").isdigit() or not row.get("photo"):
+                print(f"⚠️ Warning: Skipping CSV row without a numeric id and a photo: {row}")
+                continue
+            student = students.setdefault(int(row["id"]), {"name": row.get("name", ""), "roll": row.get("roll", ""),
+                                                           "email": row.get("email", ""), "group": row.get("group", ""),
+                                                           "photos": []})
+            # One row per photo; photo paths are relative to the CSV file
+            student["photos"].append(os.path.join(base, row["photo"]))
+    return students
+
+def next_sample_numbers(data_dir):
+    """Return the next free {n} of user.{id}.{n}.jpg for every ID already in data_dir"""
+    numbers = {}
+    for path in glob.glob(os.path.join(data_dir, "user.*.*.jpg")):
+        parts = os.path.basename(path).split(".")
+        if len(parts) >= 4 and parts[1].isdigit() and parts[2].isdigit():
+            numbers[int(parts[1])] = max(numbers.get(int(parts[1]), 1), int(parts[2]) + 1)
+    return numbers
+
+def init_worker():
+    """Load the face cascade once per worker process"""
+    global detector
+    cv2.setNumThreads(1)
+    detector = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+def crop_photo(job):
+    """Detect the largest face in one photo and write it as a 200x200 crop, returning (id, crop or None, error)"""
+    photo, user_id, output_path = job
+    image = cv2.imread(photo, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return user_id, None, f"could not read {photo}"
+    # Detect on a copy no larger than 1024 px; ID photos are often 10+ MP
+    scale = min(1.0, 1024.0 / max(image.shape))
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+    faces = detector.detectMultiScale(small, scaleFactor=1.1, minNeighbors=5)
+    if len(faces) == 0:
+        return user_id, None, f"no face detected in {photo}"
+    x, y, w, h = [int(v / scale) for v in max(faces, key=lambda f: f[2] * f[3])]
+    face = cv2.resize(image[y:y + h, x:x + w], (200, 200))
+    if not cv2.imwrite(output_path, face):
+        return user_id, None, f"could not write {output_path}"
+    return user_id, face, None
+
+def append_roster(students, names_file="names.txt"):
+    """Append every student not yet in names.txt in one write, returning how many were added"""
+    existing = set()
+    if os.path.exists(names_file):
+        with open(names_file, "r") as f:
+            for line in f:
+                parts = line.strip().split()
+                if parts and parts[0].isdigit():
+                    existing.add(int(parts[0]))
+    lines = [f"{student_id} {s['name']} [roll:{s['roll']}] [email:{s['email']}] [group:{s['group']}]\n"
+             for student_id, s in sorted(students.items()) if student_id not in existing]
+    if lines:
+        with open(names_file, "a") as f:
+            f.writelines(lines)
+    return len(lines)
+
+def update_model(ids, data_dir, classifier_path="classifier.yml"):
+    """Queue the new students for a model update and apply it now, returning run_pending's result"""
+    # Going through the scheduler takes its lock, so a scheduled run cannot
+    # rewrite the same model files at the same time; if one holds the lock,
+    # the request stays queued for the next run
+    request_retrain(sorted(set(ids)), reason="bulk enrollment")
+    return run_pending(data_dir, classifier_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enroll students in bulk from photo folders or a CSV")
+    parser.add_argument("source", help="Folder with one subfolder per student ('<id> <name>'), or a CSV file")
+    parser.add_argument("--data", default="data", help="Where to write the face crops")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--no-train", action="store_true", help="Only write crops and roster entries")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ Error: '{args.source}' not found.")
+        sys.exit(1)
+    students = read_csv(args.source) if os.path.isfile(args.source) else read_folder(args.source)
+    if not students:
+        print(f"❌ Error: No students found in '{args.source}'.")
+        sys.exit(1)
+
+    os.makedirs(args.data, exist_ok=True)
+    numbers = next_sample_numbers(args.data)
+    jobs = []
+    for student_id, student in sorted(students.items()):
+        n = numbers.get(student_id, 1)
+        for photo in student["photos"]:
+            jobs.append((photo, student_id, os.path.join(args.data, f"user.{student_id}.{n}.jpg")))
+            n += 1
+    print(f"🔍 Cropping {len(jobs)} photos of {len(students)} students on {args.workers} processes...")
+
+    start = time.perf_counter()
+    faces, ids, errors = [], [], []
+    with multiprocessing.Pool(args.workers, initializer=init_worker) as pool:
+        for user_id, face, error in pool.imap_unordered(crop_photo, jobs, chunksize=4):
+            if error:
+                errors.append(error)
+                continue
+            faces.append(face)
+            ids.append(user_id)
+    crop_time = time.perf_counter() - start
+
+    enrolled = {student_id: students[student_id] for student_id in set(ids)}
+    added = append_roster(enrolled)
+    for error in errors:
+        print(f"⚠️ {error}")
+    missing = sorted(set(students) - set(ids))
+    print(f"✅ {len(faces)} crops written to {args.data}/ in {crop_time:.1f}s "
+          f"({len(jobs) / max(crop_time, 1e-9):.1f} photos/sec); {added} roster entries added")
+    if missing:
+        print(f"⚠️ No usable face for {len(missing)} students: {', '.join(str(i) for i in missing)}")
+
+    if faces and not args.no_train:
+        start = time.perf_counter()
+        result = update_model(ids, args.data)
+        print(f"⏱️ Training took {time.perf_counter() - start:.1f}s")
+        if result is BUSY:
+            sys.exit(EXIT_BUSY)
+        if result is False:
+            sys.exit(1)
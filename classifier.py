@@ -3,33 +3,294 @@ from PIL import Image
 import os
 import cv2
 import sys
+import re
+import json
+import time
+import argparse
+from dataset_store import is_packed_store, open_store
+from config import load_config
+from recognizers import create_recognizer
+from gallery_pruning import prune_training_set
+from structured_log import get_logger
+
+# Problems go to the logger; the step, progress and "Training complete" lines
+# stay on stdout because the launcher and StudentManager parse them from there
+log = get_logger(__name__)
+
+MODELS_DIR = "models"
+DEFAULT_GROUP = "default"
+
+def load_groups(file_path="names.txt"):
+    """Map student IDs to their [group:...] tag from names.txt"""
+    groups = {}
+    try:
+        with open(file_path, "r") as f:
+            for line in f:
+                parts = line.strip().split()
+                if not parts or not parts[0].isdigit():
+                    continue
+                group_match = re.search(r'\[group:(.*?)\]', line)
+                group = group_match.group(1).strip() if group_match else ""
+                groups[int(parts[0])] = group or DEFAULT_GROUP
+    except FileNotFoundError:
+        log.warning("⚠️ Names file not found: %s", file_path)
+    return groups
+
+def shard_path(group, models_dir=MODELS_DIR):
+    """Return the model file used for one group's shard"""
+    safe_group = re.sub(r'[^A-Za-z0-9_-]', '_', group)
+    return os.path.join(models_dir, f"classifier.{safe_group}.yml")
+
+def write_model_atomic(clf, output_path):
+    """Write a model to a temporary file next to output_path, then rename it into place"""
+    base, ext = os.path.splitext(output_path)
+    # Keep the extension last so OpenCV still picks the YAML writer
+    tmp_path = f"{base}.tmp{ext}"
+    clf.write(tmp_path)
+    os.replace(tmp_path, output_path)
+
+def train_and_write(faces, ids, output_path):
+    """Train a fresh model with the configured backend and write it to output_path, returning the faces kept (0 on error)"""
+    try:
+        config = load_config()
+        clf = create_recognizer(config)
+        # Keep only recognition.gallery_k representative crops per student
+        faces, ids = prune_training_set(faces, ids, config)
+        clf.train(faces, np.array(ids, dtype=np.int32))
+        # A running AttendanceSystem may reload this file at any moment, so it
+        # must never observe a half-written model
+        write_model_atomic(clf, output_path)
+        return len(faces)
+    except Exception as e:
+        log.error("❌ Error training model for %s: %s", output_path, e)
+        return 0
+
+def write_models(faces, ids, sharded=False):
+    """Write classifier.yml, or one shard per registry group when sharded"""
+    if not sharded:
+        trained = train_and_write(faces, ids, "classifier.yml")
+        if trained:
+            print(f"✅ Training complete! classifier.yml saved with {trained} faces for {len(set(ids))} users.")
+        return
+
+    groups = load_groups()
+    buckets = {}
+    for face, user_id in zip(faces, ids):
+        group = groups.get(int(user_id), DEFAULT_GROUP)
+        buckets.setdefault(group, ([], []))
+        buckets[group][0].append(face)
+        buckets[group][1].append(int(user_id))
+
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    for group, (group_faces, group_ids) in sorted(buckets.items()):
+        output_path = shard_path(group)
+        trained = train_and_write(group_faces, group_ids, output_path)
+        if trained:
+            print(f"✅ Shard '{group}' saved to {output_path} with {trained} faces for {len(set(group_ids))} users.")
+    print(f"✅ Training complete! {len(buckets)} shards written to {MODELS_DIR}/")
+
+def train_from_store(store_path, sharded=False):
+    """Train straight from a memory-mapped packed dataset store"""
+    try:
+        create_recognizer(load_config())
+    except (RuntimeError, ValueError) as e:
+        log.error("❌ Error: %s", e)
+        return
+
+    # Crops in the store are already detected and normalized to 200x200,
+    # so they go to the recognizer as views into the mapping with no decoding
+    faces, ids, _ = open_store(store_path)
+    if len(faces) == 0:
+        log.error("❌ Error: No faces found in packed store '%s'!", store_path)
+        return
+
+    print(f"🧠 Training classifier with {len(faces)} faces from {store_path}...")
+    write_models([faces[i] for i in range(len(faces))], ids.tolist(), sharded)
+
+def load_training_face(image_path, detector, verbose=True):
+    """Detect and crop the face in one user.{id}.{count}.jpg image, returning (face, id) or None"""
+    try:
+        # Convert image to grayscale
+        gray_image = Image.open(image_path).convert('L')
+        image_np = np.array(gray_image, "uint8")
+
+        # Extract numeric ID from filename
+        # Format is user.{id}.{count}.jpg as per script.py and collect_training_data.py
+        filename = os.path.basename(image_path)
+        parts = filename.split(".")
+        
+        if len(parts) < 3 or not parts[0] == "user" or not parts[1].isdigit():
+            log.warning("⚠️ Skipping %s: Invalid filename format. Expected: user.{id}.{count}.jpg", filename)
+            return None
+
+        user_id = int(parts[1])
+
+        # Detect faces in the image
+        detected_faces = detector.detectMultiScale(image_np, scaleFactor=1.1, minNeighbors=5)
+        
+        if len(detected_faces) == 0:
+            log.warning("⚠️ No face detected in %s", filename)
+            return None
+            
+        # Use only the first face detected as in script.py, resized to
+        # standard size for better recognition
+        (x, y, w, h) = detected_faces[0]
+        face = cv2.resize(image_np[y:y+h, x:x+w], (200, 200))
+        if verbose:
+            log.info("✅ Processed %s for user ID %d", filename, user_id)
+        return face, user_id
+
+    except Exception as e:
+        log.error("❌ Error processing %s: %s", image_path, e)
+        return None
+
+def checkpoint_paths(output_path):
+    """Return the (model, state) files used to checkpoint a chunked training run"""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}.ckpt{ext}", f"{base}.ckpt.json"
+
+def train_classifier_chunked(data_dir, chunk_size=200, checkpoint_every=5, output_path="classifier.yml", restart=False):
+    """Train in fixed-size batches through update(), checkpointing so a crash can resume
+
+    Only one chunk of images is held in memory at a time. The model is
+    written to a checkpoint every checkpoint_every chunks along with the
+    number of images already consumed; rerunning the same command picks up
+    from there. Progress lines ("Progress: done/total ... ETA Ns") are
+    printed for the launcher to display.
+    """
+    config = load_config()
+    try:
+        clf = create_recognizer(config)
+    except (RuntimeError, ValueError) as e:
+        log.error("❌ Error: %s", e)
+        return
+
+    # Build the list of work items: memmap row indices or image paths
+    packed = is_packed_store(data_dir)
+    if packed:
+        store_faces, store_ids, _ = open_store(data_dir)
+        items = list(range(len(store_faces)))
+    elif os.path.isdir(data_dir):
+        items = sorted(os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith(('.jpg', '.png', '.jpeg')))
+        detector = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        if detector.empty():
+            log.error("❌ Error: Could not load face cascade classifier!")
+            return
+    else:
+        log.error("❌ Error: Data directory '%s' does not exist!", data_dir)
+        return
+
+    if not items:
+        log.error("❌ Error: No images found in '%s'!", data_dir)
+        return
+
+    checkpoint_model, checkpoint_state = checkpoint_paths(output_path)
+    state = {
+        "source": os.path.abspath(data_dir),
+        "total": len(items),
+        "chunk_size": chunk_size,
+        "backend": config["recognition"]["backend"],
+        "processed": 0,
+        "faces": 0,
+    }
+
+    # Resume only if the checkpoint was made for this exact run
+    if not restart and os.path.exists(checkpoint_state) and os.path.exists(checkpoint_model):
+        try:
+            with open(checkpoint_state, "r") as f:
+                saved = json.load(f)
+            if all(saved.get(key) == state[key] for key in ("source", "total", "chunk_size", "backend")):
+                clf.read(checkpoint_model)
+                state = saved
+                print(f"♻️ Resuming from checkpoint: {state['processed']}/{state['total']} images already trained")
+            else:
+                log.warning("⚠️ Checkpoint belongs to a different dataset or settings. Starting over.")
+        except Exception as e:
+            log.warning("⚠️ Could not read checkpoint, starting over: %s", e)
+
+    if not clf.incremental:
+        log.error("❌ Error: The '%s' backend cannot be trained in chunks. Use 'lbph' or 'lbph-q'.", clf.name)
+        return
+
+    print(f"🧠 Training on {state['total']} images in chunks of {chunk_size}...")
+    start_time = time.time()
+    start_processed = state["processed"]
+    chunks_since_checkpoint = 0
+
+    while state["processed"] < state["total"]:
+        chunk = items[state["processed"]:state["processed"] + chunk_size]
+        faces = []
+        ids = []
+        if packed:
+            # Slicing the memmap only pages in this chunk's crops
+            faces = [store_faces[i] for i in chunk]
+            ids = [int(store_ids[i]) for i in chunk]
+        else:
+            for image_path in chunk:
+                result = load_training_face(image_path, detector, verbose=False)
+                if result is not None:
+                    faces.append(result[0])
+                    ids.append(result[1])
+
+        if faces:
+            clf.update(faces, np.array(ids, dtype=np.int32))
+        state["processed"] += len(chunk)
+        state["faces"] += len(faces)
+        chunks_since_checkpoint += 1
+
+        elapsed = time.time() - start_time
+        done_now = state["processed"] - start_processed
+        eta = elapsed / done_now * (state["total"] - state["processed"]) if done_now else 0
+        percent = state["processed"] * 100 // state["total"]
+        print(f"📈 Progress: {state['processed']}/{state['total']} images ({percent}%) - ETA {eta:.0f}s", flush=True)
+
+        if chunks_since_checkpoint >= checkpoint_every and state["processed"] < state["total"]:
+            write_model_atomic(clf, checkpoint_model)
+            with open(checkpoint_state + ".tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(checkpoint_state + ".tmp", checkpoint_state)
+            chunks_since_checkpoint = 0
+
+    if state["faces"] == 0:
+        log.error("❌ No faces detected. Check your dataset.")
+        return
+
+    write_model_atomic(clf, output_path)
+    for path in (checkpoint_model, checkpoint_state):
+        if os.path.exists(path):
+            os.remove(path)
+    print(f"✅ Training complete! {output_path} saved with {state['faces']} faces in {time.time() - start_time:.1f}s.")
+
+def train_classifier(data_dir, sharded=False):
+    # A packed store is a single file, so check for it before treating data_dir as a folder
+    if is_packed_store(data_dir):
+        train_from_store(data_dir, sharded)
+        return
 
-def train_classifier(data_dir):
     # Ensure data directory exists
     if not os.path.exists(data_dir):
-        print(f"❌ Error: Data directory '{data_dir}' does not exist!")
+        log.error("❌ Error: Data directory '%s' does not exist!", data_dir)
         os.makedirs(data_dir)
-        print(f"✅ Created data directory: {data_dir}")
+        log.info("✅ Created data directory: %s", data_dir)
         return
 
     # Check if there are any images in the directory
     image_paths = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith(('.jpg', '.png', '.jpeg'))]
     if not image_paths:
-        print(f"❌ Error: No images found in '{data_dir}' directory!")
+        log.error("❌ Error: No images found in '%s' directory!", data_dir)
         return
 
-    # Ensure OpenCV's LBPHFaceRecognizer is available
+    # Ensure the configured recognizer backend is available
     try:
-        clf = cv2.face.LBPHFaceRecognizer_create()
-    except AttributeError:
-        print("❌ Error: OpenCV is missing face recognizer module!")
-        print("Please install opencv-contrib-python: pip install opencv-contrib-python")
+        create_recognizer(load_config())
+    except (RuntimeError, ValueError) as e:
+        log.error("❌ Error: %s", e)
         return
 
     # Load face detector
     detector = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
     if detector.empty():
-        print("❌ Error: Could not load face cascade classifier!")
+        log.error("❌ Error: Could not load face cascade classifier!")
         return
     
     faces = []
@@ -38,54 +299,32 @@ def train_classifier(data_dir):
     print(f"🔍 Processing {len(image_paths)} images...")
 
     for image_path in image_paths:
-        try:
-            # Convert image to grayscale
-            gray_image = Image.open(image_path).convert('L')
-            image_np = np.array(gray_image, "uint8")
-
-            # Extract numeric ID from filename
-            # Format is user.{id}.{count}.jpg as per script.py and collect_training_data.py
-            filename = os.path.basename(image_path)
-            parts = filename.split(".")
-            
-            if len(parts) < 3 or not parts[0] == "user" or not parts[1].isdigit():
-                print(f"⚠️ Skipping {filename}: Invalid filename format. Expected: user.{id}.{count}.jpg")
-                continue
-
-            user_id = int(parts[1])
-
-            # Detect faces in the image
-            detected_faces = detector.detectMultiScale(image_np, scaleFactor=1.1, minNeighbors=5)
-            
-            if len(detected_faces) == 0:
-                print(f"⚠️ No face detected in {filename}")
-                continue
-                
-            for (x, y, w, h) in detected_faces:
-                # Resize to standard size for better recognition
-                face = cv2.resize(image_np[y:y+h, x:x+w], (200, 200))
-                faces.append(face)
-                ids.append(user_id)
-                print(f"✅ Processed {filename} for user ID {user_id}")
-                break  # Use only the first face detected as in script.py
-
-        except Exception as e:
-            print(f"❌ Error processing {image_path}: {e}")
+        result = load_training_face(image_path, detector)
+        if result is not None:
+            faces.append(result[0])
+            ids.append(result[1])
 
     # Ensure faces were detected before training
     if len(faces) > 0:
         print(f"🧠 Training classifier with {len(faces)} faces...")
-        clf.train(faces, np.array(ids, dtype=np.int32))
-        clf.write("classifier.yml")
-        print(f"✅ Training complete! classifier.yml saved with {len(faces)} faces for {len(set(ids))} users.")
+        write_models(faces, ids, sharded)
     else:
-        print("❌ No faces detected. Check your dataset.")
+        log.error("❌ No faces detected. Check your dataset.")
 
 # Run the training function
 if __name__ == "__main__":
-    # Accept command line argument for data directory
-    data_dir = "data"
-    if len(sys.argv) > 1:
-        data_dir = sys.argv[1]
+    # Accept command line argument for data directory, plus --shards to
+    # write one model per [group:...] tag instead of a single classifier.yml
+    parser = argparse.ArgumentParser(description="Train the face recognition model")
+    parser.add_argument("data_dir", nargs="?", default="data", help="Data directory or packed store")
+    parser.add_argument("--shards", action="store_true", help="Write one model shard per student group")
+    parser.add_argument("--chunk-size", type=int, default=0,
+                        help="Stream training in batches of this many images with checkpoints")
+    parser.add_argument("--checkpoint-every", type=int, default=5, help="Chunks between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
     
-    train_classifier(data_dir)
\ No newline at end of file
+    if args.chunk_size > 0:
+        train_classifier_chunked(args.data_dir, args.chunk_size, args.checkpoint_every, restart=args.restart)
+    else:
+        train_classifier(args.data_dir, args.shards)
\ No newline at end of file
@@ -2,6 +2,147 @@ import cv2
 import os
 import sys
 import re
+import time
+import queue
+import threading
+from config import load_config
+from frame_sources import CameraSource
+from retrain_scheduler import request_retrain, run_pending, scheduler_alive
+from structured_log import get_logger
+
+log = get_logger(__name__)
+
+# Give up on a camera after this many failed reads in a row (about 5 s),
+# keeping whatever was captured so far
+MAX_FAILED_READS = 50
+
+class CropWriter:
+    """Encode and save face crops on a background thread so capture never waits on disk"""
+    def __init__(self, max_pending=64):
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            path, image = item
+            try:
+                if cv2.imwrite(path, image):
+                    self.written += 1
+                else:
+                    self.errors += 1
+            except Exception as e:
+                print(f"❌ Error saving {path}: {e}")
+                self.errors += 1
+
+    def submit(self, path, image):
+        self.pending.put((path, image))
+
+    def close(self):
+        """Wait for every queued crop to be written"""
+        self.pending.put(None)
+        self.thread.join()
+
+def crop_quality(face, min_sharpness, min_brightness=40, max_brightness=215):
+    """Return None for a usable crop, or why it was rejected"""
+    brightness = face.mean()
+    if brightness < min_brightness or brightness > max_brightness:
+        return "exposure"
+    # Variance of the Laplacian drops sharply on motion blur and defocus
+    if cv2.Laplacian(face, cv2.CV_64F).var() < min_sharpness:
+        return "blurry"
+    return None
+
+def is_distinct(face, accepted, min_difference):
+    """True when a crop differs enough from every crop already kept"""
+    thumb = cv2.resize(face, (32, 32), interpolation=cv2.INTER_AREA).astype("float32")
+    # Compare with the mean brightness removed so a lighting flicker alone
+    # does not count as a new pose
+    thumb -= thumb.mean()
+    for other in accepted:
+        if cv2.absdiff(thumb, other).mean() < min_difference:
+            return False
+    accepted.append(thumb)
+    return True
+
+def camera_lost(failed_reads, count, max_images):
+    """Wait briefly after a failed read; True once the camera has failed MAX_FAILED_READS times in a row"""
+    if failed_reads < MAX_FAILED_READS:
+        # CameraSource has already tried to reopen the camera; do not spin on a dead one
+        time.sleep(0.1)
+        return False
+    log.error("❌ Error: Camera stopped delivering frames. Stopping with %d/%d images.", count, max_images)
+    return True
+
+def collect_burst(cap, face_cascade, user_id, data_path, max_images, settings):
+    """Grab frames at camera rate until max_images distinct, good-quality crops are queued"""
+    writer = CropWriter()
+    accepted = []
+    rejected = {"small": 0, "exposure": 0, "blurry": 0, "duplicate": 0}
+    frames = 0
+    failed_reads = 0
+    count = 0
+    start = time.perf_counter()
+    try:
+        while count < max_images:
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                failed_reads += 1
+                if camera_lost(failed_reads, count, max_images):
+                    break
+                continue
+            failed_reads = 0
+            frames += 1
+
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
+            if len(faces) > 0:
+                # Only capture one face at a time: the largest
+                x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+                if w < 100 or h < 100:
+                    rejected["small"] += 1
+                    status, color = "Move closer!", (0, 0, 255)
+                else:
+                    face = cv2.resize(gray[y:y+h, x:x+w], (200, 200))
+                    problem = crop_quality(face, settings.get("min_sharpness", 15))
+                    if problem is None and not is_distinct(face, accepted, settings.get("min_difference", 1.5)):
+                        problem = "duplicate"
+                    if problem is None:
+                        count += 1
+                        writer.submit(f"{data_path}user.{user_id}.{count}.jpg", face)
+                        status, color = f"Saved {count}/{max_images}", (0, 255, 0)
+                        # Same format as chunked training, so StudentManager can show it
+                        eta = (time.perf_counter() - start) / count * (max_images - count)
+                        print(f"📈 Progress: {count}/{max_images} images ({count * 100 // max_images}%) - ETA {eta:.0f}s",
+                              flush=True)
+                    else:
+                        rejected[problem] += 1
+                        status, color = "Turn your head slightly" if problem == "duplicate" else f"Rejected: {problem}", (0, 165, 255)
+                cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+                cv2.putText(frame, status, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+            cv2.putText(frame, f"Burst: {count}/{max_images}", (10, 30),
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            cv2.imshow("Face Capture", frame)
+            # waitKey(1) only services the window; it does not throttle capture
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"⏱️ Enrollment took {elapsed:.1f}s for user ID {user_id}: {writer.written} crops from {frames} frames "
+          f"({frames / max(elapsed, 1e-9):.1f} fps)")
+    print(f"   Rejected: {rejected['small']} too small, {rejected['exposure']} badly exposed, "
+          f"{rejected['blurry']} blurry, {rejected['duplicate']} near-duplicates")
+    if writer.errors:
+        print(f"⚠️ {writer.errors} crops could not be written")
+    return writer.written
 
 def save_name(user_id, name, file_path="names.txt"):
     """Save student name to file with roll number support"""
@@ -52,12 +193,17 @@ def main():
         os.makedirs(data_path)
         print(f"✅ Created data directory: {data_path}")
 
+    # --burst skips the countdown and per-face delays and keeps only
+    # distinct, good-quality crops
+    args = [arg for arg in sys.argv[1:] if arg != "--burst"]
+    burst = len(args) != len(sys.argv) - 1
+
     # Ask for user ID and name
     # Check if provided as command-line arguments
-    if len(sys.argv) >= 3:
+    if len(args) >= 2:
         try:
-            user_id = int(sys.argv[1])
-            name = " ".join(sys.argv[2:])
+            user_id = int(args[0])
+            name = " ".join(args[1:])
             save_name(user_id, name)
         except ValueError:
             print("❌ Error: User ID must be a number")
@@ -74,109 +220,128 @@ def main():
     print(f"👤 Collecting faces for ID: {user_id}, Name: {name}")
     print("🔍 Position your face in front of the camera")
     
-    # Set max_images to 20 for consistency with script.py
-    max_images = 20
+    # Image count comes from config.json (20 by default, as in script.py)
+    collection = load_config()["collection"]
+    max_images = collection.get("max_images", 20)
     print(f"📊 Will capture {max_images} images automatically")
     print("⌨️ Press 'q' to quit early")
 
     # How many images to collect
     count = 0
 
-    # Start capturing video
-    cap = cv2.VideoCapture(0)
+    # Start capturing video; CameraSource reopens the camera when a read fails
+    cap = CameraSource(0)
 
-    if not cap.isOpened():
+    if not cap.is_opened():
         print("❌ Error: Could not open camera.")
         sys.exit(1)
 
-    # Wait a bit for camera to initialize
-    for i in range(5, 0, -1):
-        ret, frame = cap.read()
-        if ret:
-            cv2.putText(frame, f"Starting capture in {i}...", (50, 50), 
-                      cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            cv2.imshow("Face Capture", frame)
-            cv2.waitKey(1000)  # Wait 1 second between countdown
+    if burst:
+        count = collect_burst(cap, face_cascade, user_id, data_path, max_images, collection)
+    else:
+        # Wait a bit for camera to initialize
+        for i in range(5, 0, -1):
+            ret, frame = cap.read()
+            if ret:
+                cv2.putText(frame, f"Starting capture in {i}...", (50, 50), 
+                          cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                cv2.imshow("Face Capture", frame)
+                cv2.waitKey(1000)  # Wait 1 second between countdown
 
-    while count < max_images:
-        ret, frame = cap.read()
+        failed_reads = 0
+        while count < max_images:
+            ret, frame = cap.read()
         
-        if not ret or frame is None:
-            print("⚠️ Could not read frame from camera. Retrying...")
-            continue  # Skip this iteration and try again
+            if not ret or frame is None:
+                failed_reads += 1
+                if camera_lost(failed_reads, count, max_images):
+                    break
+                continue  # Skip this iteration and try again
+            failed_reads = 0
 
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
+            # Convert to grayscale for face detection
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
 
-        # Draw rectangle around face and add text
-        cv2.putText(frame, f"Capturing: {count}/{max_images}", (10, 30), 
-                  cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            # Draw rectangle around face and add text
+            cv2.putText(frame, f"Capturing: {count}/{max_images}", (10, 30), 
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
                   
-        if len(faces) == 0:
-            cv2.putText(frame, "No face detected!", (10, 60), 
-                      cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-        else:
-            for (x, y, w, h) in faces:
-                # Draw a rectangle around the face
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+            if len(faces) == 0:
+                cv2.putText(frame, "No face detected!", (10, 60), 
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            else:
+                for (x, y, w, h) in faces:
+                    # Draw a rectangle around the face
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
                 
-                # Only proceed if face meets minimum size requirements
-                if w >= 100 and h >= 100:  # Minimum face size check
-                    count += 1
+                    # Only proceed if face meets minimum size requirements
+                    if w >= 100 and h >= 100:  # Minimum face size check
+                        count += 1
                     
-                    # Extract the face region and resize to standard size
-                    face = gray[y:y+h, x:x+w]
-                    face_resized = cv2.resize(face, (200, 200))
+                        # Extract the face region and resize to standard size
+                        face = gray[y:y+h, x:x+w]
+                        face_resized = cv2.resize(face, (200, 200))
 
-                    # Save the face images in the dataset folder
-                    # Format: user.{id}.{count}.jpg to match expectations in classifier.py
-                    file_name = f"{data_path}user.{user_id}.{count}.jpg"
-                    cv2.imwrite(file_name, face_resized)
+                        # Save the face images in the dataset folder
+                        # Format: user.{id}.{count}.jpg to match expectations in classifier.py
+                        file_name = f"{data_path}user.{user_id}.{count}.jpg"
+                        cv2.imwrite(file_name, face_resized)
 
-                    cv2.putText(frame, f"Saving {count}/{max_images}", (x, y-10), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+                        cv2.putText(frame, f"Saving {count}/{max_images}", (x, y-10), 
+                                  cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
                     
-                    # Add a small delay to ensure diverse face images
-                    cv2.waitKey(200)
-                else:
-                    cv2.putText(frame, "Move closer!", (x, y-10), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                        # Add a small delay to ensure diverse face images
+                        cv2.waitKey(200)
+                    else:
+                        cv2.putText(frame, "Move closer!", (x, y-10), 
+                                  cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
                 
-                # Only capture one face at a time
-                break
+                    # Only capture one face at a time
+                    break
 
-        cv2.imshow("Face Capture", frame)
+            cv2.imshow("Face Capture", frame)
 
-        # Check for 'q' key press or if we've captured enough images
-        key = cv2.waitKey(100) & 0xFF
-        if key == ord('q'):
-            break
+            # Check for 'q' key press or if we've captured enough images
+            key = cv2.waitKey(100) & 0xFF
+            if key == ord('q'):
+                break
         
-        if count >= max_images:
-            # Show completion message for a moment
-            cv2.putText(frame, "Capture complete!", (50, 50), 
-                      cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            cv2.imshow("Face Capture", frame)
-            cv2.waitKey(1000)
-            break
+            if count >= max_images:
+                # Show completion message for a moment
+                cv2.putText(frame, "Capture complete!", (50, 50), 
+                          cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                cv2.imshow("Face Capture", frame)
+                cv2.waitKey(1000)
+                break
 
     cap.release()
     cv2.destroyAllWindows()
 
     print(f"✅ Completed! {count} images saved in {data_path} for user ID {user_id}.")
-    print("ℹ️ Next step: Run the classifier training to update the model.")
+    if 0 < count < max_images:
+        print(f"⚠️ Partial enrollment: {count} of {max_images} images captured. Collect again to add more.")
+    if count == 0:
+        return
     
-    # Ask if user wants to train the classifier now
-    if count > 0:
-        try:
-            response = input("Do you want to train the classifier now? (y/n): ").lower()
+    # Queue a model update instead of retraining right away, so a run of
+    # enrollments is folded into one update once they go quiet
+    request_retrain([user_id])
+    if scheduler_alive():
+        print("🕒 Model update queued; it runs once enrollments go quiet.")
+        return
+    # Nothing is hosting the scheduler (no launcher or StudentManager open)
+    try:
+        if sys.stdin.isatty():
+            response = input("Do you want to update the model now? (y/n): ").lower()
             if response == 'y' or response == 'yes':
-                print("🧠 Training classifier...")
-                import subprocess
-                subprocess.run([sys.executable, "classifier.py"])
-        except Exception as e:
-            print(f"❌ Error running classifier: {e}")
+                print("🧠 Updating the model...")
+                run_pending(data_path)
+                return
+    except Exception as e:
+        print(f"❌ Error updating the model: {e}")
+        return
+    print("ℹ️ Model update queued. Apply it with: python retrain_scheduler.py --once")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from config import load_config
+from dataset_store import load_crops
+from recognizers import BACKENDS, create_recognizer, recognition_threshold
+
+def split_dataset(faces, ids, test_every=4):
+    """Hold out every test_every-th sample of each user for testing"""
+    train_faces, train_ids, test_faces, test_ids = [], [], [], []
+    seen = {}
+    for face, user_id in zip(faces, ids):
+        seen[user_id] = seen.get(user_id, 0) + 1
+        if seen[user_id] % test_every == 0:
+            test_faces.append(face)
+            test_ids.append(user_id)
+        else:
+            train_faces.append(face)
+            train_ids.append(user_id)
+    return train_faces, train_ids, test_faces, test_ids
+
+def evaluate_backend(backend, config, train_faces, train_ids, test_faces, test_ids, repeats=5):
+    """Train one backend and measure model size, load time, predict latency and accuracy"""
+    clf = create_recognizer(config, backend)
+    start = time.perf_counter()
+    clf.train(train_faces, train_ids)
+    train_time = time.perf_counter() - start
+
+    fd, model_path = tempfile.mkstemp(suffix=".model")
+    os.close(fd)
+    try:
+        clf.write(model_path)
+        model_size = os.path.getsize(model_path)
+
+        load_times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            loaded = create_recognizer(config, backend)
+            loaded.read(model_path)
+            load_times.append(time.perf_counter() - start)
+    finally:
+        os.remove(model_path)
+
+    threshold = recognition_threshold(config, backend)
+    correct = 0
+    accepted = 0
+    start = time.perf_counter()
+    predictions = [loaded.predict(face) for face in test_faces]
+    predict_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded.predict_batch(test_faces)
+    batch_time = time.perf_counter() - start
+
+    for (predicted, distance), actual in zip(predictions, test_ids):
+        if predicted == actual:
+            correct += 1
+            if distance < threshold:
+                accepted += 1
+
+    count = max(len(test_faces), 1)
+    return {
+        "backend": backend,
+        "model_size_kb": round(model_size / 1024, 1),
+        "train_s": round(train_time, 4),
+        "load_ms": round(sorted(load_times)[len(load_times) // 2] * 1000, 3),
+        "predict_ms": round(predict_time / count * 1000, 3),
+        "batch_predict_ms": round(batch_time / count * 1000, 3),
+        "rank1_accuracy": round(correct / count, 4),
+        "accepted_accuracy": round(accepted / count, 4),
+        "threshold": threshold,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare recognizer backends on the saved face crops")
+    parser.add_argument("data", nargs="?", default="data", help="Data directory or packed store")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma-separated backends to compare")
+    parser.add_argument("--test-every", type=int, default=4, help="Hold out every Nth crop of each user")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    config = load_config()
+    faces, ids = load_crops(args.data)
+    if not faces:
+        print(f"❌ Error: No face crops found in '{args.data}'!")
+        sys.exit(1)
+
+    train_faces, train_ids, test_faces, test_ids = split_dataset(faces, ids, args.test_every)
+    print(f"🔍 Comparing backends on {len(train_faces)} training and {len(test_faces)} test crops "
+          f"for {len(set(ids))} users...")
+
+    results = []
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        try:
+            result = evaluate_backend(backend, config, train_faces, train_ids, test_faces, test_ids)
+        except Exception as e:
+            print(f"⚠️ {backend}: could not be evaluated: {e}")
+            results.append({"backend": backend, "error": str(e)})
+            continue
+        results.append(result)
+
+    print(f"\n{'Backend':<8} {'Size KB':>9} {'Load ms':>9} {'Predict ms':>11} {'Batch ms':>9} {'Rank-1':>7} {'Accepted':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<8} {'error':>9}")
+            continue
+        print(f"{r['backend']:<8} {r['model_size_kb']:>9} {r['load_ms']:>9} {r['predict_ms']:>11} "
+              f"{r['batch_predict_ms']:>9} {r['rank1_accuracy']:>7.1%} {r['accepted_accuracy']:>9.1%}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.json_path}")
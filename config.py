@@ -0,0 +1,105 @@
+import json
+import os
+import copy
+import logging
+
+CONFIG_FILE = "config.json"
+
+# Mirrors config.json so a missing or partial file still yields every key
+DEFAULT_CONFIG = {
+    "face_detection": {
+        "scaleFactor": 1.3,
+        "minNeighbors": 5,
+        "minSize": [30, 30]
+    },
+    "paths": {
+        "data_dir": "data",
+        "attendance_dir": "attendance",
+        "names_file": "names.txt",
+        "classifier_file": "classifier.yml"
+    },
+    "collection": {
+        "max_images": 20,
+        "image_size": [200, 200],
+        "min_sharpness": 15,
+        "min_difference": 1.5
+    },
+    "recognition": {
+        "backend": "lbph",
+        "confidence_threshold": 80,
+        "script_threshold": 70,
+        "thresholds": {},
+        "pca_components": 64,
+        "quantization": "uint8",
+        "predict_workers": None,
+        "gallery_k": 0,
+        "face_size": [200, 200],
+        "lbph": {
+            "radius": 1,
+            "neighbors": 8,
+            "grid_x": 8,
+            "grid_y": 8
+        }
+    },
+    "motion": {
+        "enabled": True,
+        "pixel_threshold": 25,
+        "min_changed_fraction": 0.002,
+        "refresh_seconds": 2.0,
+        "roi": None
+    },
+    "eye_check": {
+        "enabled": False,
+        "min_eyes": 1,
+        "scale_factor": 1.1,
+        "min_neighbors": 3,
+        "upper_fraction": 0.6
+    },
+    "training": {
+        "quiet_seconds": 60,
+        "max_delay_seconds": 600,
+        "schedule": None
+    },
+    "events": {
+        "enabled": False,
+        "jsonl_dir": "events",
+        "socket": None,
+        "camera": "camera0",
+        "queue_size": 1000
+    },
+    "logging": {
+        "level": "INFO",
+        "format": "text",
+        "file": None,
+        "rate_limit_seconds": 10,
+        "rate_limit_burst": 5
+    }
+}
+
+def merge_config(defaults, overrides):
+    """Recursively overlay overrides on top of defaults"""
+    merged = copy.deepcopy(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def load_config(file_path=CONFIG_FILE):
+    """Load config.json merged over the built-in defaults"""
+    if not os.path.exists(file_path):
+        return copy.deepcopy(DEFAULT_CONFIG)
+    try:
+        with open(file_path, "r") as f:
+            return merge_config(DEFAULT_CONFIG, json.load(f))
+    except Exception as e:
+        # structured_log reads this file itself, so it cannot be imported here
+        logging.getLogger(__name__).warning("⚠️ Warning: Could not read %s, using defaults: %s", file_path, e)
+        return copy.deepcopy(DEFAULT_CONFIG)
+
+def save_config(config, file_path=CONFIG_FILE):
+    """Write config back to disk, keeping the existing two-space layout"""
+    with open(file_path, "w") as f:
+        json.dump(config, f, indent=2)
+        f.write("\n")
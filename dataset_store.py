@@ -0,0 +1,196 @@
+import numpy as np
+import os
+import sys
+import csv
+import cv2
+from structured_log import get_logger
+
+log = get_logger(__name__)
+
+# Every crop in the packed store has the same shape as the JPEGs written by
+# collect_training_data.py, so record i lives at byte offset i * FACE_BYTES.
+FACE_SIZE = (200, 200)
+FACE_BYTES = FACE_SIZE[0] * FACE_SIZE[1]
+INDEX_HEADER = ['ID', 'Sample', 'Source']
+
+def index_path(store_path):
+    """Return the path of the label index that sits next to a packed store"""
+    return store_path + ".idx"
+
+def is_packed_store(path):
+    """Check whether a path points to a packed dataset store"""
+    return os.path.isfile(path) and os.path.exists(index_path(path))
+
+def load_index(store_path):
+    """Load the (ID, Sample, Source) rows of a packed store"""
+    rows = []
+    if not os.path.exists(index_path(store_path)):
+        return rows
+    with open(index_path(store_path), "r", newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Skip header
+        for row in reader:
+            if len(row) < 2:
+                continue
+            rows.append((int(row[0]), int(row[1]), row[2] if len(row) > 2 else ""))
+    return rows
+
+def open_store(store_path):
+    """Memory-map a packed store and return (faces, ids, index rows)
+
+    faces is a read-only uint8 array of shape (n, 200, 200). Only records that
+    made it into the index are exposed, so a crash between writing the pixels
+    and the index never surfaces a half-written crop.
+    """
+    rows = load_index(store_path)
+    count = min(len(rows), os.path.getsize(store_path) // FACE_BYTES)
+    ids = np.array([row[0] for row in rows[:count]], dtype=np.int32)
+    if count == 0:
+        return np.empty((0,) + FACE_SIZE, dtype=np.uint8), ids, rows[:count]
+    faces = np.memmap(store_path, dtype=np.uint8, mode='r', shape=(count,) + FACE_SIZE)
+    return faces, ids, rows[:count]
+
+def append_faces(store_path, faces, ids, sources=None):
+    """Append face crops (resized to 200x200 if needed) and their labels"""
+    rows = load_index(store_path)
+    next_sample = {}
+    for user_id, sample, _ in rows:
+        next_sample[user_id] = max(next_sample.get(user_id, 0), sample)
+
+    new_index = not os.path.exists(index_path(store_path))
+    # Drop any trailing bytes left by an interrupted append before adding more
+    if os.path.exists(store_path) and os.path.getsize(store_path) != len(rows) * FACE_BYTES:
+        with open(store_path, "r+b") as f:
+            f.truncate(len(rows) * FACE_BYTES)
+
+    added = []
+    with open(store_path, "ab") as data_file:
+        for i, (face, user_id) in enumerate(zip(faces, ids)):
+            face = np.asarray(face, dtype=np.uint8)
+            if face.shape != FACE_SIZE:
+                face = cv2.resize(face, FACE_SIZE)
+            user_id = int(user_id)
+            next_sample[user_id] = next_sample.get(user_id, 0) + 1
+            source = sources[i] if sources else ""
+            data_file.write(np.ascontiguousarray(face).tobytes())
+            added.append((user_id, next_sample[user_id], source))
+        data_file.flush()
+        os.fsync(data_file.fileno())
+
+    with open(index_path(store_path), "a", newline='') as f:
+        writer = csv.writer(f)
+        if new_index:
+            writer.writerow(INDEX_HEADER)
+        writer.writerows(added)
+    return len(added)
+
+def import_jpegs(data_dir, store_path):
+    """Pack user.{id}.{count}.jpg crops from data_dir into a store"""
+    if not os.path.exists(data_dir):
+        print(f"❌ Error: Data directory '{data_dir}' does not exist!")
+        return 0
+
+    # Skip files that were imported by an earlier run
+    already_packed = {row[2] for row in load_index(store_path)} if os.path.exists(store_path) else set()
+
+    faces = []
+    ids = []
+    sources = []
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith(('.jpg', '.png', '.jpeg')) or filename in already_packed:
+            continue
+        parts = filename.split(".")
+        if len(parts) < 3 or not parts[0] == "user" or not parts[1].isdigit():
+            log.warning("⚠️ Skipping %s: Invalid filename format. Expected: user.{id}.{count}.jpg", filename)
+            continue
+        image = cv2.imread(os.path.join(data_dir, filename), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            log.warning("⚠️ Could not read %s", filename)
+            continue
+        faces.append(image)
+        ids.append(int(parts[1]))
+        sources.append(filename)
+
+    if not faces:
+        print(f"ℹ️ No new images to pack from '{data_dir}'")
+        return 0
+
+    added = append_faces(store_path, faces, ids, sources)
+    print(f"✅ Packed {added} images from {data_dir} into {store_path}")
+    return added
+
+def export_jpegs(store_path, data_dir):
+    """Write every crop in a store back out as user.{id}.{sample}.jpg"""
+    if not is_packed_store(store_path):
+        print(f"❌ Error: '{store_path}' is not a packed dataset store")
+        return 0
+
+    os.makedirs(data_dir, exist_ok=True)
+    faces, ids, rows = open_store(store_path)
+    for face, (user_id, sample, _) in zip(faces, rows):
+        cv2.imwrite(os.path.join(data_dir, f"user.{user_id}.{sample}.jpg"), np.asarray(face))
+    print(f"✅ Exported {len(rows)} images from {store_path} to {data_dir}")
+    return len(rows)
+
+def load_crops(source):
+    """Load (faces, ids) from a packed store or a folder of user.{id}.{count}.jpg crops
+
+    Unlike classifier.py this does not re-run face detection, so it is meant
+    for tools that score the saved crops as-is.
+    """
+    if is_packed_store(source):
+        faces, ids, _ = open_store(source)
+        return [faces[i] for i in range(len(faces))], ids.tolist()
+
+    faces = []
+    ids = []
+    if not os.path.isdir(source):
+        return faces, ids
+    for filename in sorted(os.listdir(source)):
+        parts = filename.split(".")
+        if not filename.endswith(('.jpg', '.png', '.jpeg')) or len(parts) < 3 \
+                or parts[0] != "user" or not parts[1].isdigit():
+            continue
+        image = cv2.imread(os.path.join(source, filename), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            continue
+        if image.shape != FACE_SIZE:
+            image = cv2.resize(image, FACE_SIZE)
+        faces.append(image)
+        ids.append(int(parts[1]))
+    return faces, ids
+
+def print_info(store_path):
+    """Print a summary of a packed store"""
+    if not is_packed_store(store_path):
+        print(f"❌ Error: '{store_path}' is not a packed dataset store")
+        return
+    faces, ids, _ = open_store(store_path)
+    counts = {}
+    for user_id in ids:
+        counts[int(user_id)] = counts.get(int(user_id), 0) + 1
+    print(f"📦 {store_path}: {len(ids)} faces for {len(counts)} users "
+          f"({os.path.getsize(store_path) / 1024:.0f} KB)")
+    for user_id in sorted(counts):
+        print(f"  - ID {user_id}: {counts[user_id]} faces")
+
+if __name__ == "__main__":
+    usage = "Usage: python dataset_store.py [import|export|info] [store_path] [data_dir]"
+    if len(sys.argv) < 3:
+        print(usage)
+        sys.exit(1)
+
+    mode = sys.argv[1].lower()
+    store_path = sys.argv[2]
+    data_dir = sys.argv[3] if len(sys.argv) > 3 else "data"
+
+    if mode == "import":
+        import_jpegs(data_dir, store_path)
+    elif mode == "export":
+        export_jpegs(store_path, data_dir)
+    elif mode == "info":
+        print_info(store_path)
+    else:
+        print(f"❌ Error: Unknown mode '{mode}'")
+        print(usage)
+        sys.exit(1)
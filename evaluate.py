@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import subprocess
+import multiprocessing
+import numpy as np
+from config import load_config
+from dataset_store import load_crops
+from recognizers import create_recognizer, recognition_threshold
+from tune_lbph import k_fold_indices
+
+# Crops shared by every fold, loaded once per worker process by init_worker
+crops = None
+
+def init_worker(data):
+    """Load the evaluation crops once per worker process"""
+    global crops
+    crops = load_crops(data)
+
+def evaluate_fold(job):
+    """Train on all folds but one and score the held-out fold against the whole gallery"""
+    config, backend, assignment, fold = job
+    faces, ids = crops
+    train = [i for i, f in enumerate(assignment) if f != fold]
+    test = [i for i, f in enumerate(assignment) if f == fold]
+    clf = create_recognizer(config, backend)
+    clf.train([faces[i] for i in train], [ids[i] for i in train])
+    test_faces = [faces[i] for i in test]
+    test_ids = np.asarray([ids[i] for i in test])
+
+    # One vectorized (probes x gallery) matrix gives every score needed below
+    distances, labels = clf.distance_matrix(test_faces)
+    labels = np.asarray(labels)
+    classes = np.unique(labels)
+    # Best distance from each probe to each enrolled student
+    per_class = np.stack([distances[:, labels == c].min(axis=1) for c in classes], axis=1)
+    own = classes[np.newaxis, :] == test_ids[:, np.newaxis]
+    predicted = classes[per_class.argmin(axis=1)]
+
+    latencies = []
+    for face in test_faces:
+        start = time.perf_counter()
+        clf.predict(face)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "probes": len(test),
+        "rank1_hits": int((predicted == test_ids).sum()),
+        "best_distances": per_class.min(axis=1).tolist(),
+        "best_correct": (predicted == test_ids).tolist(),
+        # Genuine: probe vs its own student; impostor: probe vs every other student
+        "genuine": per_class[own].tolist(),
+        "impostor": per_class[~own].tolist(),
+        "latencies_ms": latencies,
+    }
+
+def error_curve(genuine, impostor, points=200):
+    """FAR/FRR at evenly spaced thresholds (a match is accepted when distance < threshold)"""
+    genuine, impostor = np.sort(genuine), np.sort(impostor)
+    top = max(genuine.max() if len(genuine) else 0, impostor.max() if len(impostor) else 0)
+    curve = []
+    for threshold in np.linspace(0, top * 1.01, points):
+        far = np.searchsorted(impostor, threshold, side="left") / max(len(impostor), 1)
+        frr = 1 - np.searchsorted(genuine, threshold, side="left") / max(len(genuine), 1)
+        curve.append({"threshold": round(float(threshold), 4), "far": round(float(far), 5), "frr": round(float(frr), 5)})
+    return curve
+
+def rates_at(genuine, impostor, threshold):
+    """Return (FAR, FRR) at one threshold"""
+    far = float(np.mean(np.asarray(impostor) < threshold)) if len(impostor) else 0.0
+    frr = float(np.mean(np.asarray(genuine) >= threshold)) if len(genuine) else 0.0
+    return far, frr
+
+def build_id():
+    """Return the current git commit, if this is a git checkout"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except Exception:
+        return None
+
+def summarize(results, config, backend, folds, samples, users, target_far):
+    """Combine per-fold results into one report"""
+    genuine = np.concatenate([r["genuine"] for r in results])
+    impostor = np.concatenate([r["impostor"] for r in results])
+    latencies = np.concatenate([r["latencies_ms"] for r in results])
+    best = np.concatenate([r["best_distances"] for r in results])
+    correct = np.concatenate([r["best_correct"] for r in results]).astype(bool)
+    probes = sum(r["probes"] for r in results)
+    curve = error_curve(genuine, impostor)
+
+    eer = min(curve, key=lambda p: abs(p["far"] - p["frr"]))
+    # Most permissive threshold whose FAR stays within the target
+    within = [p for p in curve if p["far"] <= target_far]
+    suggested = within[-1] if within else curve[0]
+    threshold = recognition_threshold(config, backend)
+    far, frr = rates_at(genuine, impostor, threshold)
+    return {
+        "build": build_id(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "backend": backend,
+        "lbph": config["recognition"]["lbph"],
+        "face_size": config["recognition"]["face_size"],
+        "folds": folds,
+        "samples": samples,
+        "users": users,
+        "rank1_accuracy": round(sum(r["rank1_hits"] for r in results) / max(probes, 1), 5),
+        "accepted_accuracy": round(float(np.mean(correct & (best < threshold))), 5),
+        "latency_ms": {"mean": round(float(latencies.mean()), 4),
+                       "p50": round(float(np.percentile(latencies, 50)), 4),
+                       "p99": round(float(np.percentile(latencies, 99)), 4)},
+        "configured_threshold": {"threshold": threshold, "far": round(far, 5), "frr": round(frr, 5)},
+        "eer": {"threshold": eer["threshold"], "rate": round((eer["far"] + eer["frr"]) / 2, 5)},
+        "suggested_threshold": {"target_far": target_far, **suggested},
+        "curve": curve,
+    }
+
+def lookup(report, path):
+    """Follow a list of keys into a nested report, returning None when missing"""
+    for key in path:
+        report = report.get(key) if isinstance(report, dict) else None
+    return report
+
+def print_report(report, baseline=None):
+    """Print the headline numbers, with deltas against a baseline report when given"""
+    def delta(path, scale=1.0, unit=""):
+        old = lookup(baseline, path)
+        if not isinstance(old, (int, float)):
+            return ""
+        return f" ({(lookup(report, path) - old) * scale:+.2f}{unit} vs {baseline.get('build') or 'baseline'})"
+
+    configured = report["configured_threshold"]
+    print(f"\n📊 Evaluation ({report['backend']}, {report['folds']}-fold, {report['samples']} crops, "
+          f"{report['users']} users):")
+    print(f"- Rank-1 accuracy: {report['rank1_accuracy']:.1%}{delta(['rank1_accuracy'], 100, 'pp')}")
+    print(f"- At configured threshold {configured['threshold']}: FAR {configured['far']:.2%}, "
+          f"FRR {configured['frr']:.2%}, accepted accuracy {report['accepted_accuracy']:.1%}"
+          f"{delta(['accepted_accuracy'], 100, 'pp')}")
+    print(f"- Equal error rate: {report['eer']['rate']:.2%} at threshold {report['eer']['threshold']}")
+    suggested = report["suggested_threshold"]
+    print(f"- For FAR <= {suggested['target_far']:.1%}: threshold {suggested['threshold']} "
+          f"(FAR {suggested['far']:.2%}, FRR {suggested['frr']:.2%})")
+    latency = report["latency_ms"]
+    print(f"- Predict latency per face: mean {latency['mean']:.3f} ms, p50 {latency['p50']:.3f} ms, "
+          f"p99 {latency['p99']:.3f} ms{delta(['latency_ms', 'mean'], 1, ' ms')}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-validate the recognizer: rank-1 accuracy, FAR/FRR and latency")
+    parser.add_argument("data", nargs="?", default="data", help="Data directory or packed store")
+    parser.add_argument("--backend", help="Backend to evaluate (default: config.json)")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--target-far", type=float, default=0.01, help="FAR used to suggest a threshold")
+    parser.add_argument("--json", dest="json_path", default="evaluation.json", help="Report file to write")
+    parser.add_argument("--compare", help="Earlier report to show deltas against")
+    args = parser.parse_args()
+
+    config = load_config()
+    backend = (args.backend or config["recognition"]["backend"]).lower()
+    faces, ids = load_crops(args.data)
+    if len(set(ids)) < 2 or len(faces) < args.folds:
+        print(f"❌ Error: Need at least 2 users and {args.folds} crops in '{args.data}'")
+        sys.exit(1)
+
+    assignment = k_fold_indices(ids, args.folds)
+    jobs = [(config, backend, assignment, fold) for fold in range(args.folds) if fold in set(assignment)]
+    print(f"🔍 Evaluating '{backend}' with {len(jobs)}-fold cross-validation on {len(faces)} crops "
+          f"using {min(args.workers, len(jobs))} processes...")
+    start = time.perf_counter()
+    try:
+        with multiprocessing.Pool(min(args.workers, len(jobs)), initializer=init_worker, initargs=(args.data,)) as pool:
+            results = pool.map(evaluate_fold, jobs)
+    except NotImplementedError as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    print(f"✅ Folds finished in {time.perf_counter() - start:.1f}s")
+
+    report = summarize(results, config, backend, len(jobs), len(faces), len(set(ids)), args.target_far)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    with open(args.json_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Report written to {args.json_path}")
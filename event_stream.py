@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import datetime
+import threading
+from config import load_config
+from structured_log import get_logger
+
+log = get_logger(__name__)
+
+class FaceTracker:
+    """Give each face a track ID that follows it from frame to frame (greedy IoU matching)"""
+    def __init__(self, min_iou=0.3, max_age=1.0):
+        self.min_iou = min_iou
+        self.max_age = max_age
+        self.tracks = {}
+        self.next_id = 1
+
+    @staticmethod
+    def iou(a, b):
+        """Intersection over union of two (x, y, w, h) boxes"""
+        ax, ay, aw, ah = a
+        bx, by, bw, bh = b
+        ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+        iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+        union = aw * ah + bw * bh - ix * iy
+        return ix * iy / float(union) if union else 0.0
+
+    def update(self, boxes, now=None):
+        """Match this frame's boxes to live tracks, returning one track ID per box"""
+        now = time.monotonic() if now is None else now
+        # Forget faces that have not been seen for max_age seconds
+        self.tracks = {tid: (box, seen) for tid, (box, seen) in self.tracks.items() if now - seen <= self.max_age}
+        pairs = sorted(((self.iou(box, track_box), i, tid) for i, box in enumerate(boxes)
+                        for tid, (track_box, _) in self.tracks.items()), reverse=True)
+        ids = [None] * len(boxes)
+        used = set()
+        for overlap, i, tid in pairs:
+            if overlap < self.min_iou:
+                break
+            if ids[i] is None and tid not in used:
+                ids[i] = tid
+                used.add(tid)
+        for i, box in enumerate(boxes):
+            if ids[i] is None:
+                ids[i] = self.next_id
+                self.next_id += 1
+            self.tracks[ids[i]] = (tuple(box), now)
+        return ids
+
+class SocketBroadcaster:
+    """Send JSON lines to every client of a local Unix socket without ever waiting on one
+
+    Each client has a bounded send buffer; when a slow client's buffer is
+    full, further events are dropped for that client only.
+    """
+    def __init__(self, path, client_buffer=256 * 1024):
+        self.path = path
+        self.client_buffer = client_buffer
+        if os.path.exists(path):
+            os.remove(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(16)
+        self.server.setblocking(False)
+        self.clients = {}
+        self.dropped = 0
+
+    def accept(self):
+        """Take any clients waiting to connect"""
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            conn.setblocking(False)
+            self.clients[conn] = bytearray()
+
+    def send(self, data):
+        """Queue encoded lines for every client and push what they can take now"""
+        self.accept()
+        for conn, pending in self.clients.items():
+            # Only whole events are buffered, so a client never sees half a line
+            if len(pending) + len(data) > self.client_buffer:
+                self.dropped += 1
+            else:
+                pending += data
+        self.flush()
+
+    def flush(self):
+        """Push buffered bytes to every client that can take them, dropping disconnected ones"""
+        for conn, pending in list(self.clients.items()):
+            if not pending:
+                continue
+            try:
+                sent = conn.send(pending)
+                del pending[:sent]
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                conn.close()
+                del self.clients[conn]
+
+    def close(self):
+        """Disconnect every client and remove the socket file"""
+        for conn in self.clients:
+            conn.close()
+        self.server.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class EventPublisher:
+    """Publish recognition and attendance events as JSON lines without blocking the caller
+
+    publish() only puts the event on a bounded queue; a background thread
+    appends it to events/YYYY-MM-DD.jsonl and/or broadcasts it on a Unix
+    socket. When the queue is full the event is dropped and counted, and
+    the `seq` numbers let consumers notice the gap.
+    """
+    def __init__(self, jsonl_dir="events", socket_path=None, queue_size=1000):
+        self.jsonl_dir = jsonl_dir
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.seq = 0
+        self.dropped = 0
+        self.file = None
+        self.file_date = None
+        self.broadcaster = None
+        if socket_path:
+            if hasattr(socket, "AF_UNIX"):
+                self.broadcaster = SocketBroadcaster(socket_path)
+            else:
+                log.warning("⚠️ Warning: Unix sockets are not available on this platform; events go to JSON lines only")
+        if jsonl_dir:
+            os.makedirs(jsonl_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def publish(self, event_type, **fields):
+        """Queue one event; never blocks"""
+        now = time.time()
+        self.seq += 1
+        event = {"seq": self.seq, "type": event_type, "time": round(now, 3),
+                 "timestamp": datetime.datetime.fromtimestamp(now).isoformat(timespec="milliseconds"), **fields}
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        """Write queued events in batches until close() (publisher thread)"""
+        while True:
+            try:
+                event = self.queue.get(timeout=0.05)
+            except queue.Empty:
+                # Keep draining slow socket clients while nothing new arrives
+                if self.broadcaster is not None:
+                    self.broadcaster.flush()
+                continue
+            batch = [event]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            batch = [event for event in batch if event is not None]
+            if batch:
+                self.write(batch)
+            if stop:
+                return
+
+    def write(self, batch):
+        """Append a batch of events to the day's file and the socket (publisher thread)"""
+        lines = "".join(json.dumps(event) + "\n" for event in batch)
+        if self.jsonl_dir:
+            date = batch[-1]["timestamp"][:10]
+            try:
+                if date != self.file_date:
+                    if self.file is not None:
+                        self.file.close()
+                    self.file = open(os.path.join(self.jsonl_dir, f"{date}.jsonl"), "a")
+                    self.file_date = date
+                self.file.write(lines)
+                self.file.flush()
+            except OSError as e:
+                log.error("❌ Error writing events: %s", e)
+        if self.broadcaster is not None:
+            self.broadcaster.send(lines.encode())
+
+    def close(self, timeout=2.0):
+        """Flush queued events and stop the publisher thread"""
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+        if self.file is not None:
+            self.file.close()
+        if self.broadcaster is not None:
+            self.broadcaster.close()
+
+def create_publisher(config=None):
+    """Build the publisher described by config.json's events section, or None when disabled"""
+    events = (config or load_config())["events"]
+    if not events.get("enabled", False):
+        return None
+    try:
+        return EventPublisher(events.get("jsonl_dir"), events.get("socket"), events.get("queue_size", 1000))
+    except OSError as e:
+        log.warning("⚠️ Warning: Could not start the event stream: %s", e)
+        return None
+
+def follow_socket(path):
+    """Yield events from a publisher's Unix socket as they arrive"""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Connect now, so a missing publisher is reported before waiting for events
+    client.connect(path)
+    return (json.loads(line) for line in client.makefile("r"))
+
+def follow_file(path, poll=0.05):
+    """Yield events appended to a JSON lines file, like tail -f"""
+    with open(path, "r") as f:
+        f.seek(0, os.SEEK_END)
+        partial = ""
+        while True:
+            line = f.readline()
+            if not line:
+                time.sleep(poll)
+                continue
+            # A line may be read while it is still being written
+            partial += line
+            if partial.endswith("\n"):
+                yield json.loads(partial)
+                partial = ""
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Follow the attendance event stream")
+    parser.add_argument("--socket", help="Publisher socket (default: config.json events.socket)")
+    parser.add_argument("--file", help="Follow a JSON lines file instead (default: today's file)")
+    parser.add_argument("--type", choices=["recognition", "mark"], help="Only show events of this type")
+    args = parser.parse_args()
+
+    events = load_config()["events"]
+    socket_path = args.socket or (None if args.file else events.get("socket"))
+    try:
+        if socket_path:
+            stream = follow_socket(socket_path)
+        else:
+            path = args.file or os.path.join(events.get("jsonl_dir") or "events",
+                                             f"{datetime.date.today().isoformat()}.jsonl")
+            if not os.path.exists(path):
+                print(f"❌ Error: '{path}' not found. Is the event stream enabled in config.json?")
+                sys.exit(1)
+            stream = follow_file(path)
+        print("👂 Waiting for events. Press Ctrl+C to stop.")
+        for event in stream:
+            if args.type is None or event["type"] == args.type:
+                print(json.dumps(event), flush=True)
+    except OSError as e:
+        print(f"❌ Error: Could not connect to the event stream: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n✅ Stopped.")
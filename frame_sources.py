@@ -0,0 +1,213 @@
+import os
+import glob
+import time
+import numpy as np
+import cv2
+from structured_log import get_logger
+
+log = get_logger(__name__)
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm", ".wmv"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+
+def extension(path):
+    """Lower-case extension of a path, including the dot"""
+    return os.path.splitext(path)[1].lower()
+
+class CameraSource:
+    """Frames from a webcam, reopening it when a read fails
+
+    A failed read returns (False, None) after trying to reopen the camera;
+    is_opened() then tells the caller whether to keep going.
+    """
+    live = True
+
+    def __init__(self, index=0):
+        self.index = index
+        self.capture = cv2.VideoCapture(index)
+        self.timestamp = None
+        self.truth = None
+
+    def is_opened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        ret, frame = self.capture.read()
+        if not ret:
+            # Rate limited, so a camera glitch does not flood the console
+            log.warning("⚠️ Warning: Could not read frame from camera. Retrying...", extra={"camera": self.index})
+            # Try to reopen the camera if frame reading fails
+            self.capture.release()
+            self.capture = cv2.VideoCapture(self.index)
+            if not self.capture.isOpened():
+                log.error("❌ Error: Could not reopen camera.", extra={"camera": self.index})
+            return False, None
+        self.timestamp = time.monotonic()
+        return True, frame
+
+    def release(self):
+        self.capture.release()
+
+class VideoSource:
+    """Frames from a recorded video file, timed by their position in the recording"""
+    live = False
+
+    def __init__(self, path):
+        self.capture = cv2.VideoCapture(path)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 25.0
+        self.index = 0
+        self.timestamp = None
+        self.truth = None
+
+    def is_opened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        ret, frame = self.capture.read()
+        if not ret:
+            return False, None
+        self.timestamp = self.index / self.fps
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        self.capture.release()
+
+class ImageSequenceSource:
+    """Frames from a folder (or glob) of images in name order, played at a fixed rate"""
+    live = False
+
+    def __init__(self, pattern, fps=10.0):
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*")
+        self.paths = sorted(p for p in glob.glob(pattern) if extension(p) in IMAGE_EXTENSIONS)
+        self.fps = fps
+        self.index = 0
+        self.timestamp = None
+        self.truth = None
+
+    def is_opened(self):
+        return bool(self.paths)
+
+    def read(self):
+        while self.index < len(self.paths):
+            frame = cv2.imread(self.paths[self.index])
+            self.timestamp = self.index / self.fps
+            self.index += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def release(self):
+        pass
+
+class SyntheticSource:
+    """Deterministic stand-in camera: enrolled face crops drift across a noisy background
+
+    Students take turns in front of the "camera" for `dwell` frames, with an
+    empty scene of the same length between them, so a replay exercises
+    detection, recognition, the motion gate and attendance marking. The
+    same seed always yields the same frames; `truth` holds the ID of the
+    student in the current frame (None when the scene is empty).
+    """
+    live = False
+
+    def __init__(self, faces, ids, frames=300, size=(640, 480), fps=30.0, dwell=30, seed=0):
+        self.faces = [np.asarray(face) for face in faces]
+        self.ids = list(ids)
+        self.frames = frames
+        self.size = size
+        self.fps = fps
+        self.dwell = dwell
+        self.rng = np.random.default_rng(seed)
+        width, height = size
+        background = cv2.GaussianBlur(self.rng.integers(60, 190, (height, width, 3), dtype=np.uint8), (21, 21), 0)
+        # A few pre-rendered sensor-noise variants, cycled so frames differ cheaply
+        self.backgrounds = [cv2.add(background, self.rng.integers(0, 4, background.shape, dtype=np.uint8))
+                            for _ in range(4)]
+        self.students = sorted(set(self.ids))
+        self.samples = {student: [i for i, user_id in enumerate(self.ids) if user_id == student]
+                        for student in self.students}
+        self.index = 0
+        self.timestamp = None
+        self.truth = None
+
+    def is_opened(self):
+        return bool(self.faces)
+
+    def read(self):
+        if self.index >= self.frames:
+            return False, None
+        k = self.index
+        frame = self.backgrounds[k % len(self.backgrounds)].copy()
+        segment, offset = divmod(k, self.dwell)
+        self.truth = None
+        if segment % 2 == 1:
+            student = self.students[(segment // 2) % len(self.students)]
+            samples = self.samples[student]
+            face = self.faces[samples[(offset // 5) % len(samples)]]
+            side = 200
+            face = cv2.cvtColor(cv2.resize(face, (side, side)), cv2.COLOR_GRAY2BGR) if face.ndim == 2 \
+                else cv2.resize(face, (side, side))
+            width, height = self.size
+            # Drift slowly across the frame while the student stands there
+            x = int((width - side) * (0.3 + 0.4 * offset / self.dwell))
+            y = (height - side) // 2
+            frame[y:y + side, x:x + side] = face
+            self.truth = student
+        self.timestamp = k / self.fps
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        pass
+
+class WindowSink:
+    """Show frames in an OpenCV window; show() returns the key pressed"""
+    def __init__(self, title, delay=10):
+        self.title = title
+        self.delay = delay
+
+    def show(self, frame):
+        cv2.imshow(self.title, frame)
+        return cv2.waitKey(self.delay) & 0xFF
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+class HeadlessSink:
+    """Consume frames without a display, optionally recording them to a video file"""
+    def __init__(self, record_path=None, fps=30.0):
+        self.record_path = record_path
+        self.fps = fps
+        self.writer = None
+        self.frames = 0
+
+    def show(self, frame):
+        if self.record_path:
+            if self.writer is None:
+                height, width = frame.shape[:2]
+                self.writer = cv2.VideoWriter(self.record_path, cv2.VideoWriter_fourcc(*"MJPG"), self.fps,
+                                              (width, height))
+            self.writer.write(frame)
+        self.frames += 1
+        return None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+def open_source(spec="camera", data_dir="data", frames=300, seed=0):
+    """Open a frame source from a spec: camera[:N], a video file, an image folder/glob, or synthetic[:DATA]"""
+    spec = str(spec)
+    if spec == "camera" or spec.startswith("camera:"):
+        return CameraSource(int(spec.partition(":")[2] or 0))
+    if spec.isdigit():
+        return CameraSource(int(spec))
+    if spec == "synthetic" or spec.startswith("synthetic:"):
+        from dataset_store import load_crops
+        faces, ids = load_crops(spec.partition(":")[2] or data_dir)
+        return SyntheticSource(faces, ids, frames=frames, seed=seed)
+    if extension(spec) in VIDEO_EXTENSIONS:
+        return VideoSource(spec)
+    return ImageSequenceSource(spec)
@@ -0,0 +1,124 @@
+import sys
+import time
+import argparse
+import numpy as np
+from compare_recognizers import split_dataset
+from config import load_config, save_config
+from dataset_store import load_crops
+from recognizers import create_recognizer, recognition_threshold, lbp_histograms, chi_square_distances, normalize_face
+
+def medoid_indices(distances, k, iterations=20):
+    """Pick k medoids from a square distance matrix (greedy build, then alternating refinement)"""
+    count = len(distances)
+    if count <= k:
+        return list(range(count))
+
+    # Start from the most central sample, then keep adding whichever sample
+    # most reduces every sample's distance to its nearest medoid
+    medoids = [int(distances.sum(axis=1).argmin())]
+    nearest = distances[medoids[0]].copy()
+    while len(medoids) < k:
+        gains = np.maximum(nearest[np.newaxis, :] - distances, 0).sum(axis=1)
+        gains[medoids] = -1
+        best = int(gains.argmax())
+        medoids.append(best)
+        nearest = np.minimum(nearest, distances[best])
+
+    # Assign samples to their nearest medoid, then move each medoid to the
+    # most central member of its cluster, until nothing changes
+    for _ in range(iterations):
+        assignment = distances[medoids].argmin(axis=0)
+        updated = []
+        for cluster, medoid in enumerate(medoids):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members) == 0:
+                updated.append(medoid)
+                continue
+            updated.append(int(members[distances[np.ix_(members, members)].sum(axis=1).argmin()]))
+        if updated == medoids:
+            break
+        medoids = updated
+    return sorted(medoids)
+
+def representative_indices(faces, ids, k, config=None):
+    """Return the indices of the k most representative faces of every label, in input order"""
+    recognition = (config or load_config())["recognition"]
+    lbph = recognition["lbph"]
+    face_size = tuple(recognition["face_size"])
+    by_label = {}
+    for i, user_id in enumerate(ids):
+        by_label.setdefault(int(user_id), []).append(i)
+
+    keep = []
+    for rows in by_label.values():
+        if len(rows) <= k:
+            keep.extend(rows)
+            continue
+        # Cluster on the same histograms and distance that LBPH predict uses
+        histograms = lbp_histograms([normalize_face(faces[i], face_size) for i in rows],
+                                    lbph["radius"], lbph["neighbors"], lbph["grid_x"], lbph["grid_y"])
+        distances = chi_square_distances(histograms, histograms, chunk_size=4)
+        keep.extend(rows[i] for i in medoid_indices(distances, k))
+    return sorted(keep)
+
+def prune_training_set(faces, ids, config=None):
+    """Apply recognition.gallery_k to a training set, returning (faces, ids)"""
+    config = config or load_config()
+    k = config["recognition"].get("gallery_k", 0)
+    if not k or k <= 0:
+        return faces, ids
+    keep = representative_indices(faces, ids, k, config)
+    if len(keep) < len(faces):
+        print(f"✂️ Gallery pruned to {len(keep)}/{len(faces)} samples (K={k} per student)")
+    return [faces[i] for i in keep], [ids[i] for i in keep]
+
+def evaluate_gallery(config, train_faces, train_ids, test_faces, test_ids):
+    """Train on a gallery and return (predict ms per face, rank-1 accuracy, accepted accuracy)"""
+    clf = create_recognizer(config)
+    clf.train(train_faces, train_ids)
+    start = time.perf_counter()
+    predictions = [clf.predict(face) for face in test_faces]
+    predict_time = time.perf_counter() - start
+    threshold = recognition_threshold(config)
+    correct = sum(1 for (p, _), t in zip(predictions, test_ids) if p == t)
+    accepted = sum(1 for (p, d), t in zip(predictions, test_ids) if p == t and d < threshold)
+    count = max(len(test_faces), 1)
+    return predict_time / count * 1000, correct / count, accepted / count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure pruning the gallery to K representative samples per student")
+    parser.add_argument("data", nargs="?", default="data", help="Data directory or packed store")
+    parser.add_argument("--k", default="3,5,10", help="Comma-separated K values to compare")
+    parser.add_argument("--test-every", type=int, default=4, help="Hold out every Nth crop of each user")
+    parser.add_argument("--write", action="store_true", help="Save K to config.json (only with a single --k)")
+    args = parser.parse_args()
+
+    config = load_config()
+    faces, ids = load_crops(args.data)
+    if not faces:
+        print(f"❌ Error: No face crops found in '{args.data}'!")
+        sys.exit(1)
+    ks = [int(v) for v in args.k.split(",") if v.strip()]
+    if args.write and len(ks) != 1:
+        print("❌ Error: --write needs exactly one --k value")
+        sys.exit(1)
+
+    train_faces, train_ids, test_faces, test_ids = split_dataset(faces, ids, args.test_every)
+    print(f"🔍 Held-out split: {len(train_faces)} gallery and {len(test_faces)} test crops "
+          f"for {len(set(ids))} users (backend {config['recognition']['backend']})")
+
+    base_ms, base_rank1, base_accepted = evaluate_gallery(config, train_faces, train_ids, test_faces, test_ids)
+    print(f"\n{'K':>5} {'Gallery':>8} {'Predict ms':>11} {'Saving':>7} {'Rank-1':>7} {'Delta':>7} {'Accepted':>9}")
+    print(f"{'all':>5} {len(train_faces):>8} {base_ms:>11.3f} {'':>7} {base_rank1:>7.1%} {'':>7} {base_accepted:>9.1%}")
+    for k in ks:
+        keep = representative_indices(train_faces, train_ids, k, config)
+        ms, rank1, accepted = evaluate_gallery(config, [train_faces[i] for i in keep],
+                                               [train_ids[i] for i in keep], test_faces, test_ids)
+        print(f"{k:>5} {len(keep):>8} {ms:>11.3f} {1 - ms / max(base_ms, 1e-9):>7.0%} {rank1:>7.1%} "
+              f"{(rank1 - base_rank1) * 100:>+6.1f}p {accepted:>9.1%}")
+
+    if args.write:
+        config = load_config()
+        config["recognition"]["gallery_k"] = ks[0]
+        save_config(config)
+        print(f"\n✅ recognition.gallery_k set to {ks[0]} in config.json. Retrain the model (python classifier.py) to apply it.")
@@ -4,7 +4,15 @@ import subprocess
 import sys
 import re
 import os
+import queue
+import threading
 from datetime import datetime
+from config import load_config
+from retrain_scheduler import (request_retrain, pending_requests, due_at, describe_pending,
+                               touch_heartbeat, update_running, EXIT_BUSY)
+from structured_log import get_logger
+
+log = get_logger(__name__)
 
 class FaceRecognitionLauncher:
     def __init__(self, root):
@@ -23,8 +31,23 @@ class FaceRecognitionLauncher:
             messagebox.showerror("Error", "OpenCV is required. Please install it with: pip install opencv-python")
             self.cv2 = None
         
+        # Training runs in the background; its progress lines arrive on this queue
+        self.training_process = None
+        self.training_output = queue.Queue()
+        self.train_status_var = tk.StringVar(value="")
+        self.training_errors = []
+        self.training_completed = False
+        # Manual runs report with a dialog; scheduled ones only in the status line
+        self.training_manual = False
+        self.pending_shown = False
+        
         # Setup UI
         self.setup_ui()
+        
+        # Host the retrain scheduler: queued enrollment updates run here once
+        # enrollments go quiet (see retrain_scheduler.py)
+        self.training_config = load_config()["training"]
+        self.root.after(1000, self.check_retrain)
     
     def check_required_files(self):
         """Check if required model and cascade files exist"""
@@ -54,7 +77,7 @@ class FaceRecognitionLauncher:
                 if required:
                     missing_scripts.append(f"{description} ({script})")
                 else:
-                    print(f"Warning: {description} ({script}) not found")
+                    log.warning("Warning: %s (%s) not found", description, script)
         
         if missing_files:
             messagebox.showerror("Missing Required Files", 
@@ -94,7 +117,7 @@ class FaceRecognitionLauncher:
                     # Count non-empty lines
                     student_count = sum(1 for line in f if line.strip())
             except Exception as e:
-                print(f"Error reading names.txt: {e}")
+                log.error("Error reading names.txt: %s", e)
         
         tk.Label(status_frame, text=f"Registered Students: {student_count}", 
                 bg="#f0f0f0").pack(anchor="w")
@@ -105,7 +128,7 @@ class FaceRecognitionLauncher:
             try:
                 attendance_count = len([f for f in os.listdir("attendance") if f.endswith(".csv")])
             except Exception as e:
-                print(f"Error counting attendance files: {e}")
+                log.error("Error counting attendance files: %s", e)
         
         tk.Label(status_frame, text=f"Attendance Records: {attendance_count}", 
                 bg="#f0f0f0").pack(anchor="w")
@@ -115,6 +138,10 @@ class FaceRecognitionLauncher:
         tk.Label(status_frame, text=f"Current Date: {today}", 
                 bg="#f0f0f0").pack(anchor="w")
         
+        # Training progress (empty unless a training run is active)
+        tk.Label(status_frame, textvariable=self.train_status_var, 
+                bg="#f0f0f0", fg="#9C27B0").pack(anchor="w")
+        
         # Main options frame
         options_frame = tk.LabelFrame(self.root, text="System Functions", bg="#f0f0f0", pady=10, padx=10)
         options_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
@@ -224,17 +251,109 @@ class FaceRecognitionLauncher:
                 messagebox.showerror("Error", "No training data found. Please register students first.")
                 return
                 
-            result = subprocess.run([sys.executable, "classifier.py"], 
-                                  capture_output=True, text=True)
-            if result.returncode == 0:
-                messagebox.showinfo("Success", "Face recognition model trained successfully!")
-                self.refresh_status()  # Refresh the status after training
-            else:
-                messagebox.showwarning("Warning", 
-                                     f"Training might not have completed successfully:\n{result.stderr}")
+            if self.training_process is not None:
+                messagebox.showinfo("Info", "Training is already running.")
+                return
+                
+            # A full retrain joins whatever enrollment updates are queued
+            request_retrain(None, reason="launcher")
+            self.start_training(manual=True)
         except Exception as e:
             messagebox.showerror("Error", f"Error training model: {e}")
     
+    def start_training(self, manual=False):
+        """Apply every queued retrain request in a background process, streaming its progress"""
+        self.training_manual = manual
+        self.pending_shown = False
+        self.training_process = subprocess.Popen(
+            [sys.executable, "-u", "retrain_scheduler.py", "--once"],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        self.train_status_var.set("Training: starting...")
+        threading.Thread(target=self.read_training_output, 
+                         args=(self.training_process,), daemon=True).start()
+        self.root.after(200, self.poll_training)
+    
+    def check_retrain(self):
+        """Start a queued model update once it is due, and show when it will run"""
+        try:
+            touch_heartbeat()
+            if self.training_process is None:
+                pending = pending_requests()
+                due = due_at(pending, self.training_config)
+                if pending is not None and datetime.now().timestamp() >= due and not update_running():
+                    self.start_training()
+                elif pending is not None:
+                    self.train_status_var.set(describe_pending(pending, due))
+                    self.pending_shown = True
+                elif self.pending_shown:
+                    # Another process applied the queued requests
+                    self.train_status_var.set("")
+                    self.pending_shown = False
+        except Exception as e:
+            log.warning("Error checking queued model updates: %s", e)
+        self.root.after(1000, self.check_retrain)
+    
+    def read_training_output(self, process):
+        """Forward training output lines to the UI thread (runs in a worker thread)"""
+        for line in process.stdout:
+            self.training_output.put(line)
+        self.training_output.put(process.wait())
+    
+    def poll_training(self):
+        """Update training progress from the output queue"""
+        finished = None
+        lines = []
+        while True:
+            try:
+                item = self.training_output.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, int):
+                finished = item
+            else:
+                lines.append(item)
+                
+        for line in lines:
+            match = re.search(r"Progress: (\d+)/(\d+) images \((\d+)%\) - ETA (\d+)s", line)
+            if match:
+                done, total, percent, eta = match.groups()
+                self.train_status_var.set(f"Training: {done}/{total} images ({percent}%), ETA {eta}s")
+            elif "Training complete" in line:
+                self.training_completed = True
+            elif "Error" in line or "❌" in line:
+                self.training_errors.append(line.strip())
+                
+        if finished is None:
+            self.root.after(200, self.poll_training)
+            return
+            
+        self.training_process = None
+        self.train_status_var.set("")
+        if finished == EXIT_BUSY:
+            # Another process is applying the updates; the queued ones wait for it
+            if self.training_manual:
+                messagebox.showinfo("Info", "Another model update is already running. "
+                                    "Queued updates will be applied once it finishes.")
+            else:
+                self.train_status_var.set("Another model update is already running")
+        elif not self.training_manual:
+            # Scheduled update: no dialogs, just note the outcome
+            if finished == 0 and self.training_completed:
+                self.train_status_var.set(f"Model updated at {datetime.now().strftime('%H:%M')}")
+            elif finished != 0:
+                self.train_status_var.set("Model update failed; see the log")
+                log.error("❌ Scheduled model update failed (exit code %d): %s", finished,
+                          " | ".join(self.training_errors[-5:]) or "no error output")
+        elif finished == 0 and self.training_completed:
+            messagebox.showinfo("Success", "Face recognition model trained successfully!")
+            self.refresh_status()  # Refresh the status after training
+        else:
+            messagebox.showwarning("Warning", 
+                                 "Training might not have completed successfully:\n" + 
+                                 "\n".join(self.training_errors[-5:]))
+        self.training_errors = []
+        self.training_completed = False
+    
     def run_attendance_system(self):
         """Run the attendance system"""
         if not os.path.exists("classifier.yml"):
@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import threading
+import urllib.request
+
+def percentile(values, pct):
+    """Return the pct-th percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def run_load_test(url, payloads, total_requests, concurrency):
+    """Send total_requests POSTs from concurrency threads and collect latencies"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = {"next": 0}
+
+    def worker():
+        while True:
+            with lock:
+                if counter["next"] >= total_requests:
+                    return
+                i = counter["next"]
+                counter["next"] += 1
+            payload = payloads[i % len(payloads)]
+            request = urllib.request.Request(url, data=payload, method="POST",
+                                             headers={"Content-Type": "application/octet-stream"})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    json.loads(response.read())
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the local recognition service")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--mode", default="crop", choices=["crop", "frame"])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--data-dir", default="data", help="Images to send as request bodies")
+    args = parser.parse_args()
+
+    image_paths = sorted(glob.glob(os.path.join(args.data_dir, "*.jpg")))
+    if not image_paths:
+        print(f"❌ Error: No images found in '{args.data_dir}' directory!")
+        sys.exit(1)
+    payloads = []
+    for path in image_paths:
+        with open(path, "rb") as f:
+            payloads.append(f.read())
+
+    url = f"{args.url.rstrip('/')}/recognize?mode={args.mode}"
+    print(f"🚀 Sending {args.requests} requests to {url} with concurrency {args.concurrency}...")
+    latencies, errors, elapsed = run_load_test(url, payloads, args.requests, args.concurrency)
+
+    if not latencies:
+        print(f"❌ All requests failed. First error: {errors[0] if errors else 'unknown'}")
+        sys.exit(1)
+
+    print(f"\n📊 Load Test Results:")
+    print(f"- Completed: {len(latencies)} ok, {len(errors)} failed in {elapsed:.2f}s")
+    print(f"- Throughput: {len(latencies) / elapsed:.1f} requests/sec")
+    print(f"- Latency p50: {percentile(latencies, 50) * 1000:.2f} ms")
+    print(f"- Latency p99: {percentile(latencies, 99) * 1000:.2f} ms")
+
+    try:
+        with urllib.request.urlopen(f"{args.url.rstrip('/')}/health", timeout=5) as response:
+            health = json.loads(response.read())
+        if health.get("batches"):
+            print(f"- Mean batch size: {health['batched_crops'] / health['batches']:.2f} crops")
+    except Exception:
+        pass
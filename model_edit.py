@@ -0,0 +1,215 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import numpy as np
+import cv2
+from classifier import MODELS_DIR, DEFAULT_GROUP, load_groups, load_training_face, shard_path, write_model_atomic
+from config import load_config
+from dataset_store import is_packed_store
+from gallery_pruning import prune_training_set
+from partial_models import read_lbph_parts, write_lbph_model, image_user_id
+from recognizers import create_recognizer
+from structured_log import get_logger
+
+log = get_logger(__name__)
+
+# Backends whose model stores one histogram per training face, so a label can
+# be dropped or swapped without touching anyone else's entries
+EDITABLE_BACKENDS = ["lbph", "lbph-q"]
+
+def model_files(classifier_path="classifier.yml", models_dir=MODELS_DIR):
+    """Return the global model plus any per-group shards that exist"""
+    paths = [classifier_path] if os.path.exists(classifier_path) else []
+    for path in sorted(glob.glob(os.path.join(models_dir, "classifier.*.yml"))):
+        # Skip in-flight temporary files and training checkpoints
+        if ".tmp." not in path and ".ckpt." not in path:
+            paths.append(path)
+    return paths
+
+def lbph_histograms(faces, params, face_size):
+    """Compute OpenCV LBPH histograms for new faces with a throwaway model"""
+    engine = cv2.face.LBPHFaceRecognizer_create(*params)
+    faces = [cv2.resize(face, tuple(face_size)) if face.shape[:2] != (face_size[1], face_size[0]) else face
+             for face in faces]
+    engine.train(faces, np.zeros(len(faces), dtype=np.int32))
+    return list(engine.getHistograms())
+
+def edit_lbph(path, replacements, face_size=(200, 200)):
+    """Drop the labels in {label: faces or None} from an OpenCV LBPH file, adding any new faces, in one rewrite"""
+    params, threshold, histograms, labels, labels_info = read_lbph_parts(path)
+    keep = [i for i, l in enumerate(labels) if l not in replacements]
+    removed = len(labels) - len(keep)
+    histograms = [histograms[i] for i in keep]
+    labels = [labels[i] for i in keep]
+    added = 0
+    for label, faces in replacements.items():
+        if faces:
+            new = lbph_histograms(faces, params, face_size)
+            histograms.extend(new)
+            labels.extend([label] * len(new))
+            added += len(new)
+    if removed == 0 and added == 0:
+        return 0
+    base, ext = os.path.splitext(path)
+    tmp_path = f"{base}.tmp{ext}"
+    write_lbph_model(tmp_path, params, threshold, histograms, labels, labels_info)
+    os.replace(tmp_path, path)
+    return removed
+
+def edit_quantized(path, replacements, config=None):
+    """Drop the labels in {label: faces or None} from an lbph-q gallery, adding any new faces, in one rewrite"""
+    clf = create_recognizer(config or load_config(), "lbph-q")
+    clf.read(path)
+    keep = ~np.isin(clf.labels, list(replacements))
+    removed = int((~keep).sum())
+    faces = [face for label_faces in replacements.values() if label_faces for face in label_faces]
+    if removed == 0 and not faces:
+        return 0
+    clf.histograms, clf.scales, clf.labels = clf.histograms[keep], clf.scales[keep], clf.labels[keep]
+    if faces:
+        clf.update(faces, [label for label, label_faces in replacements.items() if label_faces
+                           for _ in label_faces])
+    write_model_atomic(clf, path)
+    return removed
+
+def edit_model(path, label, faces=None, config=None):
+    """Remove (faces=None) or replace one label in a model file, returning how many entries were dropped"""
+    return edit_labels(path, {label: faces}, config)
+
+def edit_labels(path, replacements, config=None):
+    """Remove or replace several labels ({label: faces or None}) with a single rewrite of a model file"""
+    config = config or load_config()
+    recognition = config["recognition"]
+    backend = recognition["backend"]
+    if backend == "lbph":
+        return edit_lbph(path, replacements, recognition["face_size"])
+    if backend == "lbph-q":
+        return edit_quantized(path, replacements, config)
+    raise ValueError(f"The '{backend}' backend cannot be edited in place; retrain with: python classifier.py")
+
+def model_labels(path, config=None):
+    """Return the set of labels stored in a model file"""
+    config = config or load_config()
+    if config["recognition"]["backend"] == "lbph-q":
+        clf = create_recognizer(config, "lbph-q")
+        clf.read(path)
+        return set(clf.labels.tolist())
+    return set(read_lbph_parts(path)[3])
+
+def remove_from_models(label, classifier_path="classifier.yml"):
+    """Drop a student from the global model and every shard, returning the files changed"""
+    config = load_config()
+    if config["recognition"]["backend"] not in EDITABLE_BACKENDS:
+        log.warning("⚠️ The '%s' model cannot be edited in place; retrain to remove the student.",
+                    config["recognition"]["backend"])
+        return []
+    changed = []
+    for path in model_files(classifier_path):
+        try:
+            removed = edit_model(path, label, config=config)
+        except Exception as e:
+            log.error("❌ Error removing ID %d from %s: %s", label, path, e, extra={"student_id": label})
+            continue
+        if removed:
+            changed.append(path)
+            log.info("✅ Removed %d entries for ID %d from %s", removed, label, path, extra={"student_id": label})
+    return changed
+
+def load_user_faces(user_id, data_dir="data"):
+    """Detect and crop every training image of one user"""
+    detector = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    if detector.empty():
+        raise RuntimeError("Could not load face cascade classifier")
+    faces = []
+    for path in sorted(glob.glob(os.path.join(data_dir, f"user.{user_id}.*.jpg"))):
+        if image_user_id(path) == user_id:
+            result = load_training_face(path, detector, verbose=False)
+            if result is not None:
+                faces.append(result[0])
+    return faces
+
+def reenroll(user_id, data_dir="data", classifier_path="classifier.yml"):
+    """Replace a student's entries with their current images; False means a full retrain is needed"""
+    return reenroll_many([user_id], data_dir, classifier_path)
+
+def reenroll_many(user_ids, data_dir="data", classifier_path="classifier.yml"):
+    """Replace several students' entries, rewriting each model file once; False means a full retrain is needed"""
+    config = load_config()
+    if config["recognition"]["backend"] not in EDITABLE_BACKENDS or not os.path.exists(classifier_path):
+        return False
+    # A packed store has no user.{id}.*.jpg files to reload a student from
+    if is_packed_store(data_dir):
+        return False
+    user_ids = sorted(set(int(i) for i in user_ids))
+    counts = {user_id: len(glob.glob(os.path.join(data_dir, f"user.{user_id}.*.jpg"))) for user_id in user_ids}
+    total = sum(counts.values())
+    start = time.time()
+    done = 0
+    faces = {}
+    for user_id in user_ids:
+        faces[user_id] = load_user_faces(user_id, data_dir)
+        done += counts[user_id]
+        if not faces[user_id]:
+            log.warning("⚠️ No usable face images for ID %d; removing the student from the model instead", user_id,
+                        extra={"student_id": user_id})
+        if len(user_ids) > 1 and total:
+            eta = (time.time() - start) / max(done, 1) * (total - done)
+            print(f"📈 Progress: {done}/{total} images ({done * 100 // total}%) - ETA {eta:.0f}s", flush=True)
+
+    # Keep only recognition.gallery_k representative crops per student, as a retrain would
+    all_faces = [face for user_id in user_ids for face in faces[user_id]]
+    all_ids = [user_id for user_id in user_ids for _ in faces[user_id]]
+    all_faces, all_ids = prune_training_set(all_faces, all_ids, config)
+    faces = {user_id: [face for face, i in zip(all_faces, all_ids) if i == user_id] for user_id in user_ids}
+
+    # Update every model that knows a student; new students join classifier.yml
+    # and, when the models are sharded, their group's shard
+    paths = model_files(classifier_path)
+    by_path = {}
+    known = set()
+    for path in paths:
+        labels = model_labels(path, config)
+        replacements = {user_id: faces[user_id] for user_id in user_ids if user_id in labels}
+        if replacements:
+            by_path[path] = replacements
+            known.update(replacements)
+    new = {user_id: faces[user_id] for user_id in user_ids if user_id not in known and faces[user_id]}
+    if new:
+        by_path.setdefault(classifier_path, {}).update(new)
+    if new and len(paths) > 1:
+        groups = load_groups()
+        for user_id, user_faces in new.items():
+            path = shard_path(groups.get(user_id, DEFAULT_GROUP))
+            if path not in paths:
+                # A group without a shard yet needs the full sharded retrain to create it
+                return False
+            by_path.setdefault(path, {})[user_id] = user_faces
+    for path, replacements in by_path.items():
+        edit_labels(path, replacements, config)
+        for user_id, user_faces in sorted(replacements.items()):
+            if user_faces:
+                log.info("✅ Updated ID %d in %s with %d faces", user_id, path, len(user_faces),
+                         extra={"student_id": user_id})
+            else:
+                log.info("✅ Removed ID %d from %s", user_id, path, extra={"student_id": user_id})
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove or re-enroll one student in the trained model without retraining")
+    parser.add_argument("action", choices=["remove", "replace"])
+    parser.add_argument("user_id", type=int)
+    parser.add_argument("--data", default="data", help="Data directory holding the student's new images")
+    args = parser.parse_args()
+
+    try:
+        if args.action == "remove":
+            if not remove_from_models(args.user_id):
+                print(f"ℹ️ ID {args.user_id} was not found in any model.")
+        elif not reenroll(args.user_id, args.data):
+            print("❌ Error: The model cannot be edited in place. Retrain with: python classifier.py")
+            sys.exit(1)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,282 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import cv2
+from classifier import load_training_face, write_model_atomic
+from config import load_config
+from dataset_store import is_packed_store, open_store
+from gallery_pruning import prune_training_set
+from recognizers import create_recognizer, QuantizedLBPHRecognizer
+
+PARTS_DIR = os.path.join("models", "parts")
+
+# Backends whose model is a plain list of labelled histograms and can be
+# merged by concatenation; PCA/Eigen/Fisher fit a basis to the whole dataset
+MERGEABLE_BACKENDS = ["lbph", "lbph-q"]
+
+def parse_id_range(text):
+    """Parse 'LO-HI' (inclusive) into a (lo, hi) pair of user IDs"""
+    lo, _, hi = text.partition("-")
+    return int(lo), int(hi or lo)
+
+def part_path(index, count, parts_dir=PARTS_DIR):
+    """Return the partial model file written by worker index of count"""
+    return os.path.join(parts_dir, f"classifier.part-{index}-of-{count}.yml")
+
+def in_part(user_id, index=None, count=None, id_range=None):
+    """Decide whether a user's images belong to this worker's part"""
+    if id_range is not None and not id_range[0] <= user_id <= id_range[1]:
+        return False
+    # Spread users over workers by ID so one user's images stay in one part
+    return count is None or user_id % count == index
+
+def image_user_id(path):
+    """Return the ID in a user.{id}.{count}.jpg filename, or None"""
+    parts = os.path.basename(path).split(".")
+    if len(parts) < 3 or parts[0] != "user" or not parts[1].isdigit():
+        return None
+    return int(parts[1])
+
+def load_part(data, index=None, count=None, id_range=None):
+    """Load the faces and IDs of one part from a data directory or packed store"""
+    if is_packed_store(data):
+        faces, ids, _ = open_store(data)
+        rows = [i for i, user_id in enumerate(ids.tolist()) if in_part(user_id, index, count, id_range)]
+        return [faces[i] for i in rows], [int(ids[i]) for i in rows]
+
+    detector = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    if detector.empty():
+        raise RuntimeError("Could not load face cascade classifier")
+    # Sorted so every node sees the same order regardless of filesystem
+    image_paths = sorted(os.path.join(data, f) for f in os.listdir(data) if f.endswith(('.jpg', '.png', '.jpeg')))
+    faces, ids = [], []
+    for image_path in image_paths:
+        user_id = image_user_id(image_path)
+        # The ID is in the filename, so other parts' images are never decoded
+        if user_id is None or not in_part(user_id, index, count, id_range):
+            continue
+        result = load_training_face(image_path, detector, verbose=False)
+        if result is not None:
+            faces.append(result[0])
+            ids.append(result[1])
+    return faces, ids
+
+def train_part(data, output_path, index=None, count=None, id_range=None):
+    """Train one partial model on the users of one part, returning (faces, users); empty parts write nothing"""
+    config = load_config()
+    backend = config["recognition"]["backend"]
+    if backend not in MERGEABLE_BACKENDS:
+        raise ValueError(f"The '{backend}' backend cannot be merged; use one of: {', '.join(MERGEABLE_BACKENDS)}")
+    faces, ids = load_part(data, index, count, id_range)
+    if not faces:
+        return 0, 0
+    # Pruning is per student, and parts never split a student, so pruned parts
+    # still merge into exactly the pruned single-node model
+    faces, ids = prune_training_set(faces, ids, config)
+    clf = create_recognizer(config)
+    clf.train(faces, ids)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    write_model_atomic(clf, output_path)
+    return len(faces), len(set(ids))
+
+def read_lbph_parts(path):
+    """Read an OpenCV LBPH model file into (params, threshold, histograms, labels, labels_info)"""
+    try:
+        fs = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+    except Exception:
+        raise ValueError(f"{path} is not an OpenCV LBPH model")
+    try:
+        node = fs.getNode("opencv_lbphfaces")
+        if node.empty():
+            raise ValueError(f"{path} is not an OpenCV LBPH model")
+        params = tuple(int(node.getNode(key).real()) for key in ("radius", "neighbors", "grid_x", "grid_y"))
+        histograms_node = node.getNode("histograms")
+        histograms = [histograms_node.at(i).mat() for i in range(histograms_node.size())]
+        labels = node.getNode("labels").mat()
+        labels = [] if labels is None else labels.ravel().tolist()
+        info_node = node.getNode("labelsInfo")
+        labels_info = [(int(info_node.at(i).getNode("label").real()), info_node.at(i).getNode("value").string())
+                       for i in range(info_node.size())]
+        return params, node.getNode("threshold").real(), histograms, labels, labels_info
+    finally:
+        fs.release()
+
+def write_lbph_model(path, params, threshold, histograms, labels, labels_info):
+    """Write histograms and labels in the layout LBPHFaceRecognizer.read() expects"""
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+    try:
+        fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+        fs.write("threshold", threshold)
+        for key, value in zip(("radius", "neighbors", "grid_x", "grid_y"), params):
+            fs.write(key, value)
+        fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+        for histogram in histograms:
+            fs.write("", histogram)
+        fs.endWriteStruct()
+        fs.write("labels", np.asarray(labels, dtype=np.int32).reshape(-1, 1))
+        fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+        for label, value in labels_info:
+            fs.startWriteStruct("", cv2.FileNode_MAP)
+            fs.write("label", label)
+            fs.write("value", value)
+            fs.endWriteStruct()
+        fs.endWriteStruct()
+        fs.endWriteStruct()
+    finally:
+        fs.release()
+
+def merge_lbph(paths, output_path):
+    """Concatenate the histograms of several OpenCV LBPH models"""
+    merged = None
+    for path in paths:
+        params, threshold, histograms, labels, labels_info = read_lbph_parts(path)
+        if merged is None:
+            merged = [params, threshold, [], [], {}]
+        elif params != merged[0]:
+            raise ValueError(f"{path} uses LBP parameters {params}, expected {merged[0]}")
+        merged[2].extend(histograms)
+        merged[3].extend(labels)
+        merged[4].update(labels_info)
+    params, threshold, histograms, labels, labels_info = merged
+    base, ext = os.path.splitext(output_path)
+    tmp_path = f"{base}.tmp{ext}"
+    write_lbph_model(tmp_path, params, threshold, histograms, labels, sorted(labels_info.items()))
+    os.replace(tmp_path, output_path)
+    return len(histograms), len(set(labels))
+
+def merge_quantized(paths, output_path):
+    """Concatenate the quantized galleries of several lbph-q models"""
+    merged = None
+    for path in paths:
+        part = QuantizedLBPHRecognizer()
+        part.read(path)
+        if merged is None:
+            merged = part
+            continue
+        if (part.params, part.quantization) != (merged.params, merged.quantization):
+            raise ValueError(f"{path} was written with different LBP parameters or quantization")
+        # Scales are per stored histogram, so the quantized bytes copy over unchanged
+        merged.histograms = np.vstack([merged.histograms, part.histograms])
+        merged.scales = np.vstack([merged.scales, part.scales])
+        merged.labels = np.concatenate([merged.labels, part.labels])
+    write_model_atomic(merged, output_path)
+    return len(merged.labels), len(set(merged.labels.tolist()))
+
+def merge_models(paths, output_path="classifier.yml", backend=None):
+    """Combine partial models into one model file without recomputing any histogram"""
+    backend = backend or load_config()["recognition"]["backend"]
+    if not paths:
+        raise ValueError("No partial models to merge")
+    if backend == "lbph":
+        return merge_lbph(paths, output_path)
+    if backend == "lbph-q":
+        return merge_quantized(paths, output_path)
+    raise ValueError(f"The '{backend}' backend cannot be merged; use one of: {', '.join(MERGEABLE_BACKENDS)}")
+
+def run_local(data, workers, output_path="classifier.yml", parts_dir=PARTS_DIR):
+    """Train every part in its own local worker process, then merge the results"""
+    paths = [part_path(i, workers, parts_dir) for i in range(workers)]
+    for path in paths:
+        # Never merge a stale part left by an earlier run
+        if os.path.exists(path):
+            os.remove(path)
+    processes = [subprocess.Popen([sys.executable, __file__, "part", data, "--index", str(i),
+                                   "--count", str(workers), "--output", path])
+                 for i, path in enumerate(paths)]
+    failed = [i for i, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        raise RuntimeError(f"Workers {failed} failed")
+    # A part with no users in it writes nothing and is simply left out
+    return merge_models([path for path in paths if os.path.exists(path)], output_path)
+
+def verify(data, workers):
+    """Check that a merged multi-process build predicts exactly like a single-node build"""
+    # Both builds go to a scratch folder so models/parts is left alone
+    parts_dir = tempfile.mkdtemp(prefix="merge_verify_")
+    merged_path = os.path.join(parts_dir, "classifier.merged.yml")
+    single_path = os.path.join(parts_dir, "classifier.single.yml")
+    try:
+        start = time.perf_counter()
+        train_part(data, single_path)
+        single_time = time.perf_counter() - start
+        start = time.perf_counter()
+        run_local(data, workers, merged_path, parts_dir)
+        merged_time = time.perf_counter() - start
+
+        config = load_config()
+        single = create_recognizer(config)
+        single.read(single_path)
+        merged = create_recognizer(config)
+        merged.read(merged_path)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    faces, ids = load_part(data)
+    single_results = single.predict_batch(faces)
+    merged_results = merged.predict_batch(faces)
+    mismatches = sum(1 for a, b in zip(single_results, merged_results)
+                     if a[0] != b[0] or abs(a[1] - b[1]) > 1e-6 * max(1.0, abs(a[1])))
+    print(f"\n📊 Merge Verification ({len(faces)} faces, {len(set(ids))} users, {workers} workers):")
+    print(f"- Single-node build: {single_time:.1f}s, merged build: {merged_time:.1f}s")
+    print(f"- Predictions differing: {mismatches}/{len(faces)}")
+    return mismatches == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train partial models in parallel and merge them into one model")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    part = commands.add_parser("part", help="Train one part (run on a worker process or node)")
+    part.add_argument("data", help="Data directory, subdirectory or packed store")
+    part.add_argument("--index", type=int, help="This worker's index (users with ID %% count == index)")
+    part.add_argument("--count", type=int, help="Total number of workers")
+    part.add_argument("--ids", help="Only users in this inclusive ID range, e.g. 1-100")
+    part.add_argument("--output", help="Partial model path (default: models/parts/classifier.part-I-of-N.yml)")
+
+    merge = commands.add_parser("merge", help="Merge partial models into one model")
+    merge.add_argument("parts", nargs="+", help="Partial model files")
+    merge.add_argument("--output", default="classifier.yml")
+
+    run = commands.add_parser("run", help="Train all parts as local processes, then merge")
+    run.add_argument("data", nargs="?", default="data")
+    run.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    run.add_argument("--output", default="classifier.yml")
+
+    check = commands.add_parser("verify", help="Check that a merged build predicts like a single-node build")
+    check.add_argument("data", nargs="?", default="data")
+    check.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "part":
+            if (args.index is None) != (args.count is None):
+                parser.error("--index and --count must be given together")
+            id_range = parse_id_range(args.ids) if args.ids else None
+            output = args.output or (part_path(args.index, args.count) if args.count
+                                     else os.path.join(PARTS_DIR, f"classifier.part-{args.ids or 'all'}.yml"))
+            faces, users = train_part(args.data, output, args.index, args.count, id_range)
+            if faces:
+                print(f"✅ Part saved to {output} with {faces} faces for {users} users.")
+            else:
+                # An empty part is not an error: the merge just skips it
+                print(f"⚠️ Warning: No faces for this part in '{args.data}'; nothing written.")
+        elif args.command == "merge":
+            faces, users = merge_models(args.parts, args.output)
+            print(f"✅ Merged {len(args.parts)} parts into {args.output} ({faces} faces, {users} users).")
+        elif args.command == "run":
+            faces, users = run_local(args.data, args.workers, args.output)
+            print(f"✅ Training complete! {args.output} merged from {args.workers} parts "
+                  f"({faces} faces, {users} users).")
+        else:
+            if verify(args.data, args.workers):
+                print("✅ Merged model predicts identically to the single-node build.")
+            else:
+                print("❌ Merged model predictions differ from the single-node build.")
+                sys.exit(1)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
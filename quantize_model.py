@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import numpy as np
+import cv2
+from compare_recognizers import split_dataset
+from config import load_config, save_config
+from dataset_store import load_crops
+from model_edit import model_files
+from recognizers import QuantizedLBPHRecognizer, recognition_threshold
+
+def load_lbph(path):
+    """Read an OpenCV LBPH model, returning (model, seconds taken)"""
+    start = time.perf_counter()
+    clf = cv2.face.LBPHFaceRecognizer_create()
+    clf.read(path)
+    return clf, time.perf_counter() - start
+
+def quantize_lbph(clf, quantization):
+    """Build a quantized gallery from an OpenCV LBPH model's histograms without recomputing them"""
+    histograms = np.vstack([h.reshape(1, -1) for h in clf.getHistograms()]).astype(np.float32)
+    labels = np.asarray(clf.getLabels()).ravel()
+    face_size = load_config()["recognition"]["face_size"]
+    quantized = QuantizedLBPHRecognizer(quantization, clf.getRadius(), clf.getNeighbors(),
+                                        clf.getGridX(), clf.getGridY(), face_size)
+    quantized.train_from_histograms(histograms, labels)
+    return quantized, histograms.nbytes
+
+def quantize_shards(shards, quantization):
+    """Write a quantized copy of every shard next to it, returning [(shard, temporary copy)]"""
+    converted = []
+    try:
+        for path in shards:
+            shard, _ = load_lbph(path)
+            base, ext = os.path.splitext(path)
+            # model_files() skips .tmp. files, so nothing loads a half-converted shard
+            tmp_path = f"{base}.tmp{ext}"
+            quantize_lbph(shard, quantization)[0].write(tmp_path)
+            converted.append((path, tmp_path))
+    except Exception:
+        for _, tmp_path in converted:
+            os.remove(tmp_path)
+        raise
+    return converted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert an LBPH classifier.yml to quantized histogram storage")
+    parser.add_argument("input", nargs="?", default="classifier.yml")
+    parser.add_argument("output", nargs="?", default="classifier.lbphq.yml")
+    parser.add_argument("--dtype", default="uint8", choices=sorted(QuantizedLBPHRecognizer.DTYPES))
+    parser.add_argument("--data", default="data", help="Crops used to measure the accuracy delta")
+    parser.add_argument("--test-every", type=int, default=4, help="Hold out every Nth crop of each user")
+    parser.add_argument("--activate", action="store_true",
+                        help="Replace classifier.yml with the quantized model and select the lbph-q backend")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"❌ Error: Classifier file '{args.input}' not found.")
+        sys.exit(1)
+
+    try:
+        original, original_load = load_lbph(args.input)
+    except Exception as e:
+        print(f"❌ Error: '{args.input}' is not an OpenCV LBPH model: {e}")
+        sys.exit(1)
+
+    quantized, original_bytes = quantize_lbph(original, args.dtype)
+    quantized.write(args.output)
+
+    start = time.perf_counter()
+    reloaded = QuantizedLBPHRecognizer()
+    reloaded.read(args.output)
+    quantized_load = time.perf_counter() - start
+    quantized_bytes = reloaded.histograms.nbytes + reloaded.scales.nbytes
+
+    print(f"✅ Wrote {args.dtype} model to {args.output}")
+    print(f"\n📊 Quantization Report ({len(reloaded.labels)} gallery histograms):")
+    print(f"- Gallery memory: {original_bytes / 1024:.0f} KB -> {quantized_bytes / 1024:.0f} KB "
+          f"({original_bytes / quantized_bytes:.1f}x smaller)")
+    print(f"- File size: {os.path.getsize(args.input) / 1024:.0f} KB -> {os.path.getsize(args.output) / 1024:.0f} KB")
+    print(f"- Load time: {original_load * 1000:.1f} ms -> {quantized_load * 1000:.1f} ms "
+          f"({original_load / max(quantized_load, 1e-9):.1f}x faster)")
+
+    faces, ids = load_crops(args.data)
+    train_faces, train_ids, test_faces, test_ids = split_dataset(faces, ids, args.test_every)
+    if train_faces and test_faces:
+        # The model was built from these crops, so score held-out crops against
+        # a gallery with the same parameters built from the rest of them
+        gallery = cv2.face.LBPHFaceRecognizer_create(original.getRadius(), original.getNeighbors(),
+                                                     original.getGridX(), original.getGridY())
+        gallery.train(train_faces, np.array(train_ids, dtype=np.int32))
+        gallery_quantized, _ = quantize_lbph(gallery, args.dtype)
+        threshold = recognition_threshold(load_config(), "lbph")
+        original_results = [gallery.predict(face) for face in test_faces]
+        quantized_results = gallery_quantized.predict_batch(test_faces)
+        deltas = [abs(a[1] - b[1]) for a, b in zip(original_results, quantized_results)]
+        original_correct = sum(1 for (p, d), t in zip(original_results, test_ids) if p == t and d < threshold)
+        quantized_correct = sum(1 for (p, d), t in zip(quantized_results, test_ids) if p == t and d < threshold)
+        changed = sum(1 for a, b in zip(original_results, quantized_results)
+                      if a[0] != b[0] or (a[1] < threshold) != (b[1] < threshold))
+        print(f"- Held-out accuracy on {args.data} ({len(train_faces)} gallery, {len(test_faces)} test crops, "
+              f"threshold {threshold}): {original_correct / len(test_faces):.1%} -> "
+              f"{quantized_correct / len(test_faces):.1%}")
+        print(f"- Distance delta: mean {np.mean(deltas):.4f}, max {np.max(deltas):.4f}; "
+              f"{changed} decisions changed")
+
+    if args.activate:
+        base, ext = os.path.splitext(args.input)
+        backup = f"{base}.lbph{ext}"
+        if backup == args.input:
+            print(f"❌ Error: Cannot name a backup for '{args.input}'; the original model was not replaced")
+            sys.exit(1)
+        # lbph-q cannot read OpenCV shards, so every shard is converted before anything is replaced
+        try:
+            converted = quantize_shards([path for path in model_files(args.input) if path != args.input], args.dtype)
+        except Exception as e:
+            print(f"❌ Error: Could not quantize the model shards: {e}; the original models were not replaced")
+            sys.exit(1)
+        shutil.copy2(args.input, backup)
+        os.replace(args.output, args.input)
+        for path, tmp_path in converted:
+            # Shard backups go in a subfolder so they are not loaded as shards of their own
+            shard_backup = os.path.join(os.path.dirname(path), "lbph", os.path.basename(path))
+            os.makedirs(os.path.dirname(shard_backup), exist_ok=True)
+            shutil.copy2(path, shard_backup)
+            os.replace(tmp_path, path)
+            print(f"✅ {path} now holds the quantized shard (original kept as {shard_backup})")
+        config = load_config()
+        config["recognition"]["backend"] = "lbph-q"
+        config["recognition"]["quantization"] = args.dtype
+        save_config(config)
+        print(f"\n✅ {args.input} now holds the quantized model (original kept as {backup})")
+        print("✅ config.json recognition.backend set to 'lbph-q'")
@@ -0,0 +1,238 @@
+import cv2
+import numpy as np
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from config import load_config
+from recognizers import create_recognizer, recognition_threshold
+from structured_log import get_logger
+
+log = get_logger(__name__)
+
+class MicroBatcher:
+    """Collect crops from concurrent requests and score them in one predict pass
+
+    Request threads call submit() and block until their crops are scored. A
+    single worker thread waits for the first pending request, then keeps
+    draining the queue for up to max_wait seconds (or until max_batch crops
+    are collected) so that concurrent requests share one call into the model.
+    """
+    def __init__(self, clf, max_batch=32, max_wait=0.005):
+        self.clf = clf
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = queue.Queue()
+        self.batches = 0
+        self.batched_crops = 0
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, crops):
+        """Score a list of normalized grayscale crops, returning (id, distance) pairs"""
+        if not crops:
+            return []
+        job = {"crops": crops, "done": threading.Event(), "results": None, "error": None}
+        self.pending.put(job)
+        job["done"].wait()
+        if job["error"] is not None:
+            raise job["error"]
+        return job["results"]
+
+    def _predict_batch(self, crops):
+        # Backends that can score a whole batch at once expose predict_batch;
+        # plain OpenCV recognizers are scored one crop at a time in this thread
+        predict_batch = getattr(self.clf, "predict_batch", None)
+        if predict_batch is not None:
+            return predict_batch(crops)
+        return [self.clf.predict(crop) for crop in crops]
+
+    def _run(self):
+        while True:
+            jobs = [self.pending.get()]
+            count = len(jobs[0]["crops"])
+            deadline = time.perf_counter() + self.max_wait
+            while count < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                count += len(job["crops"])
+
+            crops = [crop for job in jobs for crop in job["crops"]]
+            try:
+                results = self._predict_batch(crops)
+                offset = 0
+                for job in jobs:
+                    job["results"] = [(int(id), float(distance)) for id, distance in
+                                      results[offset:offset + len(job["crops"])]]
+                    offset += len(job["crops"])
+            except Exception as e:
+                for job in jobs:
+                    job["error"] = e
+            self.batches += 1
+            self.batched_crops += len(crops)
+            for job in jobs:
+                job["done"].set()
+
+class RecognitionService:
+    """Warm face detector + recognizer shared by every HTTP request"""
+    def __init__(self, classifier_path="classifier.yml", names_path="names.txt",
+                 threshold=None, max_batch=32, max_wait=0.005):
+        self.cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        self.local = threading.local()
+        if self.face_cascade().empty():
+            raise RuntimeError("Could not load face cascade classifier")
+
+        if not os.path.exists(classifier_path):
+            raise FileNotFoundError(f"Classifier file '{classifier_path}' not found")
+        config = load_config()
+        clf = create_recognizer(config)
+        clf.read(classifier_path)
+
+        self.name_dict = self.load_names(names_path)
+        self.threshold = threshold if threshold is not None else recognition_threshold(config)
+        self.face_size = tuple(config["recognition"]["face_size"])
+        self.batcher = MicroBatcher(clf, max_batch, max_wait)
+        self.requests = 0
+
+    def face_cascade(self):
+        """Return this request thread's own cascade (detectMultiScale is not thread-safe)"""
+        cascade = getattr(self.local, "cascade", None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self.cascade_path)
+            self.local.cascade = cascade
+        return cascade
+
+    def load_names(self, file_path):
+        """Load student names from file"""
+        name_dict = {}
+        if not os.path.exists(file_path):
+            return name_dict
+        with open(file_path, "r") as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) >= 2 and parts[0].isdigit():
+                    name_dict[int(parts[0])] = " ".join(parts[1:])
+        return name_dict
+
+    def recognize(self, image, mode="frame", scaleFactor=1.1, minNeighbors=5):
+        """Detect (in frame mode) and recognize faces in a decoded image"""
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if mode == "crop":
+            boxes = [(0, 0, gray.shape[1], gray.shape[0])]
+        else:
+            boxes = [tuple(int(v) for v in box) for box in
+                     self.face_cascade().detectMultiScale(gray, scaleFactor, minNeighbors)]
+
+        # Normalize every crop to the training size so the batch has uniform
+        # cost, writing straight into one block allocated per request
+        batch = np.empty((len(boxes), self.face_size[1], self.face_size[0]), dtype=np.uint8)
+        crops = [cv2.resize(gray[y:y + h, x:x + w], self.face_size, dst=batch[i])
+                 for i, (x, y, w, h) in enumerate(boxes)]
+        results = self.batcher.submit(crops)
+
+        faces = []
+        for box, (id, distance) in zip(boxes, results):
+            recognized = distance < self.threshold
+            faces.append({
+                "box": list(box),
+                "id": id if recognized else None,
+                "name": self.name_dict.get(id, "Unknown") if recognized else "Unknown",
+                "distance": round(distance, 3),
+            })
+        self.requests += 1
+        return faces
+
+def make_handler(service):
+    class RecognitionHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/health":
+                self._send_json(200, {
+                    "status": "ok",
+                    "requests": service.requests,
+                    "batches": service.batcher.batches,
+                    "batched_crops": service.batcher.batched_crops,
+                })
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/recognize":
+                self._send_json(404, {"error": "not found"})
+                return
+
+            mode = parse_qs(url.query).get("mode", ["frame"])[0]
+            if mode not in ("frame", "crop"):
+                self._send_json(400, {"error": f"unknown mode '{mode}'"})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            data = np.frombuffer(self.rfile.read(length), dtype=np.uint8)
+            image = cv2.imdecode(data, cv2.IMREAD_COLOR) if data.size else None
+            if image is None:
+                self._send_json(400, {"error": "body must be an encoded JPEG or PNG image"})
+                return
+
+            try:
+                start = time.perf_counter()
+                faces = service.recognize(image, mode)
+                self._send_json(200, {"faces": faces,
+                                      "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)})
+            except Exception as e:
+                log.error("❌ Error recognizing request: %s", e, extra={"mode": mode})
+                self._send_json(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            # Per-request access logs would dominate the service's own latency,
+            # so they only appear at DEBUG level
+            log.debug(format, *args)
+
+    return RecognitionHandler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local face recognition HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--classifier", default="classifier.yml")
+    parser.add_argument("--names", default="names.txt")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Override the backend threshold from config.json")
+    parser.add_argument("--max-batch", type=int, default=32, help="Most crops scored in one predict pass")
+    parser.add_argument("--max-wait-ms", type=float, default=5, help="How long to wait for more requests to batch")
+    args = parser.parse_args()
+
+    try:
+        service = RecognitionService(args.classifier, args.names, args.threshold,
+                                     args.max_batch, args.max_wait_ms / 1000)
+    except Exception as e:
+        log.error("❌ Error starting recognition service: %s", e)
+        sys.exit(1)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"✅ Recognition service listening on http://{args.host}:{args.port}")
+    print("   POST /recognize?mode=frame|crop with a JPEG/PNG body, GET /health for stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n✅ Recognition service stopped by user.")
+    finally:
+        server.server_close()
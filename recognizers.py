@@ -0,0 +1,450 @@
+import os
+import cv2
+import numpy as np
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Training crops are written at this size by collect_training_data.py
+FACE_SIZE = (200, 200)
+
+# Predict pools shared by every OpenCV recognizer in the process, one per
+# worker count. Reloads and shards create new recognizers all the time, so
+# per-model pools would leak their threads.
+predict_pools = {}
+predict_pools_lock = threading.Lock()
+
+def shared_predict_pool(workers):
+    """Return the process-wide thread pool with `workers` threads"""
+    with predict_pools_lock:
+        if workers not in predict_pools:
+            predict_pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="predict")
+        return predict_pools[workers]
+
+def normalize_face(face, size=FACE_SIZE):
+    """Return a uint8 grayscale face resized to the training size"""
+    face = np.asarray(face)
+    if face.ndim == 3:
+        face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    if face.shape[:2] != (size[1], size[0]):
+        face = cv2.resize(face, size)
+    return face
+
+class FaceNormalizer:
+    """Resize face crops into one preallocated buffer of the recognizer's face size
+
+    The returned array is the shared buffer, so each result must be consumed
+    (predicted) before the next call. This keeps per-face cost constant no
+    matter how close a student stands, without a new allocation per face.
+    """
+    def __init__(self, size=FACE_SIZE):
+        self.size = tuple(size)
+        self.buffer = np.empty((self.size[1], self.size[0]), dtype=np.uint8)
+        self.batch_buffer = np.empty((0, self.size[1], self.size[0]), dtype=np.uint8)
+
+    def __call__(self, crop):
+        return cv2.resize(crop, self.size, dst=self.buffer)
+
+    def batch(self, crops):
+        """Resize several crops into their own slots of one reused buffer"""
+        if len(self.batch_buffer) < len(crops):
+            self.batch_buffer = np.empty((len(crops), self.size[1], self.size[0]), dtype=np.uint8)
+        return [cv2.resize(crop, self.size, dst=self.batch_buffer[i]) for i, crop in enumerate(crops)]
+
+class GrayFrameBuffer:
+    """Convert BGR frames to grayscale into a buffer reused across frames"""
+    def __init__(self):
+        self.buffer = None
+
+    def __call__(self, frame):
+        if frame.ndim == 2:
+            return frame
+        if self.buffer is None or self.buffer.shape != frame.shape[:2]:
+            self.buffer = np.empty(frame.shape[:2], dtype=np.uint8)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.buffer)
+
+def lbp_histograms(faces, radius=1, neighbors=8, grid_x=8, grid_y=8):
+    """Compute LBPH spatial histograms for a batch of equally sized faces
+
+    Mirrors OpenCV's extended LBP operator (bilinear sampling on a circle of
+    `radius`) and its per-cell histograms normalized to sum to 1, so the rows
+    are directly comparable with LBPHFaceRecognizer.getHistograms(). Every
+    face in the batch is processed with the same array operations at once.
+    """
+    src = np.asarray(faces, dtype=np.float32)
+    if src.ndim == 2:
+        src = src[np.newaxis]
+    count, rows, cols = src.shape
+    center = src[:, radius:rows - radius, radius:cols - radius]
+    codes = np.zeros(center.shape, dtype=np.int64)
+    eps = np.finfo(np.float32).eps
+
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / neighbors))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / neighbors))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty, tx = np.float32(y - fy), np.float32(x - fx)
+        w1 = (1 - tx) * (1 - ty)
+        w2 = tx * (1 - ty)
+        w3 = (1 - tx) * ty
+        w4 = tx * ty
+
+        def shifted(dy, dx):
+            return src[:, radius + dy:rows - radius + dy, radius + dx:cols - radius + dx]
+
+        t = (w1 * shifted(fy, fx) + w2 * shifted(fy, cx)
+             + w3 * shifted(cy, fx) + w4 * shifted(cy, cx))
+        codes += (((t > center) | (np.abs(t - center) < eps)).astype(np.int64) << n)
+
+    bins = 2 ** neighbors
+    lbp_rows, lbp_cols = codes.shape[1:]
+    height, width = lbp_rows // grid_y, lbp_cols // grid_x
+    # Crop to whole cells, then give every (face, cell, code) triple its own bin
+    codes = codes[:, :grid_y * height, :grid_x * width]
+    codes = codes.reshape(count, grid_y, height, grid_x, width).transpose(0, 1, 3, 2, 4)
+    codes = codes.reshape(count, grid_y * grid_x, height * width)
+    offsets = (np.arange(count * grid_y * grid_x, dtype=np.int64) * bins).reshape(count, -1, 1)
+    hist = np.bincount((codes + offsets).ravel(), minlength=count * grid_y * grid_x * bins)
+    hist = hist.reshape(count, grid_y * grid_x * bins).astype(np.float32)
+    return hist / np.float32(height * width)
+
+def chi_square_distances(queries, gallery, chunk_size=16):
+    """Alternative chi-square distance (OpenCV HISTCMP_CHISQR_ALT) between every query and gallery row"""
+    queries = np.asarray(queries, dtype=np.float32)
+    gallery = np.asarray(gallery, dtype=np.float32)
+    distances = np.empty((len(queries), len(gallery)), dtype=np.float64)
+    # Chunk over queries so the (queries, gallery, bins) temporaries stay bounded
+    eps = np.finfo(np.float32).eps
+    for start in range(0, len(queries), chunk_size):
+        q = queries[start:start + chunk_size, np.newaxis, :]
+        diff = q - gallery[np.newaxis]
+        total = q + gallery[np.newaxis]
+        # Empty bins have diff == 0, so clamping the denominator makes them
+        # contribute 0 without a masked select
+        np.maximum(total, eps, out=total)
+        np.multiply(diff, diff, out=diff)
+        np.divide(diff, total, out=diff)
+        distances[start:start + chunk_size] = 2 * diff.sum(axis=2, dtype=np.float64)
+    return distances
+
+class OpenCVRecognizer:
+    """Wrap one of OpenCV's cv2.face recognizers behind the common backend interface"""
+    def __init__(self, name, engine, face_size=FACE_SIZE, workers=None):
+        self.name = name
+        self.engine = engine
+        # OpenCV releases the GIL inside predict, so a frame's faces can be
+        # scored on several cores at once on a pool shared by every model
+        self.workers = workers or os.cpu_count() or 1
+        # Every face is resized to the same size for training and predict, which
+        # Eigen/Fisher require and which bounds the cost of an LBPH predict
+        self.face_size = tuple(face_size)
+        # Only LBPH can add samples to a trained model without retraining
+        self.incremental = name == "lbph"
+
+    def _prepare(self, face):
+        return normalize_face(face, self.face_size)
+
+    def train(self, faces, ids):
+        self.engine.train([self._prepare(face) for face in faces], np.asarray(ids, dtype=np.int32))
+
+    def update(self, faces, ids):
+        if not self.incremental:
+            raise NotImplementedError(f"The '{self.name}' backend cannot be updated incrementally")
+        self.engine.update([self._prepare(face) for face in faces], np.asarray(ids, dtype=np.int32))
+
+    def predict(self, face):
+        return self.engine.predict(self._prepare(face))
+
+    def predict_batch(self, faces):
+        if len(faces) < 2 or self.workers < 2:
+            return [self.predict(face) for face in faces]
+        # map() yields results in input order
+        return list(shared_predict_pool(self.workers).map(self.predict, faces))
+
+    def distance_matrix(self, faces):
+        """Return (distances from every face to every gallery entry, gallery labels); LBPH only"""
+        if self.name != "lbph":
+            raise NotImplementedError(f"The '{self.name}' backend does not expose gallery distances")
+        # Recomputing the query histograms in numpy matches the engine's own
+        # to float precision, and its stored histograms are the gallery
+        params = (self.engine.getRadius(), self.engine.getNeighbors(), self.engine.getGridX(), self.engine.getGridY())
+        queries = lbp_histograms(np.stack([self._prepare(face) for face in faces]), *params)
+        gallery = np.vstack([h.reshape(1, -1) for h in self.engine.getHistograms()])
+        return chi_square_distances(queries, gallery), np.asarray(self.engine.getLabels()).ravel()
+
+    def read(self, path):
+        self.engine.read(path)
+
+    def write(self, path):
+        self.engine.write(path)
+
+class PCARecognizer:
+    """Nearest neighbour on PCA-compressed LBP histograms
+
+    Histograms are square-rooted (so Euclidean distance approximates the
+    Hellinger distance between them) and projected onto the top principal
+    components of the training set. The gallery then holds only
+    `components` floats plus one residual norm per face instead of 16,384
+    floats, and a whole batch of queries is scored with one matrix product.
+
+    The residual (the part of a histogram the basis cannot represent) is kept
+    because a small gallery spans few directions: faces of strangers differ
+    from it mostly outside the subspace, so dropping it would make every
+    query look close.
+    """
+    name = "pca"
+    # update() only projects onto the existing basis, so a chunked train would
+    # depend on which faces came first; full retrains fit the basis on all data
+    incremental = False
+
+    def __init__(self, components=64, radius=1, neighbors=8, grid_x=8, grid_y=8, face_size=FACE_SIZE):
+        self.components = components
+        self.params = (radius, neighbors, grid_x, grid_y)
+        self.face_size = tuple(face_size)
+        self.mean = None
+        self.basis = None
+        self.projections = None
+        self.residuals = None
+        self.labels = None
+
+    def _features(self, faces):
+        faces = np.stack([normalize_face(face, self.face_size) for face in faces])
+        return np.sqrt(lbp_histograms(faces, *self.params))
+
+    def _project(self, features):
+        """Return (projections, squared residual norms) for a batch of features"""
+        centred = features - self.mean
+        projections = centred @ self.basis.T
+        residuals = np.maximum((centred ** 2).sum(axis=1) - (projections ** 2).sum(axis=1), 0)
+        return projections.astype(np.float32), residuals.astype(np.float32)
+
+    def train(self, faces, ids):
+        features = self._features(faces)
+        self.mean = features.mean(axis=0)
+        # Thin SVD of the centred data gives the principal axes without forming the covariance
+        _, _, vt = np.linalg.svd(features - self.mean, full_matrices=False)
+        self.basis = vt[:min(self.components, len(vt))].astype(np.float32)
+        self.projections, self.residuals = self._project(features)
+        self.labels = np.asarray(ids, dtype=np.int32)
+
+    def update(self, faces, ids):
+        if self.basis is None:
+            self.train(faces, ids)
+            return
+        # New faces are projected onto the existing basis; retrain to refresh the axes
+        projections, residuals = self._project(self._features(faces))
+        self.projections = np.vstack([self.projections, projections])
+        self.residuals = np.concatenate([self.residuals, residuals])
+        self.labels = np.concatenate([self.labels, np.asarray(ids, dtype=np.int32)])
+
+    def distance_matrix(self, faces):
+        """Return (distances from every face to every gallery entry, gallery labels)"""
+        queries, query_residuals = self._project(self._features(faces))
+        # ||q - g||^2 = ||q||^2 - 2 q.g + ||g||^2 inside the subspace, computed for
+        # all pairs at once, plus both residuals (orthogonal to the subspace)
+        sq = ((queries ** 2).sum(axis=1)[:, np.newaxis] - 2 * queries @ self.projections.T
+              + (self.projections ** 2).sum(axis=1)[np.newaxis]
+              + query_residuals[:, np.newaxis] + self.residuals[np.newaxis])
+        return np.sqrt(np.maximum(sq, 0)), self.labels
+
+    def predict_batch(self, faces):
+        if not len(faces):
+            return []
+        distances, labels = self.distance_matrix(faces)
+        best = distances.argmin(axis=1)
+        return [(int(labels[i]), float(distances[row, i])) for row, i in enumerate(best)]
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            model = np.load(io.BytesIO(f.read()))
+            if str(model["backend"]) != self.name:
+                raise ValueError(f"{path} was not written by the '{self.name}' backend")
+            self.params = tuple(int(v) for v in model["params"])
+            self.mean = model["mean"]
+            self.basis = model["basis"]
+            self.projections = model["projections"]
+            self.residuals = model["residuals"]
+            self.labels = model["labels"]
+            self.components = len(self.basis)
+
+    def write(self, path):
+        # Write through a file object so numpy does not append .npz to the path
+        with open(path, "wb") as f:
+            np.savez(f, backend=self.name, params=np.array(self.params), mean=self.mean,
+                     basis=self.basis, projections=self.projections, residuals=self.residuals,
+                     labels=self.labels)
+
+class QuantizedLBPHRecognizer:
+    """LBPH with the gallery histograms stored as uint8, uint16 or float16
+
+    For the integer types each 256-bin cell histogram is square-root
+    companded and scaled by its own maximum before rounding, which keeps the
+    small counts that dominate LBP histograms distinguishable. Distances are
+    computed after undoing both steps, so they stay on the same chi-square
+    scale (and threshold) as OpenCV's LBPH. Histograms are computed with
+    lbp_histograms(), which matches OpenCV's output, and the gallery is
+    dequantized in chunks so it is never expanded back to float32 in full.
+    """
+    name = "lbph-q"
+    incremental = True
+    DTYPES = {"uint8": np.uint8, "uint16": np.uint16, "float16": np.float16}
+
+    def __init__(self, quantization="uint8", radius=1, neighbors=8, grid_x=8, grid_y=8,
+                 face_size=FACE_SIZE, chunk_size=256):
+        if quantization not in self.DTYPES:
+            raise ValueError(f"Unknown quantization '{quantization}'. Choose one of: {', '.join(self.DTYPES)}")
+        self.quantization = quantization
+        self.params = (radius, neighbors, grid_x, grid_y)
+        self.face_size = tuple(face_size)
+        self.chunk_size = chunk_size
+        self.histograms = None
+        self.scales = None
+        self.labels = None
+
+    @property
+    def cells(self):
+        return self.params[2] * self.params[3]
+
+    def quantize(self, histograms):
+        """Return (quantized histograms, per-cell scales) for float32 histograms"""
+        dtype = self.DTYPES[self.quantization]
+        if dtype == np.float16:
+            return histograms.astype(np.float16), np.ones((len(histograms), self.cells), dtype=np.float32)
+        cells = np.sqrt(histograms.reshape(len(histograms), self.cells, -1))
+        scales = cells.max(axis=2) / np.iinfo(dtype).max
+        scales[scales == 0] = 1
+        quantized = np.rint(cells / scales[:, :, np.newaxis]).astype(dtype)
+        return quantized.reshape(len(histograms), -1), scales.astype(np.float32)
+
+    def dequantize(self, quantized, scales):
+        """Undo quantize() for a block of gallery rows"""
+        if quantized.dtype == np.float16:
+            return quantized.astype(np.float32)
+        cells = quantized.reshape(len(quantized), self.cells, -1).astype(np.float32)
+        cells *= scales[:, :, np.newaxis]
+        return (cells * cells).reshape(len(quantized), -1)
+
+    def _features(self, faces):
+        return lbp_histograms(np.stack([normalize_face(face, self.face_size) for face in faces]), *self.params)
+
+    def train(self, faces, ids):
+        self.histograms = None
+        self.update(faces, ids)
+
+    def train_from_histograms(self, histograms, ids):
+        """Build the gallery from existing float32 LBPH histograms (e.g. from classifier.yml)"""
+        self.histograms, self.scales = self.quantize(np.asarray(histograms, dtype=np.float32))
+        self.labels = np.asarray(ids, dtype=np.int32)
+
+    def update(self, faces, ids):
+        if not len(faces):
+            return
+        quantized, scales = self.quantize(self._features(faces))
+        if self.histograms is None:
+            self.histograms, self.scales = quantized, scales
+            self.labels = np.asarray(ids, dtype=np.int32)
+            return
+        self.histograms = np.vstack([self.histograms, quantized])
+        self.scales = np.vstack([self.scales, scales])
+        self.labels = np.concatenate([self.labels, np.asarray(ids, dtype=np.int32)])
+
+    def predict_batch(self, faces):
+        if not len(faces):
+            return []
+        queries = self._features(faces)
+        best_distance = np.full(len(queries), np.inf)
+        best_index = np.zeros(len(queries), dtype=np.int64)
+        for start in range(0, len(self.histograms), self.chunk_size):
+            gallery = self.dequantize(self.histograms[start:start + self.chunk_size],
+                                      self.scales[start:start + self.chunk_size])
+            distances = chi_square_distances(queries, gallery)
+            chunk_best = distances.argmin(axis=1)
+            chunk_distance = distances[np.arange(len(queries)), chunk_best]
+            improved = chunk_distance < best_distance
+            best_distance[improved] = chunk_distance[improved]
+            best_index[improved] = chunk_best[improved] + start
+        return [(int(self.labels[i]), float(d)) for i, d in zip(best_index, best_distance)]
+
+    def distance_matrix(self, faces):
+        """Return (distances from every face to every gallery entry, gallery labels)"""
+        queries = self._features(faces)
+        distances = np.empty((len(queries), len(self.histograms)), dtype=np.float64)
+        for start in range(0, len(self.histograms), self.chunk_size):
+            gallery = self.dequantize(self.histograms[start:start + self.chunk_size],
+                                      self.scales[start:start + self.chunk_size])
+            distances[:, start:start + len(gallery)] = chi_square_distances(queries, gallery)
+        return distances, self.labels
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            model = np.load(io.BytesIO(f.read()))
+            if str(model["backend"]) != self.name:
+                raise ValueError(f"{path} was not written by the '{self.name}' backend")
+            self.params = tuple(int(v) for v in model["params"])
+            self.quantization = str(model["quantization"])
+            self.histograms = model["histograms"]
+            self.scales = model["scales"]
+            self.labels = model["labels"]
+
+    def write(self, path):
+        # Write through a file object so numpy does not append .npz to the path
+        with open(path, "wb") as f:
+            np.savez(f, backend=self.name, params=np.array(self.params), quantization=self.quantization,
+                     histograms=self.histograms, scales=self.scales, labels=self.labels)
+
+class ShardedRecognizer:
+    """Score a face against several per-group model shards and keep the best match"""
+    def __init__(self, shards):
+        self.shards = shards
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+    def predict_batch(self, faces):
+        best = [(-1, float("inf"))] * len(faces)
+        for clf in self.shards.values():
+            for i, (id, confidence) in enumerate(clf.predict_batch(faces)):
+                if confidence < best[i][1]:
+                    best[i] = (id, confidence)
+        return best
+
+BACKENDS = ["lbph", "lbph-q", "eigen", "fisher", "pca"]
+
+def create_recognizer(config=None, backend=None):
+    """Create the recognizer backend selected by config['recognition']['backend']"""
+    recognition = (config or {}).get("recognition", {})
+    backend = (backend or recognition.get("backend", "lbph")).lower()
+    face_size = tuple(recognition.get("face_size", FACE_SIZE))
+    # LBP operator profile shared by every LBP-based backend (see tune_lbph.py)
+    lbph = recognition.get("lbph", {})
+    lbp_params = (lbph.get("radius", 1), lbph.get("neighbors", 8), lbph.get("grid_x", 8), lbph.get("grid_y", 8))
+    workers = recognition.get("predict_workers")
+
+    if backend == "pca":
+        return PCARecognizer(recognition.get("pca_components", 64), *lbp_params, face_size=face_size)
+    if backend == "lbph-q":
+        return QuantizedLBPHRecognizer(recognition.get("quantization", "uint8"), *lbp_params, face_size=face_size)
+
+    if not hasattr(cv2, 'face'):
+        raise RuntimeError("OpenCV face recognition module not available. "
+                           "Please install opencv-contrib-python: pip install opencv-contrib-python")
+    if backend == "lbph":
+        return OpenCVRecognizer("lbph", cv2.face.LBPHFaceRecognizer_create(*lbp_params), face_size, workers)
+    if backend == "eigen":
+        return OpenCVRecognizer("eigen", cv2.face.EigenFaceRecognizer_create(), face_size, workers)
+    if backend == "fisher":
+        return OpenCVRecognizer("fisher", cv2.face.FisherFaceRecognizer_create(), face_size, workers)
+    raise ValueError(f"Unknown recognizer backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+
+def recognition_threshold(config=None, backend=None):
+    """Distance below which a match is accepted for the selected backend"""
+    recognition = (config or {}).get("recognition", {})
+    backend = (backend or recognition.get("backend", "lbph")).lower()
+    return recognition.get("thresholds", {}).get(backend, recognition.get("confidence_threshold", 80))
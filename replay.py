@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import datetime
+import numpy as np
+from attendance_system import AttendanceSystem
+from evaluate import build_id
+from frame_sources import open_source, HeadlessSink
+
+class ReplayRecorder:
+    """Time every frame from read to processed and log what was decided on it"""
+    def __init__(self, system, source):
+        self.system = system
+        self.source = source
+        self.read_source = source.read
+        # Intercept reads so latency is measured from the moment a frame arrives
+        source.read = self.read
+        self.read_at = None
+        self.detections = 0
+        self.latencies_ms = []
+        self.detect_latencies_ms = []
+        self.decisions = []
+        self.first_marked = {}
+
+    def read(self):
+        ret, frame = self.read_source()
+        self.read_at = time.perf_counter()
+        return ret, frame
+
+    def on_frame(self, frame):
+        latency = (time.perf_counter() - self.read_at) * 1000
+        gate = self.system.motion_gate
+        detected = gate is None or gate.detections > self.detections
+        self.detections = gate.detections if gate is not None else self.detections + 1
+        self.latencies_ms.append(latency)
+        if detected:
+            self.detect_latencies_ms.append(latency)
+
+        index = len(self.decisions)
+        faces = []
+        if detected:
+            for box, result in self.system.last_results:
+                face = {"box": [int(v) for v in box], "id": None, "distance": None, "accepted": False}
+                if result is not None:
+                    student_id, distance = result
+                    face.update(id=int(student_id), distance=round(float(distance), 3),
+                                accepted=bool(distance < self.system.threshold))
+                faces.append(face)
+        for student_id in self.system.marked_attendance:
+            self.first_marked.setdefault(int(student_id), index)
+        self.decisions.append({"frame": index, "time": round(float(self.source.timestamp or 0.0), 4),
+                               "detected": detected, "faces": faces,
+                               "truth": None if self.source.truth is None else int(self.source.truth)})
+
+def percentiles(values):
+    """Mean and p50/p95/p99/max of a list of milliseconds"""
+    if not values:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    values = np.asarray(values)
+    return {"mean": round(float(values.mean()), 3),
+            "p50": round(float(np.percentile(values, 50)), 3),
+            "p95": round(float(np.percentile(values, 95)), 3),
+            "p99": round(float(np.percentile(values, 99)), 3),
+            "max": round(float(values.max()), 3)}
+
+def decision_digest(decisions):
+    """Fingerprint of every recognition decision, equal across replays of the same input and model"""
+    key = [(d["frame"], d["detected"], [(f["box"], f["id"], f["accepted"]) for f in d["faces"]]) for d in decisions]
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()
+
+def score_against_truth(decisions):
+    """Per-frame accuracy on sources that know who is in front of the camera"""
+    scored = [d for d in decisions if d["detected"] and "truth" in d]
+    if not any(d["truth"] is not None for d in scored):
+        return None
+    correct = false_accepts = misses = 0
+    for d in scored:
+        accepted = {f["id"] for f in d["faces"] if f["accepted"]}
+        false_accepts += len(accepted - {d["truth"]})
+        if d["truth"] is None:
+            continue
+        if d["truth"] in accepted:
+            correct += 1
+        else:
+            misses += 1
+    present = correct + misses
+    return {"frames_with_student": present, "correct": correct, "misses": misses,
+            "false_accepts": false_accepts, "accuracy": round(correct / max(present, 1), 5)}
+
+def compare(report, expected, min_fps=None):
+    """Return a list of regressions of a replay report against an expected one"""
+    problems = []
+    if expected is not None:
+        if report["marked"] != expected.get("marked"):
+            problems.append(f"marked students {sorted(report['marked'])} != expected {sorted(expected.get('marked') or {})}")
+        if report["decision_digest"] != expected.get("decision_digest"):
+            old = {d["frame"]: d for d in expected.get("decisions", [])}
+            changed = [d["frame"] for d in report["decisions"]
+                       if old.get(d["frame"], {}).get("faces") != d["faces"]
+                       or old.get(d["frame"], {}).get("detected") != d["detected"]]
+            first = f", first at frame {changed[0]}" if changed else ""
+            problems.append(f"recognition decisions changed on {len(changed)} frames{first}")
+    if min_fps is not None and report["fps"] < min_fps:
+        problems.append(f"sustained {report['fps']:.1f} FPS is below the required {min_fps:.1f}")
+    return problems
+
+def replay(system, source, record_path=None):
+    """Run frames from a source through detect -> recognize -> mark without a display, returning a report"""
+    recorder = ReplayRecorder(system, source)
+    sink = HeadlessSink(record_path)
+    start = time.perf_counter()
+    system.run(source, sink, watch=False, on_frame=recorder.on_frame)
+    elapsed = time.perf_counter() - start
+    frames = len(recorder.decisions)
+    return {
+        "build": build_id(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "backend": system.config["recognition"]["backend"],
+        "frames": frames,
+        "detection_frames": len(recorder.detect_latencies_ms),
+        "seconds": round(elapsed, 3),
+        "fps": round(frames / max(elapsed, 1e-9), 2),
+        "latency_ms": percentiles(recorder.latencies_ms),
+        "detect_latency_ms": percentiles(recorder.detect_latencies_ms),
+        # JSON object keys are strings, so IDs are kept as strings here
+        "marked": {str(k): v for k, v in sorted(recorder.first_marked.items())},
+        "truth": score_against_truth(recorder.decisions),
+        "eye_check": system.eye_verifier.stats() if system.eye_verifier is not None else None,
+        "decision_digest": decision_digest(recorder.decisions),
+        "decisions": recorder.decisions,
+    }
+
+def print_report(report):
+    """Print the headline numbers of a replay"""
+    latency, detect = report["latency_ms"], report["detect_latency_ms"]
+    print(f"\n📊 Replay ({report['backend']}, {report['frames']} frames, {report['detection_frames']} detected):")
+    print(f"- Sustained: {report['fps']:.1f} FPS over {report['seconds']:.2f}s")
+    print(f"- Frame latency: p50 {latency['p50']:.2f} ms, p95 {latency['p95']:.2f} ms, "
+          f"p99 {latency['p99']:.2f} ms, max {latency['max']:.2f} ms")
+    print(f"- Detection frame latency: p50 {detect['p50']:.2f} ms, p99 {detect['p99']:.2f} ms")
+    marked = ", ".join(f"{k} (frame {v})" for k, v in report["marked"].items()) or "none"
+    print(f"- Marked present: {marked}")
+    if report["truth"]:
+        truth = report["truth"]
+        print(f"- Against ground truth: {truth['accuracy']:.1%} of {truth['frames_with_student']} frames, "
+              f"{truth['misses']} misses, {truth['false_accepts']} false accepts")
+    if report.get("eye_check"):
+        eyes = report["eye_check"]
+        print(f"- Eye check: {eyes['rejected']}/{eyes['checked']} faces rejected (predict calls avoided), "
+              f"{eyes['ms_per_face']:.2f} ms per face")
+    print(f"- Decision digest: {report['decision_digest']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded or synthetic frames through the attendance pipeline")
+    parser.add_argument("source", nargs="?", default="synthetic",
+                        help="synthetic[:DATA], a video file, an image folder/glob, or camera[:N]")
+    parser.add_argument("--frames", type=int, default=300, help="Frames to generate for a synthetic source")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for a synthetic source")
+    parser.add_argument("--group", action="append", default=[], help="Class section(s) to load")
+    parser.add_argument("--record", help="Write the annotated frames to this video file")
+    parser.add_argument("--json", dest="json_path", default="replay.json", help="Report file to write")
+    parser.add_argument("--expect", help="Earlier report whose marked students and decisions must match")
+    parser.add_argument("--min-fps", type=float, help="Fail when sustained FPS drops below this")
+    parser.add_argument("--attendance-dir", help="Where to write attendance (default: a temporary folder)")
+    parser.add_argument("--eye-check", action="store_true", help="Verify faces with the eye cascade even if config.json does not")
+    args = parser.parse_args()
+
+    source = open_source(args.source, frames=args.frames, seed=args.seed)
+    if not source.is_opened():
+        print(f"❌ Error: Could not open '{args.source}'")
+        sys.exit(1)
+    groups = [g.strip() for value in args.group for g in value.split(",") if g.strip()]
+    # Replays never touch the real attendance files unless asked to
+    attendance_dir = args.attendance_dir or tempfile.mkdtemp(prefix="replay_attendance_")
+    try:
+        # Replayed sightings are not real arrivals, so nothing is published
+        system = AttendanceSystem(groups, attendance_dir=attendance_dir, publish_events=False)
+        if args.eye_check and system.eye_verifier is None:
+            system.enable_eye_check()
+        report = replay(system, source, args.record)
+    finally:
+        if not args.attendance_dir:
+            shutil.rmtree(attendance_dir, ignore_errors=True)
+
+    print_report(report)
+    with open(args.json_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Report written to {args.json_path}")
+
+    expected = None
+    if args.expect:
+        with open(args.expect) as f:
+            expected = json.load(f)
+    problems = compare(report, expected, args.min_fps)
+    for problem in problems:
+        print(f"❌ Regression: {problem}")
+    if problems:
+        sys.exit(1)
+    if expected is not None or args.min_fps is not None:
+        print("✅ Replay matches expectations")
@@ -0,0 +1,284 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import datetime
+try:
+    import fcntl
+except ImportError:
+    # Windows: byte-range locks from msvcrt are also released when the process dies
+    fcntl = None
+    import msvcrt
+from classifier import train_classifier, train_classifier_chunked
+from config import load_config
+from dataset_store import is_packed_store
+from model_edit import model_files, reenroll_many
+from recognizers import create_recognizer
+from structured_log import get_logger
+
+log = get_logger(__name__)
+
+# Enrollment code appends requests here; a run claims the whole file at once,
+# so requests made while it trains wait for the next run
+REQUESTS_FILE = "retrain_requests.jsonl"
+STATUS_FILE = "retrain_status.json"
+LOCK_FILE = "retrain.lock"
+# Touched every second by whatever process hosts the scheduler
+HEARTBEAT_FILE = "retrain_scheduler.alive"
+# Exit code of --once when another run holds the lock (EX_TEMPFAIL), so hosts
+# neither report a finished run nor start another one straight away
+EXIT_BUSY = 75
+# Returned by run_pending when another run holds the lock
+BUSY = "busy"
+
+def request_retrain(student_ids=None, reason="enrollment", path=REQUESTS_FILE):
+    """Queue a model update for some students, or a full retrain when student_ids is None"""
+    entry = {"time": time.time(), "ids": sorted(int(i) for i in student_ids) if student_ids is not None else None,
+             "reason": reason}
+    # One short append per request, so concurrent writers never interleave lines
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+def read_requests(path=REQUESTS_FILE):
+    """Return the queued requests in a file, skipping unreadable lines"""
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+def summarize_requests(entries):
+    """Coalesce requests into {ids, full, requests, first, last}, or None when there are none"""
+    if not entries:
+        return None
+    return {
+        "ids": sorted({i for entry in entries if entry.get("ids") for i in entry["ids"]}),
+        "full": any(entry.get("ids") is None for entry in entries),
+        "requests": len(entries),
+        "first": min(entry["time"] for entry in entries),
+        "last": max(entry["time"] for entry in entries),
+    }
+
+def pending_requests():
+    """Summary of the requests waiting for the next run"""
+    return summarize_requests(read_requests())
+
+def due_at(pending, training=None):
+    """When pending requests should run: after a quiet period (capped by max delay) or at the scheduled time"""
+    if pending is None:
+        return None
+    training = training or load_config()["training"]
+    schedule = training.get("schedule")
+    if schedule:
+        hour, minute = (int(part) for part in schedule.split(":"))
+        first = datetime.datetime.fromtimestamp(pending["first"])
+        at = first.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if at <= first:
+            at += datetime.timedelta(days=1)
+        return at.timestamp()
+    # Every new request restarts the quiet period, but a steady stream of
+    # enrollments cannot postpone the update past max_delay_seconds
+    return min(pending["last"] + training.get("quiet_seconds", 60),
+               pending["first"] + training.get("max_delay_seconds", 600))
+
+def describe_pending(pending, due, now=None):
+    """One-line summary of pending requests for status bars"""
+    if pending is None:
+        return ""
+    what = "Full retrain" if pending["full"] else f"Model update for {len(pending['ids'])} students"
+    wait = max(0, int(due - (now or time.time())))
+    if wait > 3600:
+        return f"{what} scheduled at {datetime.datetime.fromtimestamp(due).strftime('%H:%M')}"
+    return f"{what} pending, runs in {wait}s"
+
+def touch_heartbeat():
+    """Record that a scheduler host is running"""
+    with open(HEARTBEAT_FILE, "w") as f:
+        f.write(str(time.time()))
+
+def scheduler_alive(max_age=10):
+    """True when a scheduler host touched the heartbeat recently"""
+    return os.path.exists(HEARTBEAT_FILE) and time.time() - os.path.getmtime(HEARTBEAT_FILE) < max_age
+
+def read_status(path=STATUS_FILE):
+    """Return the state of the current or last run"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"state": "idle"}
+
+def write_status(status, path=STATUS_FILE):
+    """Atomically replace the run status file"""
+    with open(path + ".tmp", "w") as f:
+        json.dump(status, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def acquire_lock():
+    """Take the single-run lock, returning the open lock file or None when another run holds it
+
+    The lock belongs to the open file, so the OS releases it when the run
+    exits for any reason, including being terminated from a GUI.
+    """
+    lock = open(LOCK_FILE, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock.close()
+        return None
+    return lock
+
+def release_lock(lock):
+    """Drop the single-run lock taken by acquire_lock"""
+    # Closing the file releases the lock; the file itself stays for the next run
+    lock.close()
+
+def update_running():
+    """True when another process is applying model updates right now"""
+    lock = acquire_lock()
+    if lock is None:
+        return True
+    release_lock(lock)
+    return False
+
+def claim_requests():
+    """Move the queued requests out of the way of new ones and return them"""
+    claimed = REQUESTS_FILE + ".claimed"
+    incoming = REQUESTS_FILE + ".incoming"
+    if os.path.exists(REQUESTS_FILE):
+        # Rename first so a request appended meanwhile lands in a fresh file;
+        # a claimed file already there belongs to a run that died and is redone
+        os.replace(REQUESTS_FILE, incoming)
+        with open(incoming, "r") as src, open(claimed, "a") as dst:
+            dst.write(src.read())
+        os.remove(incoming)
+    return read_requests(claimed)
+
+def model_mtimes(classifier_path="classifier.yml"):
+    """Modification times of every model file, to tell whether a training wrote one"""
+    return {path: os.path.getmtime(path) for path in model_files(classifier_path)}
+
+def full_retrain(data_dir="data", classifier_path="classifier.yml"):
+    """Retrain every model file from scratch, returning True when one was written"""
+    before = model_mtimes(classifier_path)
+    shards = [path for path in before if path != classifier_path]
+    config = load_config()
+    # Chunked training never sees a student's whole gallery at once, so it
+    # cannot apply recognition.gallery_k the way train_classifier does
+    pruned = config["recognition"].get("gallery_k", 0) > 0
+    if is_packed_store(data_dir) or not create_recognizer(config).incremental or pruned:
+        train_classifier(data_dir)
+    else:
+        # Chunked training reports progress and ETA and can resume after a crash
+        train_classifier_chunked(data_dir, 200, output_path=classifier_path)
+    if shards:
+        train_classifier(data_dir, sharded=True)
+    return model_mtimes(classifier_path) != before
+
+def run_pending(data_dir="data", classifier_path="classifier.yml"):
+    """Apply every queued request in one run
+
+    Requests for individual students are applied in place when the backend
+    allows it (one rewrite per model file), otherwise as a single full
+    retrain. Every model file is replaced atomically, so the attendance
+    system keeps serving the current model until the new one is ready.
+    Returns True when the model was updated, False when the update failed,
+    None when there was nothing to do and BUSY when another run holds the lock.
+    """
+    lock = acquire_lock()
+    if lock is None:
+        log.info("ℹ️ Another model update is already running; queued requests will wait for the next run.")
+        return BUSY
+    try:
+        entries = claim_requests()
+        pending = summarize_requests(entries)
+        if pending is None:
+            log.info("ℹ️ No queued model updates.")
+            return None
+        start = time.time()
+        scope = "all students" if pending["full"] else f"{len(pending['ids'])} students"
+        status = {"state": "running", "ids": pending["ids"], "full": pending["full"],
+                  "requests": pending["requests"], "started": start}
+        write_status(status)
+        log.info("🧠 Applying %d queued requests for %s...", pending["requests"], scope)
+        try:
+            mode = "incremental"
+            if pending["full"] or not reenroll_many(pending["ids"], data_dir, classifier_path):
+                mode = "full"
+                if not full_retrain(data_dir, classifier_path):
+                    raise RuntimeError("training did not write a model")
+        except SystemExit:
+            # Terminated (see __main__); the claimed requests are redone by the next run
+            write_status({**status, "state": "cancelled", "finished": time.time()})
+            raise
+        except Exception as e:
+            # Leave the claimed requests in place; the next run picks them up again
+            write_status({**status, "state": "failed", "finished": time.time(), "error": str(e)})
+            log.error("❌ Error: Model update failed: %s", e)
+            return False
+        os.remove(REQUESTS_FILE + ".claimed")
+        elapsed = time.time() - start
+        write_status({**status, "state": "done", "mode": mode, "finished": time.time(), "seconds": round(elapsed, 1)})
+        # Printed rather than logged: the launcher and StudentManager look for this line on stdout
+        print(f"✅ Training complete! {mode.capitalize()} update for {scope} from {pending['requests']} requests "
+              f"in {elapsed:.1f}s.", flush=True)
+        return True
+    finally:
+        release_lock(lock)
+
+def serve(data_dir="data", interval=1.0):
+    """Run queued requests whenever they come due, until interrupted"""
+    print("🕒 Retrain scheduler running. Press Ctrl+C to stop.")
+    last_note = None
+    while True:
+        touch_heartbeat()
+        pending = pending_requests()
+        due = due_at(pending)
+        if pending is not None and time.time() >= due:
+            run_pending(data_dir)
+            last_note = None
+        elif pending is not None and pending["requests"] != last_note:
+            log.info("🕒 %s (%d requests)", describe_pending(pending, due), pending["requests"])
+            last_note = pending["requests"]
+        time.sleep(interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coalesce enrollment retrain requests into single debounced runs")
+    parser.add_argument("--data", default="data", help="Data directory or packed store")
+    parser.add_argument("--once", action="store_true", help="Apply every queued request now and exit")
+    parser.add_argument("--request", nargs="*", type=int, metavar="ID",
+                        help="Queue a model update for these students (no IDs: a full retrain)")
+    parser.add_argument("--status", action="store_true", help="Show queued requests and the last run")
+    args = parser.parse_args()
+
+    if args.request is not None:
+        request_retrain(args.request or None, reason="command line")
+        print(f"✅ Queued {'an update for IDs ' + str(args.request) if args.request else 'a full retrain'}")
+    if args.status:
+        pending = pending_requests()
+        print(describe_pending(pending, due_at(pending)) or "No queued model updates.")
+        print(f"Scheduler running: {'yes' if scheduler_alive() else 'no'}")
+        print(f"Last run: {json.dumps(read_status())}")
+    if args.once:
+        # A GUI cancels a run with SIGTERM; unwind so the status is recorded
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+        result = run_pending(args.data)
+        if result is BUSY:
+            sys.exit(EXIT_BUSY)
+        sys.exit(1 if result is False else 0)
+    if args.request is None and not args.status:
+        try:
+            serve(args.data)
+        except KeyboardInterrupt:
+            print("\n✅ Scheduler stopped.")
@@ -2,6 +2,10 @@ import cv2
 import os
 import glob
 import sys
+from config import load_config
+from frame_sources import open_source, WindowSink, HeadlessSink
+from recognizers import create_recognizer, recognition_threshold, FaceNormalizer, GrayFrameBuffer
+from model_edit import remove_from_models, reenroll
 
 def load_names(file_path="names.txt"):
     """Load student names from file"""
@@ -59,9 +63,11 @@ def generate_dataset(img, id, img_id):
     cv2.imwrite(filename, img)
     print(f"✅ Saved image: {filename}")
 
-def draw_boundary(img, classifier, scaleFactor, minNeighbors, color, text, clf, name_dict):
+def draw_boundary(img, classifier, scaleFactor, minNeighbors, color, text, clf, name_dict, threshold=70,
+                  gray_frame=None, normalizer=None):
     """Draw boundary around detected faces and identify them"""
-    gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    # Reused buffers (when given) avoid allocating a gray frame and a crop per face
+    gray_img = gray_frame(img) if gray_frame is not None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     features = classifier.detectMultiScale(gray_img, scaleFactor, minNeighbors)
     coords = []
 
@@ -69,10 +75,11 @@ def draw_boundary(img, classifier, scaleFactor, minNeighbors, color, text, clf,
         cv2.rectangle(img, (x, y), (x + w, y + h), color, 2)
         if clf is not None:
             try:
-                id, confidence = clf.predict(gray_img[y:y + h, x:x + w])
-                # LBPH confidence works opposite - lower means better match
-                # Typical threshold is around 70-80
-                name = name_dict.get(id, "Unknown") if confidence < 70 else "Unknown"
+                face = gray_img[y:y + h, x:x + w]
+                id, confidence = clf.predict(normalizer(face) if normalizer is not None else face)
+                # Confidence is a distance - lower means better match.
+                # The threshold comes from config.json for the selected backend
+                name = name_dict.get(id, "Unknown") if confidence < threshold else "Unknown"
                 cv2.putText(img, f"{name} ({confidence:.1f})", (x, y - 4), 
                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 1, cv2.LINE_AA)
             except Exception as e:
@@ -81,10 +88,11 @@ def draw_boundary(img, classifier, scaleFactor, minNeighbors, color, text, clf,
         coords = [x, y, w, h]
     return coords
 
-def recognize(img, clf, faceCascade, name_dict):
+def recognize(img, clf, faceCascade, name_dict, threshold=70, gray_frame=None, normalizer=None):
     """Recognize faces in image"""
     color = {"blue": (255, 0, 0), "red": (0, 0, 255), "green": (0, 255, 0), "white": (255, 255, 255)}
-    coords = draw_boundary(img, faceCascade, 1.1, 5, color["white"], "Face", clf, name_dict)
+    coords = draw_boundary(img, faceCascade, 1.1, 5, color["white"], "Face", clf, name_dict, threshold,
+                           gray_frame, normalizer)
     return img
 
 def detect(img, faceCascade, img_id, user_id, max_images=20):
@@ -108,9 +116,19 @@ def detect(img, faceCascade, img_id, user_id, max_images=20):
     return img, len(coords) > 0
 
 if __name__ == "__main__":
+    # Frame source and display flags may appear anywhere: --source SPEC, --headless
+    source_spec = "camera"
+    headless = "--headless" in sys.argv
+    if headless:
+        sys.argv.remove("--headless")
+    if "--source" in sys.argv:
+        i = sys.argv.index("--source")
+        source_spec = sys.argv[i + 1] if i + 1 < len(sys.argv) else "camera"
+        del sys.argv[i:i + 2]
+    
     # === MODE: from command line argument ===
     if len(sys.argv) < 2:
-        print("Usage: python script.py [recognize|collect|delete] [user_id] [user_name]")
+        print("Usage: python script.py [recognize|collect|delete] [user_id] [user_name] [--source SPEC] [--headless]")
         sys.exit(1)
         
     MODE = sys.argv[1].lower()  # Normalize mode input
@@ -143,6 +161,9 @@ if __name__ == "__main__":
             try:
                 user_id = int(sys.argv[2])
                 delete_user_data(user_id)
+                # Drop the user's histograms from the trained model(s) too, so
+                # they stop being recognized without a full retrain
+                remove_from_models(user_id)
                 print(f"✅ Deleted data for user ID: {user_id}")
                 sys.exit(0)
             except ValueError:
@@ -173,17 +194,20 @@ if __name__ == "__main__":
 
     # Load classifier if it exists
     clf = None
+    config = load_config()
+    threshold = recognition_threshold(config)
+    # The standalone recognizer has always been stricter than the attendance
+    # system on LBPH distances; other backends use their configured threshold
+    if config["recognition"]["backend"].lower() == "lbph":
+        threshold = config["recognition"].get("script_threshold", 70)
+    gray_frame = GrayFrameBuffer()
+    normalizer = FaceNormalizer(config["recognition"]["face_size"])
     if MODE == "recognize":
         if os.path.exists("classifier.yml"):
             try:
-                # Check if opencv-contrib-python is installed
-                if hasattr(cv2, 'face') and hasattr(cv2.face, 'LBPHFaceRecognizer_create'):
-                    clf = cv2.face.LBPHFaceRecognizer_create()
-                    clf.read("classifier.yml")
-                else:
-                    print("❌ Error: OpenCV face recognition module not available")
-                    print("Please install opencv-contrib-python: pip install opencv-contrib-python")
-                    sys.exit(1)
+                # Backend (LBPH by default) is selected in config.json
+                clf = create_recognizer(config)
+                clf.read("classifier.yml")
             except Exception as e:
                 print(f"❌ Error loading classifier: {e}")
                 sys.exit(1)
@@ -191,16 +215,17 @@ if __name__ == "__main__":
             print("⚠️ Warning: classifier.yml not found. Recognition will not work properly.")
             print("Run the classifier training script first to enable recognition.")
 
-    # Start video capture
-    video_capture = cv2.VideoCapture(0)
+    # Start video capture (a webcam unless --source names a recording)
+    video_capture = open_source(source_spec)
+    sink = HeadlessSink() if headless else WindowSink("Face Recognition")
     img_id = 0
     face_detected = False
 
-    if not video_capture.isOpened():
-        print("❌ Error: Could not open camera.")
+    if not video_capture.is_opened():
+        print(f"❌ Error: Could not open {source_spec}.")
         sys.exit(1)
 
-    print(f"🎥 Camera opened successfully. Mode: {MODE}")
+    print(f"🎥 {'Camera' if video_capture.live else source_spec} opened successfully. Mode: {MODE}")
     if MODE == "collect":
         print(f"👤 Collecting data for user ID: {user_id}, Name: {name_dict.get(user_id, 'Unknown')}")
     
@@ -209,7 +234,10 @@ if __name__ == "__main__":
         while True:
             ret, img = video_capture.read()
             if not ret:
-                print("❌ Error: Could not read frame. Camera disconnected?")
+                if video_capture.live and video_capture.is_opened():
+                    continue
+                if video_capture.live:
+                    print("❌ Error: Could not read frame. Camera disconnected?")
                 break
                 
             # Handle different modes
@@ -220,7 +248,7 @@ if __name__ == "__main__":
                     
             elif MODE == "recognize":
                 if clf is not None:
-                    img = recognize(img, clf, faceCascade, name_dict)
+                    img = recognize(img, clf, faceCascade, name_dict, threshold, gray_frame, normalizer)
                 else:
                     cv2.putText(img, "No classifier found", (10, 30), 
                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
@@ -238,10 +266,8 @@ if __name__ == "__main__":
                     cv2.putText(img, "No face detected!", (10, 60), 
                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
-            cv2.imshow("Face Recognition", img)
-
             # Exit on 'q' press or when finished collecting
-            key = cv2.waitKey(10) & 0xFF
+            key = sink.show(img)
             if key == ord('q') or (MODE == "collect" and img_id >= MAX_IMAGES):
                 break
     except KeyboardInterrupt:
@@ -251,8 +277,17 @@ if __name__ == "__main__":
     finally:
         # Clean up resources
         video_capture.release()
-        cv2.destroyAllWindows()
-        
-        if MODE == "collect":
-            print(f"✅ Collection complete! {img_id} images saved.")
-            print("ℹ️ Please run the classifier training to update the model.")
\ No newline at end of file
+        sink.close()
+    
+    if MODE == "collect":
+        print(f"✅ Collection complete! {img_id} images saved.")
+        # Swap the user's new images into the existing model in place of a full
+        # retrain; reenroll() returns False when there is no model to edit yet
+        if img_id > 0:
+            try:
+                updated = reenroll(user_id)
+            except Exception as e:
+                print(f"❌ Error updating the model for user ID {user_id}: {e}")
+                updated = False
+            if not updated:
+                print("ℹ️ Please run the classifier training to update the model.")
\ No newline at end of file
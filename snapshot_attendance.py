@@ -0,0 +1,166 @@
+import os
+import time
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from attendance_system import AttendanceSystem, image_timestamp
+from structured_log import get_logger
+
+log = get_logger(__name__)
+
+OUTPUT_DIR = "snapshots"
+
+# One cascade per detection thread; CascadeClassifier is not safe to share
+cascades = threading.local()
+
+def thread_cascade():
+    """Return this thread's face cascade"""
+    if getattr(cascades, "face", None) is None:
+        cascades.face = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    return cascades.face
+
+def plan_tiles(width, height, tile, overlap):
+    """Return (x, y, w, h) tiles covering the image, overlapping by `overlap` pixels"""
+    step = max(tile - overlap, 1)
+    xs = list(range(0, max(width - overlap, 1), step))
+    ys = list(range(0, max(height - overlap, 1), step))
+    return [(x, y, min(tile, width - x), min(tile, height - y)) for y in ys for x in xs]
+
+def detect_region(gray, region, scale, min_size, max_size, scaleFactor, minNeighbors):
+    """Detect faces in one tile (or a downscaled copy), returning boxes in full-image coordinates"""
+    x0, y0, w, h = region
+    view = gray[y0:y0 + h, x0:x0 + w]
+    if scale != 1.0:
+        view = cv2.resize(view, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    min_px = max(1, int(min_size * scale))
+    max_px = max(min_px + 1, int(max_size * scale)) if max_size else 0
+    faces = thread_cascade().detectMultiScale(view, scaleFactor, minNeighbors,
+                                              minSize=(min_px, min_px), maxSize=(max_px, max_px))
+    return [(int(x / scale) + x0, int(y / scale) + y0, int(fw / scale), int(fh / scale)) for (x, y, fw, fh) in faces]
+
+def suppress_duplicates(boxes, overlap_threshold=0.5):
+    """Merge detections of the same face from overlapping tiles and scales, keeping the larger box"""
+    kept = []
+    for box in sorted(boxes, key=lambda b: b[2] * b[3], reverse=True):
+        x, y, w, h = box
+        duplicate = False
+        for kx, ky, kw, kh in kept:
+            ix = max(0, min(x + w, kx + kw) - max(x, kx))
+            iy = max(0, min(y + h, ky + kh) - max(y, ky))
+            # Relative to the smaller box, so a face cut off at a tile edge
+            # is dropped in favour of the whole one
+            if ix * iy > overlap_threshold * min(w * h, kw * kh):
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(box)
+    return kept
+
+def detect_faces(gray, pool, tile=1024, min_face=40, scaleFactor=1.1, minNeighbors=5):
+    """Tiled multi-scale detection: small faces on full-resolution tiles, large faces on a downscaled image"""
+    height, width = gray.shape[:2]
+    # Tiles overlap by the largest face they look for, so every small face lies
+    # wholly inside at least one tile; anything larger is found downscaled
+    overlap = tile // 4
+    jobs = [(region, 1.0, min_face, overlap) for region in plan_tiles(width, height, tile, overlap)]
+    scale = min(1.0, tile / float(max(width, height)))
+    jobs.append(((0, 0, width, height), scale, overlap, 0))
+    futures = [pool.submit(detect_region, gray, region, s, lo, hi, scaleFactor, minNeighbors)
+               for region, s, lo, hi in jobs]
+    boxes = [box for future in futures for box in future.result()]
+    return suppress_duplicates(boxes), len(jobs)
+
+def process_snapshot(system, path, pool, tile, min_face, output_dir):
+    """Detect and recognize every face in one photo and save it annotated, returning (sightings, stats)"""
+    start = time.perf_counter()
+    img = cv2.imread(path)
+    if img is None:
+        raise ValueError(f"Could not read image '{path}'")
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    loaded = time.perf_counter()
+
+    boxes, tiles = detect_faces(gray, pool, tile, min_face)
+    found = len(boxes)
+    if system.eye_verifier is not None:
+        boxes = [box for box in boxes if system.eye_verifier.verify(gray, box)]
+    detected = time.perf_counter()
+
+    # Every face of the photo goes through one batch predict
+    results = []
+    if boxes:
+        crops = [gray[y:y + h, x:x + w] for (x, y, w, h) in boxes]
+        results = system.clf.predict_batch(system.face_normalizer.batch(crops))
+    recognized = time.perf_counter()
+
+    taken_at = datetime.datetime.fromtimestamp(image_timestamp(path))
+    sightings = {}
+    annotations = []
+    for box, (student_id, confidence) in zip(boxes, results):
+        if confidence < system.threshold:
+            sightings.setdefault(student_id, taken_at)
+            annotations.append([box, system.name_dict.get(student_id, "Unknown"), (0, 255, 0)])
+        else:
+            annotations.append([box, f"Unknown ({confidence:.1f})", (0, 0, 255)])
+
+    system.draw_annotations(img, annotations)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(path))[0]}_annotated.jpg")
+    cv2.imwrite(output_path, img)
+
+    stats = {
+        "megapixels": gray.size / 1e6,
+        "tiles": tiles,
+        "faces": len(boxes),
+        "eye_rejected": found - len(boxes),
+        "recognized": len(sightings),
+        "load_s": loaded - start,
+        "detect_s": detected - loaded,
+        "recognize_s": recognized - detected,
+        "total_s": time.perf_counter() - start,
+        "output": output_path,
+    }
+    return sightings, stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Take attendance from high-resolution classroom photos")
+    parser.add_argument("images", nargs="+", help="Group photo(s)")
+    parser.add_argument("--group", action="append", default=[], help="Class section(s) to load")
+    parser.add_argument("--tile", type=int, default=1024, help="Detection tile size in pixels")
+    parser.add_argument("--min-face", type=int, default=40, help="Smallest face to detect, in pixels")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Detection threads")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Folder for annotated images")
+    args = parser.parse_args()
+
+    groups = [g.strip() for value in args.group for g in value.split(",") if g.strip()]
+    system = AttendanceSystem(groups)
+    cv2.setNumThreads(1)
+
+    # Earliest sighting of each student on each day, so photos from several
+    # days are each recorded in their own day's file
+    sightings = {}
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for path in args.images:
+            try:
+                photo_sightings, stats = process_snapshot(system, path, pool, args.tile, args.min_face, args.output)
+            except Exception as e:
+                log.error("❌ Error processing %s: %s", path, e)
+                continue
+            for student_id, taken_at in photo_sightings.items():
+                key = (student_id, taken_at.date())
+                if key not in sightings or taken_at < sightings[key]:
+                    sightings[key] = taken_at
+            log.info("📸 %s: %.1f MP, %d tiles, %d faces, %d recognized in %.2fs (detect %.2fs, recognize %.2fs)",
+                     path, stats["megapixels"], stats["tiles"], stats["faces"], stats["recognized"],
+                     stats["total_s"], stats["detect_s"], stats["recognize_s"], extra={"stats": stats})
+            log.info("✅ Annotated image saved to %s", stats["output"])
+
+    # All matches from all photos are written together, once per day file
+    recorded = system.record_sightings([(student_id, taken_at) for (student_id, _), taken_at in sightings.items()])
+    system.close_events()
+    print(f"\n📊 Snapshot Attendance Summary:")
+    print(f"- Students recognized: {len({student_id for student_id, _ in sightings})}")
+    print(f"- New attendance records: {recorded}")
+    if system.eye_verifier is not None and system.eye_verifier.checked:
+        print(f"- {system.eye_verifier.summary()}")
@@ -0,0 +1,105 @@
+import sys
+import json
+import time
+import atexit
+import logging
+import datetime
+import threading
+from config import load_config
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "suppressed"}
+
+class RateLimitFilter(logging.Filter):
+    """Let through at most `burst` records per message every `interval` seconds, counting the rest
+
+    Records are keyed by logger, level and unformatted message, so a failure
+    that repeats with different details is still one message, and a
+    suppressed record is never formatted. The next record let through
+    carries the count suppressed before it; flush() reports the rest.
+    """
+    def __init__(self, interval=10.0, burst=3):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        # key -> [window start, records let through, records suppressed, last suppressed args]
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        # Summaries from flush() already carry their count
+        if self.interval <= 0 or hasattr(record, "suppressed"):
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                record.suppressed = window[2] if window is not None else 0
+                self.windows[key] = [now, 1, 0, None]
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                record.suppressed = 0
+                return True
+            window[2] += 1
+            window[3] = record.args
+            return False
+
+    def flush(self):
+        """Log the last suppressed record of every message, noting how many others were suppressed"""
+        with self.lock:
+            leftovers = [(key, window) for key, window in self.windows.items() if window[2]]
+            self.windows.clear()
+        for (name, level, msg), window in leftovers:
+            logging.getLogger(name).log(level, msg, *(window[3] or ()), extra={"suppressed": window[2] - 1})
+
+class TextFormatter(logging.Formatter):
+    """The message as the scripts have always printed it, plus a note about suppressed repeats"""
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" (+{suppressed} similar messages suppressed)"
+        return text
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any fields passed through `extra`"""
+    def format(self, record):
+        entry = {"time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                 "level": record.levelname, "logger": record.name, "message": record.getMessage()}
+        entry.update({key: value for key, value in vars(record).items() if key not in STANDARD_ATTRIBUTES})
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+# Set up once per process by setup_logging
+rate_limit = None
+setup_lock = threading.Lock()
+
+def setup_logging(config=None):
+    """Send every module's log records to stdout (or a file) as configured in config.json's logging section"""
+    global rate_limit
+    with setup_lock:
+        if rate_limit is not None:
+            return
+        settings = (config or load_config())["logging"]
+        if settings.get("file"):
+            handler = logging.FileHandler(settings["file"], encoding="utf-8")
+        else:
+            handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter() if settings.get("format") == "json" else TextFormatter())
+        rate_limit = RateLimitFilter(settings.get("rate_limit_seconds", 10), settings.get("rate_limit_burst", 3))
+        handler.addFilter(rate_limit)
+        root = logging.getLogger()
+        root.addHandler(handler)
+        root.setLevel(str(settings.get("level", "INFO")).upper())
+        # Runs before logging's own shutdown, which is registered earlier
+        atexit.register(rate_limit.flush)
+
+def get_logger(name):
+    """Return a module's logger, setting up logging on first use"""
+    setup_logging()
+    return logging.getLogger(name)
@@ -6,12 +6,131 @@ import glob
 import pandas as pd
 import subprocess
 import sys
+import queue
+import threading
+import time
+from config import load_config
+from model_edit import remove_from_models
+from retrain_scheduler import (request_retrain, pending_requests, due_at, describe_pending, touch_heartbeat,
+                               update_running, EXIT_BUSY)
+from structured_log import get_logger
+
+log = get_logger(__name__)
+
+# Progress lines printed by collect_training_data.py --burst and chunked classifier.py training
+PROGRESS_PATTERN = re.compile(r"Progress: (\d+)/(\d+) images \((\d+)%\) - ETA (\d+)s")
+
+class BackgroundJob:
+    """One queued enrollment or model update: steps run in order off the Tk thread"""
+    def __init__(self, kind, title, steps, student_ids=()):
+        self.kind = kind
+        self.title = title
+        self.steps = steps
+        self.student_ids = set(student_ids)
+        self.status = "Queued"
+        self.progress = ""
+        self.percent = 0
+        self.errors = []
+        self.cancelled = False
+        self.handled = False
+        self.process = None
+
+class JobQueue:
+    """Run BackgroundJobs one at a time in a worker thread
+
+    Jobs share the camera and the model files, so they never overlap; the
+    UI stacks as many as it likes and polls `updates` for changed jobs.
+    """
+    def __init__(self):
+        self.jobs = []
+        self.pending = queue.Queue()
+        self.updates = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+    
+    def submit(self, job):
+        with self.lock:
+            self.jobs.append(job)
+        self.pending.put(job)
+        self.notify(job)
+        return job
+    
+    def notify(self, job):
+        self.updates.put(job)
+    
+    def active(self):
+        with self.lock:
+            return [job for job in self.jobs if job.status in ("Queued", "Running")]
+    
+    def cancel(self, job):
+        """Drop a queued job, or stop a running one by terminating its process"""
+        with self.lock:
+            if job.status not in ("Queued", "Running"):
+                return
+            job.cancelled = True
+            if job.status == "Queued":
+                job.status = "Cancelled"
+            process = job.process
+        if process is not None and process.poll() is None:
+            process.terminate()
+        self.notify(job)
+    
+    def work(self):
+        while True:
+            job = self.pending.get()
+            with self.lock:
+                if job.cancelled:
+                    continue
+                job.status = "Running"
+            self.notify(job)
+            try:
+                for step in job.steps:
+                    if job.cancelled:
+                        break
+                    step(self, job)
+                status = "Cancelled" if job.cancelled else "Done"
+            except Exception as e:
+                status = "Cancelled" if job.cancelled else "Failed"
+                job.errors.append(str(e))
+            with self.lock:
+                job.status = status
+                job.process = None
+            self.notify(job)
+    
+    def run_command(self, job, label, command):
+        """Run a script for a job, turning its progress lines into job progress (worker thread)"""
+        job.progress = f"{label}..."
+        self.notify(job)
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   stdin=subprocess.DEVNULL, text=True)
+        with self.lock:
+            job.process = process
+            cancelled = job.cancelled
+        if cancelled:
+            process.terminate()
+        for line in process.stdout:
+            match = PROGRESS_PATTERN.search(line)
+            if match:
+                done, total, percent, eta = match.groups()
+                job.percent = int(percent)
+                job.progress = f"{label}: {done}/{total} images, ETA {eta}s"
+                self.notify(job)
+            elif "Error" in line or "❌" in line:
+                job.errors.append(line.strip())
+        returncode = process.wait()
+        with self.lock:
+            job.process = None
+        if returncode == EXIT_BUSY and not job.cancelled:
+            raise RuntimeError("Another model update is already running; queued updates will wait for it")
+        if returncode != 0 and not job.cancelled:
+            raise RuntimeError(f"{os.path.basename(command[2])} exited with code {returncode}")
 
 class StudentManager:
     def __init__(self, root):
         self.root = root
         self.root.title("Student Management")
-        self.root.geometry("700x500")
+        self.root.geometry("700x620")
         self.root.config(bg="#f0f0f0")
         
         # Setup variables
@@ -22,12 +141,23 @@ class StudentManager:
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
             
+        # Enrollment and training run in the background, one job at a time
+        self.jobs = JobQueue()
+        self.job_rows = {}
+        # Queued model updates are debounced by retrain_scheduler.py and run
+        # here as a job once enrollments go quiet
+        self.training_config = load_config()["training"]
+        self.next_retrain_check = 0.0
+        
         # Setup UI
         self.setup_ui()
         
         # Load student data
         self.load_students()
         
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.root.after(200, self.poll_jobs)
+        
     def setup_ui(self):
         # Main frame
         main_frame = ttk.Frame(self.root)
@@ -54,17 +184,19 @@ class StudentManager:
         table_frame.pack(fill=tk.BOTH, expand=True, pady=10)
         
         # Create treeview for data
-        self.tree = ttk.Treeview(table_frame, columns=("ID", "Name", "Roll Number", "Email", "Status"), show="headings")
+        self.tree = ttk.Treeview(table_frame, columns=("ID", "Name", "Roll Number", "Email", "Group", "Status"), show="headings")
         self.tree.heading("ID", text="Student ID")
         self.tree.heading("Name", text="Name")
         self.tree.heading("Roll Number", text="Roll Number")
         self.tree.heading("Email", text="Email")
+        self.tree.heading("Group", text="Group")
         self.tree.heading("Status", text="Status")
         
         self.tree.column("ID", width=60)
         self.tree.column("Name", width=180)
         self.tree.column("Roll Number", width=120)
         self.tree.column("Email", width=150)
+        self.tree.column("Group", width=80)
         self.tree.column("Status", width=120)
         
         # Add scrollbar
@@ -75,6 +207,29 @@ class StudentManager:
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Background jobs: queued enrollments and model updates with progress
+        jobs_frame = ttk.LabelFrame(main_frame, text="Background Jobs")
+        jobs_frame.pack(fill=tk.X, pady=5)
+        
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=("Job", "Status", "Progress"), show="headings", height=4)
+        self.jobs_tree.heading("Job", text="Job")
+        self.jobs_tree.heading("Status", text="Status")
+        self.jobs_tree.heading("Progress", text="Progress")
+        self.jobs_tree.column("Job", width=260)
+        self.jobs_tree.column("Status", width=90)
+        self.jobs_tree.column("Progress", width=260)
+        self.jobs_tree.pack(fill=tk.X, padx=5, pady=5)
+        
+        jobs_btn_frame = ttk.Frame(jobs_frame)
+        jobs_btn_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.job_progress = ttk.Progressbar(jobs_btn_frame, maximum=100)
+        self.job_progress.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Button(jobs_btn_frame, text="Cancel Selected Job", command=self.cancel_job).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(jobs_btn_frame, text="Update Model Now", command=self.update_model_now).pack(side=tk.RIGHT, padx=5)
+        
+        self.retrain_var = tk.StringVar(value="")
+        ttk.Label(jobs_frame, textvariable=self.retrain_var).pack(fill=tk.X, padx=5)
+        
         # Status bar
         self.status_var = tk.StringVar()
         self.status_var.set("Ready")
@@ -111,12 +266,18 @@ class StudentManager:
                         email_match = re.search(r'\[email:(.*?)\]', line)
                         email = email_match.group(1) if email_match else ""
                         
+                        # Extract class section group if exists
+                        group_match = re.search(r'\[group:(.*?)\]', line)
+                        group = group_match.group(1) if group_match else ""
+                        
                         # Extract name (everything before tags)
                         name_part = line
                         if '[roll:' in name_part:
                             name_part = name_part.split('[roll:')[0]
                         if '[email:' in name_part:
                             name_part = name_part.split('[email:')[0]
+                        if '[group:' in name_part:
+                            name_part = name_part.split('[group:')[0]
                             
                         name = ' '.join(name_part.split()[1:]).strip()  # Skip ID
                             
@@ -124,7 +285,7 @@ class StudentManager:
                         face_images = glob.glob(f"{self.data_dir}/user.{student_id}.*.jpg")
                         status = f"{len(face_images)} images" if face_images else "No face data"
                         
-                        students.append((student_id, name, roll_number, email, status))
+                        students.append((student_id, name, roll_number, email, group, status))
             
             # Insert data into treeview
             for student in students:
@@ -139,7 +300,7 @@ class StudentManager:
         """Open dialog to add a new student"""
         add_window = tk.Toplevel(self.root)
         add_window.title("Add New Student")
-        add_window.geometry("400x300")
+        add_window.geometry("400x340")
         add_window.config(bg="#f0f0f0")
         add_window.grab_set()  # Make window modal
         
@@ -187,6 +348,15 @@ class StudentManager:
         email_entry = ttk.Entry(email_frame, textvariable=email_var, width=30)
         email_entry.grid(row=0, column=1, sticky=tk.W)
         
+        # Group (class section) field
+        group_frame = ttk.Frame(form_frame)
+        group_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(group_frame, text="Group:").grid(row=0, column=0, sticky=tk.W, padx=5)
+        group_var = tk.StringVar()
+        group_entry = ttk.Entry(group_frame, textvariable=group_var, width=20)
+        group_entry.grid(row=0, column=1, sticky=tk.W)
+        
         # Buttons
         btn_frame = ttk.Frame(form_frame)
         btn_frame.pack(fill=tk.X, pady=20)
@@ -196,6 +366,7 @@ class StudentManager:
             name = name_var.get().strip()
             roll = roll_var.get().strip()
             email = email_var.get().strip()
+            group = group_var.get().strip()
             
             if not student_id:
                 messagebox.showerror("Error", "Student ID is required")
@@ -220,7 +391,7 @@ class StudentManager:
                 
             # Save student data
             with open(self.names_file, "a+") as f:
-                f.write(f"{student_id} {name} [roll:{roll}] [email:{email}]\n")
+                f.write(f"{student_id} {name} [roll:{roll}] [email:{email}] [group:{group}]\n")
                 
             messagebox.showinfo("Success", "Student added successfully")
             add_window.destroy()
@@ -255,11 +426,12 @@ class StudentManager:
         student_name = student_data[1]
         student_roll = student_data[2]
         student_email = student_data[3] if len(student_data) > 3 else ""
+        student_group = student_data[4] if len(student_data) > 5 else ""
         
         # Create edit window
         edit_window = tk.Toplevel(self.root)
         edit_window.title(f"Edit Student: {student_name}")
-        edit_window.geometry("400x300")
+        edit_window.geometry("400x340")
         edit_window.config(bg="#f0f0f0")
         edit_window.grab_set()  # Make window modal
         
@@ -303,6 +475,15 @@ class StudentManager:
         email_entry = ttk.Entry(email_frame, textvariable=email_var, width=30)
         email_entry.grid(row=0, column=1, sticky=tk.W)
         
+        # Group (class section) field
+        group_frame = ttk.Frame(form_frame)
+        group_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(group_frame, text="Group:").grid(row=0, column=0, sticky=tk.W, padx=5)
+        group_var = tk.StringVar(value=student_group)
+        group_entry = ttk.Entry(group_frame, textvariable=group_var, width=20)
+        group_entry.grid(row=0, column=1, sticky=tk.W)
+        
         # Buttons
         btn_frame = ttk.Frame(form_frame)
         btn_frame.pack(fill=tk.X, pady=20)
@@ -311,6 +492,7 @@ class StudentManager:
             name = name_var.get().strip()
             roll = roll_var.get().strip()
             email = email_var.get().strip()
+            group = group_var.get().strip()
             
             if not name:
                 messagebox.showerror("Error", "Student Name is required")
@@ -328,7 +510,7 @@ class StudentManager:
                     for line in f:
                         if line.strip().startswith(student_id + " "):
                             # Replace line with updated info
-                            lines.append(f"{student_id} {name} [roll:{roll}] [email:{email}]\n")
+                            lines.append(f"{student_id} {name} [roll:{roll}] [email:{email}] [group:{group}]\n")
                         else:
                             lines.append(line)
                             
@@ -379,20 +561,33 @@ class StudentManager:
             with open(self.names_file, "w") as f:
                 f.writelines(lines)
                 
+        # Stop any enrollment still queued or running for this student
+        for job in self.jobs.active():
+            if job.kind == "collect" and int(student_id) in job.student_ids:
+                self.jobs.cancel(job)
+                
         # Delete face data
         face_images = glob.glob(f"{self.data_dir}/user.{student_id}.*.jpg")
         for img in face_images:
             try:
                 os.remove(img)
             except Exception as e:
-                print(f"Error deleting {img}: {e}")
+                log.error("Error deleting %s: %s", img, e)
+        
+        # Drop the student's histograms from the trained model(s) in place
+        updated = []
+        try:
+            updated = remove_from_models(int(student_id))
+        except Exception as e:
+            log.error("Error removing %s from the model: %s", student_id, e)
                 
         messagebox.showinfo("Success", 
-                           f"Student {student_name} deleted successfully. {len(face_images)} face images removed.")
+                           f"Student {student_name} deleted successfully. {len(face_images)} face images removed"
+                           f"{f' and {len(updated)} model files updated' if updated else ''}.")
         self.load_students()
         
     def collect_face_data(self, student_id, name):
-        """Launch face data collection for a student"""
+        """Queue face data collection for a student"""
         script_path = "collect_training_data.py"
         
         if not os.path.exists(script_path):
@@ -400,19 +595,112 @@ class StudentManager:
                                f"Face collection script '{script_path}' not found.")
             return
             
-        try:
-            subprocess.run([sys.executable, script_path, student_id, name])
-            
-            # Retrain the model if we have enough data
-            if os.path.exists("classifier.py"):
-                if messagebox.askyesno("Train Model", 
-                                      "Do you want to train the recognition model with the new data?"):
-                    subprocess.run([sys.executable, "classifier.py"])
+        command = [sys.executable, "-u", script_path, "--burst", student_id, name]
+        self.jobs.submit(BackgroundJob("collect", f"Collect faces: {name} (ID {student_id})",
+                                       [lambda jobs, job: jobs.run_command(job, "Collecting", command)],
+                                       [int(student_id)]))
+        self.status_var.set(f"Queued face collection for {name}")
+        
+    def start_model_update(self, pending):
+        """Queue a job applying every pending retrain request in one run"""
+        if any(job.kind == "train" for job in self.jobs.active()) or update_running():
+            return
+        command = [sys.executable, "-u", "retrain_scheduler.py", "--once", "--data", self.data_dir]
+        title = "Update model: full retrain" if pending["full"] else \
+            f"Update model: {len(pending['ids'])} students ({pending['requests']} requests)"
+        self.jobs.submit(BackgroundJob("train", title, [lambda jobs, job: jobs.run_command(job, "Training", command)],
+                                       pending["ids"]))
+        
+    def update_model_now(self):
+        """Apply queued model updates without waiting for the quiet period"""
+        pending = pending_requests()
+        if pending is None:
+            if not messagebox.askyesno("Update Model", "No updates are queued. Retrain the model from all images?"):
+                return
+            request_retrain(None, reason="student manager")
+            pending = pending_requests()
+        if update_running():
+            messagebox.showinfo("Update Model", "Another model update is already running. "
+                                "Queued updates will be applied once it finishes.")
+            return
+        self.start_model_update(pending)
+        
+    def check_retrain(self):
+        """Start queued model updates once they are due, and show when they will run"""
+        touch_heartbeat()
+        pending = pending_requests()
+        due = due_at(pending, self.training_config)
+        if pending is not None and time.time() >= due:
+            self.start_model_update(pending)
+        self.retrain_var.set(describe_pending(pending, due))
+        
+    def cancel_job(self):
+        """Cancel the selected background job"""
+        selected = self.jobs_tree.selection()
+        jobs = [job for job, row in self.job_rows.items() if row in selected]
+        if not jobs:
+            messagebox.showinfo("Info", "Please select a job to cancel")
+            return
+        for job in jobs:
+            self.jobs.cancel(job)
             
-            # Refresh the student list
-            self.load_students()
-        except Exception as e:
-            messagebox.showerror("Error", f"Error collecting face data: {e}")
+    def poll_jobs(self):
+        """Show job progress from the worker thread and follow up on finished jobs"""
+        changed = []
+        while True:
+            try:
+                job = self.jobs.updates.get_nowait()
+            except queue.Empty:
+                break
+            if job not in changed:
+                changed.append(job)
+                
+        for job in changed:
+            values = (job.title, job.status, job.errors[-1] if job.status == "Failed" and job.errors else job.progress)
+            if job in self.job_rows:
+                self.jobs_tree.item(self.job_rows[job], values=values)
+            else:
+                self.job_rows[job] = self.jobs_tree.insert("", tk.END, values=values)
+            if job.status == "Running":
+                self.job_progress["value"] = job.percent
+                self.status_var.set(f"{job.title}: {job.progress}")
+            elif job.status in ("Done", "Failed", "Cancelled") and not job.handled:
+                job.handled = True
+                self.job_progress["value"] = 0
+                self.job_finished(job)
+                
+        # Retrain requests are checked about once a second
+        if time.time() >= self.next_retrain_check:
+            self.next_retrain_check = time.time() + 1.0
+            try:
+                self.check_retrain()
+            except Exception as e:
+                log.warning("Error checking queued model updates: %s", e)
+                
+        self.root.after(200, self.poll_jobs)
+        
+    def job_finished(self, job):
+        """Report a finished job and refresh the list after a collection"""
+        self.status_var.set(f"{job.title}: {job.status}")
+        if job.status == "Failed":
+            messagebox.showwarning("Warning", f"{job.title} did not complete:\n" + "\n".join(job.errors[-5:]))
+        if job.kind != "collect":
+            return
+        
+        # Refresh the student list; the collection script has already queued
+        # a model update, which the scheduler applies once enrollments go quiet
+        self.load_students()
+        
+    def close(self):
+        """Close the window, cancelling background jobs after confirmation"""
+        active = self.jobs.active()
+        if active:
+            if not messagebox.askyesno("Jobs Running", 
+                                      f"{len(active)} background jobs are still queued or running. Cancel them and close?"):
+                return
+            for job in active:
+                self.jobs.cancel(job)
+        self.root.destroy()
 
 # Standalone execution
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import subprocess
+import numpy as np
+import cv2
+import pytest
+from dataset_store import append_faces
+from partial_models import part_path, train_part
+from recognizers import create_recognizer
+from config import load_config
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "partial_models.py")
+USERS = [1, 2, 3, 5, 8, 13]
+SAMPLES = 5
+WORKERS = 3
+
+def make_faces(seed=0):
+    """Distinct textured 'faces' per user, with per-sample noise and shifts"""
+    rng = np.random.default_rng(seed)
+    faces, ids = [], []
+    for user_id in USERS:
+        base = cv2.GaussianBlur(rng.integers(0, 256, (200, 200), dtype=np.uint8), (0, 0), 2 + user_id % 4)
+        for _ in range(SAMPLES):
+            noisy = np.clip(base.astype(np.int16) + rng.integers(-20, 21, base.shape), 0, 255).astype(np.uint8)
+            faces.append(np.roll(noisy, tuple(rng.integers(-4, 5, 2)), axis=(0, 1)))
+            ids.append(user_id)
+    return faces, ids
+
+@pytest.mark.parametrize("backend", ["lbph", "lbph-q"])
+def test_merged_parts_predict_like_single_node_build(tmp_path, monkeypatch, backend):
+    monkeypatch.chdir(tmp_path)
+    with open("config.json", "w") as f:
+        json.dump({"recognition": {"backend": backend}}, f)
+    faces, ids = make_faces()
+    store = str(tmp_path / "faces.bin")
+    append_faces(store, faces, ids)
+
+    # Every part is trained by its own worker process, as on separate nodes
+    parts = [part_path(i, WORKERS, str(tmp_path / "parts")) for i in range(WORKERS)]
+    workers = [subprocess.Popen([sys.executable, SCRIPT, "part", store, "--index", str(i),
+                                 "--count", str(WORKERS), "--output", path])
+               for i, path in enumerate(parts)]
+    assert [worker.wait() for worker in workers] == [0] * WORKERS
+    assert all(os.path.exists(path) for path in parts)
+    merged_path = str(tmp_path / "merged.yml")
+    subprocess.run([sys.executable, SCRIPT, "merge", *parts, "--output", merged_path], check=True)
+
+    single_path = str(tmp_path / "single.yml")
+    train_part(store, single_path)
+
+    config = load_config()
+    single = create_recognizer(config)
+    single.read(single_path)
+    merged = create_recognizer(config)
+    merged.read(merged_path)
+
+    # Gallery crops plus unseen probes of every user
+    probes = faces + make_faces(seed=1)[0]
+    single_results = [single.predict(face) for face in probes]
+    merged_results = [merged.predict(face) for face in probes]
+    assert [label for label, _ in merged_results] == [label for label, _ in single_results]
+    assert np.allclose([d for _, d in merged_results], [d for _, d in single_results], rtol=1e-6, atol=0)
+    # The check only means something if the parts really split the users
+    assert len({label for label, _ in single_results}) == len(USERS)
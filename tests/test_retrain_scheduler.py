@@ -0,0 +1,23 @@
+import json
+from classifier import train_classifier
+from config import load_config
+from dataset_store import append_faces
+from model_edit import model_labels
+from retrain_scheduler import request_retrain, run_pending, read_status
+from test_partial_models import USERS, make_faces
+
+def test_queued_student_against_packed_store_keeps_everyone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("config.json", "w") as f:
+        json.dump({"recognition": {"backend": "lbph"}}, f)
+    faces, ids = make_faces()
+    store = str(tmp_path / "faces.bin")
+    append_faces(store, faces, ids)
+    train_classifier(store)
+
+    # A packed store has no per-student images to re-enroll from, so the
+    # queued update must become a full retrain rather than a removal
+    request_retrain([USERS[0]])
+    assert run_pending(store) is True
+    assert read_status()["mode"] == "full"
+    assert sorted(model_labels("classifier.yml", load_config())) == USERS
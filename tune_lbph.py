@@ -0,0 +1,118 @@
+import sys
+import time
+import argparse
+import itertools
+import copy
+from config import load_config, save_config
+from dataset_store import load_crops
+from recognizers import create_recognizer
+
+def k_fold_indices(ids, folds):
+    """Assign every sample to a fold, spreading each user's samples across folds"""
+    seen = {}
+    assignment = []
+    for user_id in ids:
+        seen[user_id] = seen.get(user_id, 0) + 1
+        assignment.append(seen[user_id] % folds)
+    return assignment
+
+def profile_config(config, radius, neighbors, grid_x, grid_y, face_size):
+    """Return a copy of config with one LBPH profile applied"""
+    config = copy.deepcopy(config)
+    config["recognition"]["backend"] = "lbph"
+    config["recognition"]["face_size"] = [face_size, face_size]
+    config["recognition"]["lbph"] = {"radius": radius, "neighbors": neighbors,
+                                     "grid_x": grid_x, "grid_y": grid_y}
+    return config
+
+def evaluate_profile(config, faces, ids, folds):
+    """Cross-validate one profile, returning accuracy, predict latency and model size"""
+    assignment = k_fold_indices(ids, folds)
+    correct = 0
+    tested = 0
+    predict_time = 0.0
+    for fold in range(folds):
+        train = [i for i, f in enumerate(assignment) if f != fold]
+        test = [i for i, f in enumerate(assignment) if f == fold]
+        if not train or not test:
+            continue
+        clf = create_recognizer(config)
+        clf.train([faces[i] for i in train], [ids[i] for i in train])
+        start = time.perf_counter()
+        predictions = [clf.predict(faces[i]) for i in test]
+        predict_time += time.perf_counter() - start
+        correct += sum(1 for (label, _), i in zip(predictions, test) if label == ids[i])
+        tested += len(test)
+
+    lbph = config["recognition"]["lbph"]
+    # Each gallery entry is grid_x * grid_y histograms of 2^neighbors float32 bins
+    bytes_per_face = lbph["grid_x"] * lbph["grid_y"] * (2 ** lbph["neighbors"]) * 4
+    return {
+        "accuracy": correct / max(tested, 1),
+        "predict_ms": predict_time / max(tested, 1) * 1000,
+        "model_kb": bytes_per_face * len(faces) / 1024,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep LBPH parameters with k-fold cross-validation on data/")
+    parser.add_argument("data", nargs="?", default="data", help="Data directory or packed store")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--radius", default="1,2,3")
+    parser.add_argument("--neighbors", default="4,8")
+    parser.add_argument("--grid-x", default="4,6,8", help="Grid columns")
+    parser.add_argument("--grid-y", default="4,6,8", help="Grid rows (every combination with --grid-x is tried)")
+    parser.add_argument("--face-size", default="100,150,200", help="Normalized square face sizes")
+    parser.add_argument("--select", choices=["fastest", "accurate"], default="fastest",
+                        help="fastest: quickest profile within 1%% of the best accuracy; accurate: best accuracy")
+    parser.add_argument("--write", action="store_true", help="Save the selected profile to config.json")
+    args = parser.parse_args()
+
+    faces, ids = load_crops(args.data)
+    if len(faces) < args.folds:
+        print(f"❌ Error: Need at least {args.folds} face crops in '{args.data}' for {args.folds}-fold validation")
+        sys.exit(1)
+
+    parse = lambda text: [int(v) for v in text.split(",") if v.strip()]
+    combinations = list(itertools.product(parse(args.radius), parse(args.neighbors),
+                                          parse(args.grid_x), parse(args.grid_y), parse(args.face_size)))
+    base_config = load_config()
+    print(f"🔍 Sweeping {len(combinations)} LBPH profiles with {args.folds}-fold cross-validation "
+          f"on {len(faces)} crops...")
+
+    results = []
+    for radius, neighbors, grid_x, grid_y, face_size in combinations:
+        config = profile_config(base_config, radius, neighbors, grid_x, grid_y, face_size)
+        try:
+            result = evaluate_profile(config, faces, ids, args.folds)
+        except Exception as e:
+            print(f"⚠️ r={radius} n={neighbors} grid={grid_x}x{grid_y} size={face_size}: {e}")
+            continue
+        result.update(radius=radius, neighbors=neighbors, grid_x=grid_x, grid_y=grid_y, face_size=face_size)
+        results.append(result)
+        print(f"  r={radius} n={neighbors:<2} grid={grid_x}x{grid_y} size={face_size:<3} -> "
+              f"accuracy {result['accuracy']:.1%}, predict {result['predict_ms']:.2f} ms, "
+              f"model {result['model_kb']:.0f} KB")
+
+    if not results:
+        print("❌ No profile could be evaluated.")
+        sys.exit(1)
+
+    best_accuracy = max(r["accuracy"] for r in results)
+    if args.select == "accurate":
+        chosen = min((r for r in results if r["accuracy"] == best_accuracy), key=lambda r: r["predict_ms"])
+    else:
+        chosen = min((r for r in results if r["accuracy"] >= best_accuracy - 0.01), key=lambda r: r["predict_ms"])
+
+    print(f"\n✅ Selected ({args.select}): radius={chosen['radius']}, neighbors={chosen['neighbors']}, "
+          f"grid={chosen['grid_x']}x{chosen['grid_y']}, face size={chosen['face_size']} "
+          f"-> accuracy {chosen['accuracy']:.1%}, predict {chosen['predict_ms']:.2f} ms")
+
+    if args.write:
+        config = load_config()
+        selected = profile_config(config, chosen["radius"], chosen["neighbors"], chosen["grid_x"], chosen["grid_y"],
+                                  chosen["face_size"])
+        config["recognition"]["face_size"] = selected["recognition"]["face_size"]
+        config["recognition"]["lbph"] = selected["recognition"]["lbph"]
+        save_config(config)
+        print("✅ Profile saved to config.json. Retrain the model (python classifier.py) to apply it.")
+        print("ℹ️ Distances scale with the grid size, so re-check recognition.confidence_threshold.")